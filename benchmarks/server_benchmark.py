@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Round-trip latency of a served prompt over loopback.
+
+Starts `python -m inpromptu ... --serve` in a subprocess, on a Unix socket
+and then on TCP, and times run and complete requests from 1 and several
+concurrent clients (each waiting for its response before sending the next).
+
+Usage: python benchmarks/server_benchmark.py [requests_per_client] [clients]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from inpromptu.inpromptu_client import InpromptuClient
+from inpromptu.inpromptu_server import parse_address
+from inpromptu.metrics import LatencyHistogram, format_seconds
+
+TARGET_SOURCE = '''
+class Target:
+    def __init__(self):
+        self.total = 0
+
+    def add(self, amount: int, scale: float = 1.0):
+        """Add to the total."""
+        self.total += amount * scale
+        return self.total
+'''
+
+REQUESTS = {"run": ("run", {"line": "add 1 scale=2"}),
+            "complete": ("complete", {"line": "add 1 ", "text": ""})}
+
+
+def start_server(directory, address):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([directory, REPO_DIR]))
+    server = subprocess.Popen([sys.executable, "-m", "inpromptu", "target:Target",
+                               "--serve", address], env=env,
+                              stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            InpromptuClient(address).close()
+            return server
+        except OSError:
+            if time.monotonic() > deadline or server.poll() is not None:
+                server.kill()
+                raise RuntimeError(f"Server on {address} did not start.")
+            time.sleep(0.05)
+
+
+def time_requests(address, op, fields, count, client_count):
+    """Return a histogram of round-trip latencies and the requests/second."""
+    histogram = LatencyHistogram()
+    lock = threading.Lock()
+    clients = [InpromptuClient(address) for _ in range(client_count)]
+
+    def send(client):
+        latencies = []
+        for _ in range(count):
+            start = time.perf_counter()
+            client.request(op, **fields)
+            latencies.append(time.perf_counter() - start)
+        with lock:
+            for latency in latencies:
+                histogram.record(latency)
+
+    for client in clients: # Warm up.
+        client.request(op, **fields)
+    threads = [threading.Thread(target=send, args=(client,)) for client in clients]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        client.close()
+    return histogram, count * client_count / elapsed
+
+
+def main(count=2000, client_count=8):
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "target.py"), 'w') as module:
+            module.write(TARGET_SOURCE)
+        addresses = [f"unix:{os.path.join(directory, 'inpromptu.sock')}",
+                     "127.0.0.1:7791"]
+        print(f"{'transport':<10}{'request':<10}{'clients':>8}" +
+              "".join(f"{c:>10}" for c in ["p50", "p99", "max", "req/s"]))
+        for address in addresses:
+            server = start_server(directory, address)
+            try:
+                for name, (op, fields) in REQUESTS.items():
+                    for clients in sorted({1, client_count}):
+                        histogram, rate = time_requests(address, op, fields,
+                                                        count, clients)
+                        print(f"{parse_address(address)[0]:<10}"
+                              f"{name:<10}{clients:>8} " +
+                              " ".join(format_seconds(s) for s in
+                                       [histogram.quantile(0.5),
+                                        histogram.quantile(0.99),
+                                        histogram.max]) +
+                              f"{rate:>10.0f}")
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Compare prompt startup time with and without a structure snapshot.
+
+Generates a synthetic driver stack, then times building the
+ObjectMethodManagers (after imports) in fresh interpreters:
+  * without a snapshot,
+  * with a cold snapshot (introspect and write it),
+  * with a warm snapshot (load it).
+Each is timed for startup alone and for startup plus the first use of every
+method (method definitions are otherwise built lazily).
+
+Usage: python benchmarks/startup_benchmark.py [classes] [methods_per_class]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TIMING_SCRIPT = '''
+import sys, time
+import synthetic_drivers
+from inpromptu.object_method_manager import ObjectMethodManager
+resolve_all = sys.argv[1] == 'resolve'
+snapshot = sys.argv[2] if len(sys.argv) > 2 else None
+start = time.perf_counter()
+for driver_class in synthetic_drivers.DRIVERS:
+    omm = ObjectMethodManager(driver_class(), snapshot=snapshot)
+    if resolve_all:
+        omm.validate()
+if snapshot:
+    from inpromptu.snapshot import StructureSnapshot
+    if StructureSnapshot.open(snapshot).modified:
+        StructureSnapshot.open(snapshot).save()
+print(time.perf_counter() - start)
+'''
+
+
+def write_driver_module(directory, class_count, method_count):
+    lines = ["from enum import Enum", "from typing import Union", "",
+             "class Mode(Enum):", "    fast = 1", "    slow = 2", ""]
+    for class_index in range(class_count):
+        lines.append(f"class Driver{class_index}:")
+        for method_index in range(method_count):
+            lines.append(f"    def method_{method_index}(self, a: int, "
+                         "b: Union[float, str] = 0, mode: Mode = Mode.fast):")
+            lines.append(f"        \"\"\"Method {method_index}.\"\"\"")
+            lines.append("        return a")
+        lines.append("")
+    lines.append("DRIVERS = [" + ", ".join(f"Driver{i}"
+                 for i in range(class_count)) + "]")
+    with open(os.path.join(directory, "synthetic_drivers.py"), 'w') as module:
+        module.write("\n".join(lines))
+
+
+def time_startup(directory, mode, snapshot=None, repeats=5):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([directory, REPO_DIR]))
+    args = [sys.executable, "-c", TIMING_SCRIPT, mode] + \
+        ([snapshot] if snapshot else [])
+    return min(float(subprocess.check_output(args, env=env))
+               for _ in range(repeats))
+
+
+def main(class_count=20, method_count=200):
+    with tempfile.TemporaryDirectory() as directory:
+        write_driver_module(directory, class_count, method_count)
+        snapshot = os.path.join(directory, "structure.snapshot")
+        # Compile the module once so bytecode caching doesn't skew results.
+        time_startup(directory, 'startup', repeats=1)
+        print(f"{class_count} classes x {method_count} methods"
+              "        startup   +all methods")
+        for mode_name, snapshot_path, repeats in \
+                [("no snapshot", None, 5),
+                 ("cold snapshot", snapshot, 1),
+                 ("warm snapshot", snapshot, 5)]:
+            if snapshot_path and mode_name.startswith("cold"):
+                results = []
+                for mode in ['startup', 'resolve']:
+                    if os.path.exists(snapshot):
+                        os.remove(snapshot)
+                    results.append(time_startup(directory, mode, snapshot_path,
+                                                repeats))
+            else:
+                results = [time_startup(directory, mode, snapshot_path, repeats)
+                           for mode in ['startup', 'resolve']]
+            print(f"  {mode_name + ':':<30}" +
+                  "".join(f"{t * 1000:9.1f} ms" for t in results))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
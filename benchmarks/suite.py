@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""Benchmarks for tokenizing, parsing, conversion, completion, dispatch and
+rendering.
+
+Each benchmark times one operation on a synthetic target class with 10,
+100, 1000 or 10000 methods, long pasted lines, a deep Union and a large
+Enum. Startup is timed in-process after imports; see startup_benchmark.py for
+whole-interpreter startup with snapshots. Results (seconds per operation,
+or per keystroke/command) can be saved as a named baseline in
+benchmarks/baselines/ and later runs compared against it.
+
+Usage:
+  python benchmarks/suite.py [-k FILTER] [--sizes 10,100] [--save NAME]
+                             [--compare NAME] [--threshold 0.5]
+
+--compare exits with status 1 if any benchmark is slower than the baseline
+by more than the threshold (a fraction). Timings are machine-specific, so
+compare against baselines saved on the same machine.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import timeit
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "baselines")
+sys.path.insert(0, REPO_DIR)
+
+import readline
+from prompt_toolkit.completion import CompleteEvent
+from prompt_toolkit.document import Document
+from inpromptu.tokenizer import container_split
+from inpromptu import object_method_manager
+from inpromptu.object_method_manager import ObjectMethodManager
+from inpromptu.renderers import ResultFormatter
+from inpromptu.inpromptu_readline import Inpromptu as ReadlineInpromptu
+from inpromptu.inpromptu_batch import Inpromptu as BatchInpromptu
+from inpromptu.inpromptu_broadcast import BroadcastMixin
+
+SIZES = [10, 100, 1000, 10000]
+ENUM_SIZE = 1000
+UNION_DEPTH = 12
+WAYPOINTS = 5000
+BROADCAST_INSTANCES = 32
+
+# name -> (setup function, sizes or None)
+BENCHMARKS = {}
+
+
+def benchmark(name, sized=False):
+    """Register a setup function that returns the callable to time.
+
+    Sized benchmarks are set up once per target class size.
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, sized)
+        return setup
+    return register
+
+
+def make_target_class(method_count):
+    """Build a class with method_count methods taking a deep Union and a
+    large Enum, plus a few methods with container arguments."""
+    enum_lines = [f"    m{i} = {i}" for i in range(ENUM_SIZE)]
+    union_enums = [f"class E{i}(Enum):\n    a = 1\n    b = 2"
+                   for i in range(UNION_DEPTH)]
+    deep_union = ", ".join([f"E{i}" for i in range(UNION_DEPTH)] +
+                           ["list[int]", "dict[str, int]", "float", "str"])
+    method_lines = []
+    for i in range(method_count):
+        method_lines.append(
+            f"    def method_{i}(self, a: int, b: DeepUnion = 0, "
+            "mode: Mode = Mode.m0):\n"
+            f"        \"\"\"Method {i}.\"\"\"\n"
+            "        return a")
+    source = "\n".join(
+        ["from enum import Enum", "from typing import Union",
+         "class Mode(Enum):", *enum_lines, *union_enums,
+         f"DeepUnion = Union[{deep_union}]",
+         "class Target:",
+         "    def echo(self, value: int):",
+         "        return value",
+         "    def follow(self, path: list[tuple[float, float]], "
+         "speed: float = 1.0):",
+         "        return len(path)",
+         "    def tag(self, label: DeepUnion, mode: Mode = Mode.m0):",
+         "        return label",
+         *method_lines])
+    namespace = {'__name__': f"synthetic_{method_count}"}
+    exec(compile(source, namespace['__name__'], 'exec'), namespace)
+    return namespace['Target']
+
+
+_targets = {}
+def get_target_class(method_count):
+    if method_count not in _targets:
+        _targets[method_count] = make_target_class(method_count)
+    return _targets[method_count]
+
+
+def waypoint_line():
+    path = [(float(i), i + 0.5) for i in range(WAYPOINTS)]
+    return f"follow {path!r} speed=2.5".replace(", ", ",")
+
+
+def make_pt_prompt(target):
+    # Imported late: prompt_toolkit warns when stdin isn't a terminal.
+    from inpromptu.inpromptu_prompt_toolkit import Inpromptu as PTInpromptu
+    with contextlib.redirect_stderr(io.StringIO()):
+        return PTInpromptu(target)
+
+
+def keystrokes(line):
+    """Return every prefix of line, as typed one keystroke at a time."""
+    return [line[:end] for end in range(1, len(line) + 1)]
+
+
+@benchmark("startup/omm", sized=True)
+def bench_startup(size):
+    target_class = get_target_class(size)
+    def start():
+        # Introspect the class from scratch each time.
+        object_method_manager._class_structures.clear()
+        ObjectMethodManager(target_class())
+    return start
+
+
+@benchmark("startup/omm+validate", sized=True)
+def bench_startup_validate(size):
+    target_class = get_target_class(size)
+    def start():
+        object_method_manager._class_structures.clear()
+        ObjectMethodManager(target_class()).validate()
+    return start
+
+
+@benchmark("startup/omm_same_class", sized=True)
+def bench_startup_same_class(size):
+    target_class = get_target_class(size)
+    ObjectMethodManager(target_class())
+    return lambda: ObjectMethodManager(target_class())
+
+
+def make_controller(device_count):
+    """Build a controller with device_count sub-devices of the 10-method
+    target class, each with its own sub-device and a back-reference."""
+    target_class = get_target_class(10)
+    controller = target_class()
+    for i in range(device_count):
+        device = target_class()
+        device.parent = controller
+        device.child = target_class()
+        setattr(controller, f"device_{i}", device)
+    return controller
+
+
+@benchmark("startup/nested_devices", sized=True)
+def bench_startup_nested(size):
+    """Startup of a prompt for an object graph of size sub-devices, and the
+    first completion of a dotted path into it."""
+    controller = make_controller(size)
+    line = f"device_{size - 1}.child.method_1 "
+    def start():
+        prompt = BatchInpromptu(controller)
+        prompt._get_completion_matches(line, "")
+    return start
+
+
+@benchmark("tokenize/long_line")
+def bench_container_split():
+    line = waypoint_line()
+    return lambda: container_split(line)
+
+
+@benchmark("parse_line/long_line")
+def bench_parse_long_line():
+    prompt = ReadlineInpromptu(get_target_class(10)())
+    line = waypoint_line()
+    return lambda: prompt.parse_line(line)
+
+
+@benchmark("parse_line/deep_union_and_enum")
+def bench_parse_deep_union():
+    prompt = ReadlineInpromptu(get_target_class(10)())
+    line = f"tag E{UNION_DEPTH - 1}.b mode=Mode.m{ENUM_SIZE - 1}"
+    return lambda: prompt.parse_line(line)
+
+
+@benchmark("typed_eval/deep_union_str")
+def bench_typed_eval_union():
+    types = ReadlineInpromptu(get_target_class(10)()).omm \
+        .call_plans['tag'].slots[1].types
+    return lambda: ReadlineInpromptu.typed_eval("kelp", types)
+
+
+@benchmark("complete/readline/keystroke", sized=True)
+def bench_readline_completion(size):
+    prompt = ReadlineInpromptu(get_target_class(size)())
+    lines = keystrokes(f"method_{size - 1} 1 b=E0.a mode=Mode.m99")
+    def type_line():
+        get_line_buffer = readline.get_line_buffer
+        try:
+            for line in lines:
+                prompt._completion_cache = None
+                readline.get_line_buffer = lambda: line
+                text = line.rsplit(" ", 1)[-1]
+                state = 0
+                while prompt._complete(text, state) is not None:
+                    state += 1
+        finally:
+            readline.get_line_buffer = get_line_buffer
+    type_line.ops = len(lines)
+    return type_line
+
+
+@benchmark("complete/prompt_toolkit/keystroke", sized=True)
+def bench_pt_completion(size):
+    prompt = make_pt_prompt(get_target_class(size)())
+    documents = [Document(line) for line in
+                 keystrokes(f"method_{size - 1} 1 b=E0.a mode=Mode.m99")]
+    event = CompleteEvent(completion_requested=True)
+    def type_line():
+        for document in documents:
+            for completion in prompt.get_completions(document, event):
+                pass
+    type_line.ops = len(documents)
+    return type_line
+
+
+@benchmark("complete/large_enum")
+def bench_enum_completion():
+    prompt = ReadlineInpromptu(get_target_class(10)())
+    return lambda: prompt._get_completion_matches("tag 1 mode=Mode.m", "mode=Mode.m")
+
+
+@benchmark("cmdloop/commands", sized=True)
+def bench_cmdloop(size):
+    target = get_target_class(size)()
+    lines = [f"method_{i % size} {i} b=E{i % UNION_DEPTH}.a" for i in range(1000)]
+    def run_commands():
+        prompt = BatchInpromptu(target, lines=lines)
+        with contextlib.redirect_stdout(io.StringIO()):
+            prompt.cmdloop()
+    run_commands.ops = len(lines)
+    return run_commands
+
+
+class BroadcastInpromptu(BroadcastMixin, BatchInpromptu):
+    pass
+
+
+@benchmark("broadcast/fanout")
+def bench_broadcast():
+    """One command on BROADCAST_INSTANCES instances, i.e: the overhead of
+    fanning out and collecting results."""
+    target_class = get_target_class(10)
+    prompt = BroadcastInpromptu([target_class()
+                                 for _ in range(BROADCAST_INSTANCES)])
+    return lambda: prompt.onecmd("method_1 1 b=E1.a")
+
+
+@benchmark("render/large_dict", sized=True)
+def bench_render_large_dict(size):
+    """Formatting a dict of size * 100 entries of nested lists for display,
+    which should take the same time whatever its size."""
+    formatter = ResultFormatter()
+    result = {f"key_{i}": [i, str(i), list(range(100))]
+              for i in range(size * 100)}
+    return lambda: formatter.format(result)
+
+
+def measure(func, repeats=5, min_time=0.2):
+    """Return the best time per operation of func over several repeats."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    best = min(timer.repeat(repeat=repeats, number=number)) / number
+    return best / getattr(func, 'ops', 1)
+
+
+def run(name_filter="", sizes=SIZES):
+    results = {}
+    for name, (setup, sized) in BENCHMARKS.items():
+        for size in (sizes if sized else [None]):
+            full_name = name if size is None else f"{name}[{size}]"
+            if name_filter not in full_name:
+                continue
+            func = setup(size) if sized else setup()
+            results[full_name] = measure(func)
+            # Throughput for benchmarks timing several operations per call.
+            rate = f"{1 / results[full_name]:12,.0f}/s" \
+                if hasattr(func, 'ops') else ""
+            print(f"{full_name:<45} {format_time(results[full_name])}{rate}",
+                  flush=True)
+    return results
+
+
+def format_time(seconds):
+    for unit, scale in [("s", 1), ("ms", 1e-3), ("us", 1e-6)]:
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.2f} ns"
+
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_baseline(name, results):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    with open(baseline_path(name), 'w') as baseline_file:
+        json.dump({"python": platform.python_version(),
+                   "machine": platform.machine(),
+                   "results": results}, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write("\n")
+
+
+def compare(name, results, threshold):
+    """Print results against a baseline. Return the names of regressions.
+    Benchmarks missing from the baseline are listed, but not regressions."""
+    with open(baseline_path(name)) as baseline_file:
+        baseline = json.load(baseline_file)["results"]
+    regressions = []
+    print(f"\n{'benchmark':<45} {'baseline':>11} {'current':>11}  ratio")
+    for full_name, seconds in results.items():
+        if full_name not in baseline:
+            print(f"{full_name:<45} {'-':>11} {format_time(seconds)}  "
+                  "no baseline; save one with --save")
+            continue
+        ratio = seconds / baseline[full_name]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(full_name)
+        print(f"{full_name:<45} {format_time(baseline[full_name])} "
+              f"{format_time(seconds)}  {ratio:5.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", dest="name_filter", default="",
+                        help="only run benchmarks whose name contains this")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)),
+                        help="comma-separated target class method counts")
+    parser.add_argument("--save", metavar="NAME",
+                        help="save results as a baseline")
+    parser.add_argument("--compare", metavar="NAME",
+                        help="compare results against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.5,
+                        help="allowed slowdown before flagging a regression")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = run(args.name_filter, sizes)
+    if args.save:
+        save_baseline(args.save, results)
+    if args.compare and compare(args.compare, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
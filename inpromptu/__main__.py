@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Run a script of commands against an object without an interactive prompt.
+
+Usage: python -m inpromptu package.module:target [script] [--continue-on-error]
+                          [--format jsonl]
+       python -m inpromptu package.module:target --serve ADDRESS [--lock none]
+
+target is a class or factory function (called with no arguments) or an
+object instance. Commands are read from script, or stdin if omitted or '-'.
+With --serve, the object is instead served to clients connecting to ADDRESS
+('unix:PATH' or 'HOST:PORT'). See inpromptu_client. With --format jsonl,
+each result is printed as a line of JSON, for piping into other tools.
+"""
+
+import argparse
+import importlib
+import inspect
+import sys
+from .inpromptu_batch import Inpromptu
+
+
+def load_target(target: str):
+    """Return the object instance named by a 'module:attribute' string."""
+    module_name, _, attr_path = target.partition(':')
+    if not attr_path:
+        raise ValueError(f"Target '{target}' must be of the form "
+                         "'module:attribute'.")
+    obj = importlib.import_module(module_name)
+    for attr in attr_path.split('.'):
+        obj = getattr(obj, attr)
+    if inspect.isclass(obj) or inspect.isfunction(obj):
+        obj = obj()
+    return obj
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m inpromptu",
+        description="Run a script of commands against an object.")
+    parser.add_argument("target",
+        help="'module:attribute' naming a class, factory, or instance.")
+    parser.add_argument("script", nargs='?', default='-',
+        help="file of commands, one per line. Defaults to stdin.")
+    parser.add_argument("--continue-on-error", action="store_true",
+        help="keep running commands after one fails.")
+    parser.add_argument("--skip", nargs='*', default=[], metavar="METHOD",
+        help="methods to omit from the prompt.")
+    parser.add_argument("--snapshot", default=None, metavar="PATH",
+        help="file to cache introspection results in between runs.")
+    parser.add_argument("--format", choices=["text", "jsonl"], default="text",
+        help="print results as size-limited text (the default) or as a line "
+             "of JSON each.")
+    parser.add_argument("--serve", default=None, metavar="ADDRESS",
+        help="serve the prompt on 'unix:PATH' or 'HOST:PORT' instead.")
+    parser.add_argument("--lock", choices=["exclusive", "none"],
+        default="exclusive",
+        help="whether served commands run one at a time (the default) or "
+             "concurrently.")
+    args = parser.parse_args(argv)
+
+    # Allow targets that live in the current directory.
+    sys.path.insert(0, '')
+    if args.serve is not None:
+        from .inpromptu_server import Inpromptu as InpromptuServer
+        server = InpromptuServer(load_target(args.target),
+                                 methods_to_skip=args.skip,
+                                 snapshot=args.snapshot, address=args.serve,
+                                 lock=None if args.lock == "none" else "exclusive")
+        server.cmdloop()
+        return 0
+    prompt = Inpromptu(load_target(args.target), methods_to_skip=args.skip,
+                       snapshot=args.snapshot)
+    prompt.output_format = args.format
+    if args.script == '-':
+        summary = prompt.run_script(sys.stdin,
+                                    stop_on_error=not args.continue_on_error)
+    else:
+        with open(args.script, 'r') as script:
+            summary = prompt.run_script(script,
+                                        stop_on_error=not args.continue_on_error)
+    print(summary, file=sys.stderr)
+    return 1 if summary.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
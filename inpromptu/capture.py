@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Per-thread and per-task capturing of printed output."""
+
+import contextlib
+import contextvars
+import io
+import sys
+import threading
+
+_install_lock = threading.Lock()
+
+
+class ContextLocalStdout(io.TextIOBase):
+    """Stand-in for sys.stdout that sends writes to a buffer of their own
+    when capturing, and to the real stdout otherwise.
+
+    Capturing is local to a thread or asyncio task (i.e: a context), and
+    is inherited by tasks the capturing code starts, including coroutines
+    it submits to an event loop in another thread.
+    """
+
+    def __init__(self, stdout):
+        """Constructor."""
+        self.stdout = stdout
+        self.installs = 0 # install() calls not yet undone by uninstall().
+        self._buffer = contextvars.ContextVar("inpromptu_stdout_buffer",
+                                              default=None)
+
+    @contextlib.contextmanager
+    def capture(self):
+        """Capture output in this context. Yield the buffer it goes to."""
+        buffer = io.StringIO()
+        token = self._buffer.set(buffer)
+        try:
+            yield buffer
+        finally:
+            self._buffer.reset(token)
+
+    def write(self, text):
+        return (self._buffer.get() or self.stdout).write(text)
+
+    def flush(self):
+        (self._buffer.get() or self.stdout).flush()
+
+    @property
+    def encoding(self):
+        return self.stdout.encoding
+
+    def isatty(self):
+        return self.stdout.isatty()
+
+    def fileno(self):
+        return self.stdout.fileno()
+
+
+def install():
+    """Make sys.stdout a ContextLocalStdout, if it isn't one already.
+    Return it. Undo with uninstall(), once per install()."""
+    with _install_lock:
+        if not isinstance(sys.stdout, ContextLocalStdout):
+            sys.stdout = ContextLocalStdout(sys.stdout)
+        sys.stdout.installs += 1
+        return sys.stdout
+
+
+def uninstall(stdout):
+    """Undo an install(). The stdout wrapped by the ContextLocalStdout is
+    restored once all of its installs are undone, e.g: a server's and those
+    of its clients' jobs."""
+    with _install_lock:
+        stdout.installs -= 1
+        if stdout.installs <= 0 and sys.stdout is stdout:
+            sys.stdout = stdout.stdout
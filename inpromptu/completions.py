@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Sorted indexes for fast prefix completion lookups."""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+
+class PrefixIndex:
+    """Sorted collection of strings supporting O(log n + k) prefix lookups."""
+
+    def __init__(self, words=()):
+        """Constructor. Duplicate words are collapsed."""
+        # Hold onto the source so owners can tell if the index is stale.
+        self.source = words
+        self.words = sorted(set(words))
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        index = bisect_left(self.words, word)
+        return index < len(self.words) and self.words[index] == word
+
+    def match(self, prefix: str = ""):
+        """Return the sorted list of words that start with prefix."""
+        if not prefix:
+            return list(self.words)
+        words = self.words
+        start = bisect_left(words, prefix)
+        end = start
+        while end < len(words) and words[end].startswith(prefix):
+            end += 1
+        return words[start:end]
+
+
+class OptionCache:
+    """LRU cache of completion options with optional per-entry expiry.
+
+    Entries are keyed by (method, parameter, prefix). Lookups may come from
+    a completer thread, so access is locked.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        """Constructor."""
+        self.maxsize = maxsize
+        self._entries = OrderedDict() # key -> (expiry time or None, options)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached options for key or None if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expiry, options = entry
+            if expiry is not None and time.monotonic() >= expiry:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return options
+
+    def put(self, key, options, ttl: float = None):
+        """Cache options for key, evicting the least recently used entry if
+        full. With a ttl, the entry expires after ttl seconds."""
+        expiry = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (expiry, options)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, method: str = None, parameter: str = None):
+        """Drop cached entries for a method parameter, a whole method, or
+        everything if neither is given."""
+        with self._lock:
+            if method is None and parameter is None:
+                self._entries.clear()
+                return
+            for key in list(self._entries):
+                if (method is None or key[0] == method) and \
+                        (parameter is None or key[1] == parameter):
+                    del self._entries[key]
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""Converters from argument text to typed values, compiled from type hints."""
+
+import ast
+import re
+from ast import literal_eval
+from collections.abc import Mapping
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Literal, Union, get_args, get_origin
+
+
+# Returned by a type's conversion steps when the text isn't of that type.
+NO_MATCH = object()
+# Returned by a fast path to defer to the text's literal evaluation.
+TRY_LITERAL = object()
+# Like TRY_LITERAL, but names are read as strings (see evaluate_container).
+TRY_CONTAINER = object()
+# Placeholder for a literal that has not been evaluated yet.
+_UNEVALUATED = object()
+
+_INT_PATTERN = re.compile(r"[+-]?[0-9]+")
+_FLOAT_PATTERN = re.compile(r"[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?")
+_BOOLS = {"True": True, "False": False}
+# First characters of text whose evaluation may be a container.
+_CONTAINER_STARTS = frozenset("[({")
+# First characters of text whose literal evaluation may be a number.
+_NUMERIC_STARTS = frozenset("+-.0123456789'\"(TF")
+
+
+def evaluate_literal(text: str):
+    """Evaluate text as a Python literal or return it unchanged if it isn't one."""
+    try:
+        return literal_eval(text)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return text
+
+
+def evaluate_container(text: str, value=_UNEVALUATED):
+    """Evaluate text as a literal, reading bare names such as Color.red as
+    strings. Return NO_MATCH if the text isn't a literal.
+
+    value is the text's evaluate_literal() result, if already known.
+    """
+    if value is _UNEVALUATED:
+        value = evaluate_literal(text)
+    if value is not text:
+        return value
+    try:
+        tree = ast.parse(text, mode='eval')
+    except (SyntaxError, ValueError, MemoryError, RecursionError):
+        return NO_MATCH
+    for node in ast.walk(tree):
+        for field, child in ast.iter_fields(node):
+            if isinstance(child, list):
+                child[:] = [_name_to_constant(c) for c in child]
+            else:
+                setattr(node, field, _name_to_constant(child))
+    try:
+        return literal_eval(tree)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return NO_MATCH
+
+
+def _name_to_constant(node):
+    """Replace a (dotted) name node with its text as a string constant."""
+    if not isinstance(node, (ast.Name, ast.Attribute)):
+        return node
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return node
+    parts.append(node.id)
+    return ast.Constant(".".join(reversed(parts)))
+
+
+def _no_match(arg):
+    return NO_MATCH
+
+
+def _try_literal(text):
+    return TRY_LITERAL
+
+
+def _try_container(text):
+    return TRY_CONTAINER
+
+
+def _convert_container_text(text):
+    # Unbracketed tuples, e.g: 1,2, are containers too.
+    if text[:1] in _CONTAINER_STARTS or "," in text:
+        return TRY_CONTAINER
+    return NO_MATCH
+
+
+def _convert_int_text(text):
+    if _INT_PATTERN.fullmatch(text):
+        return int(text)
+    # e.g: hex, or (like the constructor) floats and bools.
+    return TRY_LITERAL if text[:1] in _NUMERIC_STARTS else NO_MATCH
+
+
+def _convert_float_text(text):
+    if _FLOAT_PATTERN.fullmatch(text):
+        return float(text)
+    if text[:1] in _NUMERIC_STARTS:
+        return TRY_LITERAL
+    # e.g: inf and nan, which only the constructor accepts.
+    try:
+        return float(text)
+    except ValueError:
+        return NO_MATCH
+
+
+def _convert_bool_text(text):
+    return _BOOLS.get(text, TRY_LITERAL)
+
+
+def _convert_str_text(text):
+    # Quoted strings go through literal evaluation to strip the quotes.
+    return TRY_LITERAL if text[:1] in ("'", '"') else text
+
+
+def _convert_none_text(text):
+    return None if text == "None" else NO_MATCH
+
+
+def _convert_any_value(value):
+    return value
+
+
+def _constructor(obj_type):
+    """Return a conversion step that calls the type's constructor."""
+    def construct(value):
+        try:
+            return obj_type(value)
+        except (ValueError, TypeError):
+            return NO_MATCH
+    return construct
+
+
+def _enum_steps(enum_type):
+    """Return dict-based conversion steps for an Enum: by name, e.g.
+    'Color.red', then by value."""
+    prefix = f"{enum_type.__name__}."
+    by_name = {prefix + name: member
+               for name, member in enum_type.__members__.items()}
+    by_value = {}
+    for member in enum_type:
+        try:
+            by_value.setdefault(member.value, member)
+        except TypeError: # Unhashable value; only reachable via constructor.
+            pass
+    # Enums that customize lookup of missing values need their constructor.
+    missing_overridden = \
+        getattr(enum_type._missing_, '__func__', None) is not Enum._missing_.__func__
+    fallback = _constructor(enum_type) if missing_overridden else _no_match
+
+    # Without literal evaluation, text can only match values that are
+    # strings, or numbers if it looks like one.
+    by_text = {**{value: member for value, member in by_value.items()
+                  if type(value) is str}, **by_name}
+    value_types = {type(member.value) for member in enum_type}
+    if missing_overridden or not value_types <= {str, int, float}:
+        literal_starts = None # Always evaluate.
+    elif value_types & {int, float}:
+        literal_starts = _NUMERIC_STARTS
+    else:
+        literal_starts = frozenset("'\"")
+
+    def convert_text(text):
+        member = by_text.get(text, NO_MATCH)
+        if member is NO_MATCH and \
+                (literal_starts is None or text[:1] in literal_starts):
+            return TRY_LITERAL
+        return member
+
+    def convert_value(value):
+        try:
+            return by_value[value]
+        except (KeyError, TypeError):
+            return fallback(value)
+    return convert_text, convert_value
+
+
+def _compile_steps(obj_type):
+    """Return (convert_text, convert_value) steps for one type.
+
+    convert_text is a fast path working on the raw text. It returns
+    TRY_LITERAL (or TRY_CONTAINER) to defer to convert_value, which works on
+    the text's literal evaluation. Either returns NO_MATCH if the input
+    isn't of this type.
+    """
+    if obj_type is int:
+        return _convert_int_text, _constructor(int)
+    if obj_type is float:
+        return _convert_float_text, _constructor(float)
+    if obj_type is bool:
+        return _convert_bool_text, bool
+    if obj_type is str:
+        return _convert_str_text, str
+    if obj_type is type(None) or obj_type is None:
+        return _convert_none_text, _no_match
+    if obj_type is Any:
+        return _try_literal, _convert_any_value
+    if isinstance(obj_type, type) and issubclass(obj_type, Enum):
+        return _enum_steps(obj_type)
+    if get_origin(obj_type) is not None:
+        # Parameterized generics, e.g: list[int], convert element-wise.
+        convert_text = _try_container if get_origin(obj_type) is Literal \
+            else _convert_container_text
+        return convert_text, compile_value_converter(obj_type)
+    return _try_literal, _constructor(obj_type)
+
+
+def compile_value_converter(hint):
+    """Compile a function validating and converting an evaluated literal to
+    match a (possibly nested) type hint. It returns NO_MATCH on mismatch.
+
+    Containers are rebuilt as the hinted container type with each item
+    converted. Items are held to their hint more strictly than top-level
+    arguments: e.g. an int item accepts ints, not floats.
+    """
+    origin = get_origin(hint)
+    args = get_args(hint)
+    if hint is Any or hint is object:
+        return _convert_any_value
+    if origin is Union:
+        members = tuple(compile_value_converter(arg) for arg in args)
+        def convert_union(value):
+            for convert_member in members:
+                result = convert_member(value)
+                if result is not NO_MATCH:
+                    return result
+            return NO_MATCH
+        return convert_union
+    if origin is Literal:
+        allowed = {(type(arg), arg): arg for arg in args}
+        def convert_literal(value):
+            try:
+                return allowed.get((type(value), value), NO_MATCH)
+            except TypeError: # Unhashable value.
+                return NO_MATCH
+        return convert_literal
+    if hint is type(None) or hint is None:
+        return lambda value: None if value is None else NO_MATCH
+    if hint is bool:
+        return lambda value: value if value is True or value is False else NO_MATCH
+    if hint is int:
+        return lambda value: value if type(value) is int else NO_MATCH
+    if hint is float:
+        return lambda value: float(value) if type(value) in (int, float) else NO_MATCH
+    if hint is str:
+        return lambda value: value if type(value) is str else NO_MATCH
+    if isinstance(hint, type) and issubclass(hint, Enum):
+        by_text, by_value = _enum_steps(hint)
+        short_names = hint.__members__
+        def convert_enum(value):
+            if isinstance(value, hint):
+                return value
+            if isinstance(value, str):
+                member = by_text(value)
+                if member is not TRY_LITERAL and member is not NO_MATCH:
+                    return member
+                if value in short_names:
+                    return short_names[value]
+            return by_value(value)
+        return convert_enum
+    if origin in (list, set, frozenset) or \
+            (origin is tuple and len(args) == 2 and args[1] is Ellipsis):
+        convert_item = compile_value_converter(args[0]) if args else _convert_any_value
+        container = origin
+        def convert_sequence(value):
+            if not isinstance(value, (list, tuple, set, frozenset)):
+                return NO_MATCH
+            items = []
+            for item in value:
+                item = convert_item(item)
+                if item is NO_MATCH:
+                    return NO_MATCH
+                items.append(item)
+            return container(items)
+        return convert_sequence
+    if origin is tuple:
+        if args == ((),): # tuple[()]
+            args = ()
+        convert_items = tuple(compile_value_converter(arg) for arg in args)
+        def convert_tuple(value):
+            if not isinstance(value, (list, tuple)) or \
+                    len(value) != len(convert_items):
+                return NO_MATCH
+            items = tuple(convert(item) for convert, item
+                          in zip(convert_items, value))
+            if any(item is NO_MATCH for item in items):
+                return NO_MATCH
+            return items
+        return convert_tuple
+    if origin is dict or origin is Mapping:
+        convert_key, convert_val = \
+            (compile_value_converter(arg) for arg in args) if args else \
+            (_convert_any_value, _convert_any_value)
+        def convert_dict(value):
+            if not isinstance(value, dict):
+                return NO_MATCH
+            converted = {}
+            for key, val in value.items():
+                key, val = convert_key(key), convert_val(val)
+                if key is NO_MATCH or val is NO_MATCH:
+                    return NO_MATCH
+                converted[key] = val
+            return converted
+        return convert_dict
+    if origin is not None:
+        hint = origin # Unsupported generic: check the container only.
+    if isinstance(hint, type):
+        def convert_instance(value):
+            if isinstance(value, hint):
+                return value
+            return _constructor(hint)(value)
+        return convert_instance
+    return _convert_any_value
+
+
+def type_hint_name(hint):
+    """Return a short, readable name for a type hint, e.g: list[int]."""
+    if hint is type(None) or hint is None:
+        return "None"
+    origin = get_origin(hint)
+    if origin is Union:
+        return "|".join(type_hint_name(arg) for arg in get_args(hint))
+    if origin is not None:
+        args = get_args(hint)
+        name = getattr(origin, '__name__', str(origin))
+        if not args:
+            return name
+        return f"{name}[{', '.join('...' if a is Ellipsis else type_hint_name(a) for a in args)}]"
+    return getattr(hint, '__name__', str(hint))
+
+
+def type_hint_options(hint):
+    """Return the completion options implied by a type hint."""
+    if isinstance(hint, type) and issubclass(hint, Enum):
+        return [str(a) for a in hint]
+    if hint is bool:
+        return ["True", "False"]
+    if hint is type(None):
+        return ["None"]
+    if get_origin(hint) is Literal:
+        return [str(a) if isinstance(a, (str, Enum)) else repr(a)
+                for a in get_args(hint)]
+    return []
+
+
+def compile_converter(types):
+    """Compile a function converting text to the first of types that accepts
+    it. Types are tried in order, as for a Union.
+    """
+    types = tuple(types)
+    steps = tuple(_compile_steps(obj_type) for obj_type in types)
+
+    def convert(text: str):
+        # Evaluated at most once each, and only if a type needs them.
+        value = container = _UNEVALUATED
+        for convert_text, convert_value in steps:
+            result = convert_text(text)
+            if result is TRY_LITERAL:
+                if value is _UNEVALUATED:
+                    value = evaluate_literal(text)
+                result = convert_value(value)
+            elif result is TRY_CONTAINER:
+                if container is _UNEVALUATED:
+                    if value is _UNEVALUATED:
+                        value = evaluate_literal(text)
+                    container = evaluate_container(text, value)
+                result = NO_MATCH if container is NO_MATCH \
+                    else convert_value(container)
+            if result is not NO_MATCH:
+                return result
+        raise ValueError(f"Cannot convert {text} to any of the following "
+                         f"types: {list(types)}")
+    convert.types = types
+    return convert
+
+
+# Bounded so that converters, and the annotation classes they hold, are not
+# kept alive forever once the methods using them are gone.
+@lru_cache(maxsize=256)
+def _get_cached_converter(types: tuple):
+    return compile_converter(types)
+
+
+def get_converter(types):
+    """Return the converter for a sequence of types, compiling it at most once."""
+    types = tuple(types)
+    try:
+        return _get_cached_converter(types)
+    except TypeError: # Unhashable type hint.
+        return compile_converter(types)
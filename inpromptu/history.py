@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Bounded history of command results, referenced as _ and _N in later
+commands."""
+
+import re
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence, Set
+from itertools import islice
+from .errors import UserInputError
+
+# Returned by ResultHistory.resolve() for text that isn't a reference.
+NOT_A_REFERENCE = object()
+
+_REFERENCE_PATTERN = re.compile(r"_([1-9][0-9]*)?")
+
+
+def approximate_size(value, samples: int = 8):
+    """Return roughly how many bytes a value takes up, from its own size and
+    that of its first few items, without walking all of it."""
+    nbytes = getattr(value, 'nbytes', None) # e.g: NumPy arrays.
+    if isinstance(nbytes, int):
+        return nbytes
+    size = sys.getsizeof(value, 0)
+    if isinstance(value, (str, bytes, bytearray)):
+        return size
+    if isinstance(value, Mapping):
+        items = [sys.getsizeof(key, 0) + sys.getsizeof(item, 0)
+                 for key, item in islice(value.items(), samples)]
+    elif isinstance(value, (Sequence, Set)):
+        items = [sys.getsizeof(item, 0) for item in islice(value, samples)]
+    else:
+        return size
+    if items:
+        size += len(value) * sum(items) // len(items)
+    return size
+
+
+class ResultHistory:
+    """The most recent command results, numbered from 1.
+
+    Bounded by both count and approximate size; when full, the least
+    recently used results (added or referenced) are evicted first. The
+    latest result is always kept.
+    """
+
+    def __init__(self, max_results: int = 100, max_bytes: int = 256 * 2**20):
+        """Constructor.
+
+        :param max_results: most results kept. 0 keeps none.
+        :param max_bytes: most bytes (as estimated by approximate_size) that
+            the kept results take up.
+        """
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        self.last = None # Number of the latest result.
+        self.bytes = 0
+        self._results = OrderedDict() # number -> (value, size), LRU last.
+        self._next_number = 1
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._results)
+
+    def add(self, value):
+        """Keep a result, evicting others if need be. Return its number, or
+        None if results aren't kept."""
+        if self.max_results <= 0:
+            return None
+        size = approximate_size(value)
+        with self._lock:
+            number = self._next_number
+            self._next_number += 1
+            self._results[number] = (value, size)
+            self.last = number
+            self.bytes += size
+            while len(self._results) > 1 and \
+                    (len(self._results) > self.max_results or
+                     self.bytes > self.max_bytes):
+                _, (_, evicted_size) = self._results.popitem(last=False)
+                self.bytes -= evicted_size
+        return number
+
+    def get(self, number: int):
+        """Return a result by number, marking it as recently used.
+
+        Raise UserInputError if there's no such result (anymore).
+        """
+        with self._lock:
+            try:
+                self._results.move_to_end(number)
+            except KeyError:
+                if 0 < number < self._next_number:
+                    raise UserInputError(f"Result _{number} is no longer "
+                                         "kept.") from None
+                raise UserInputError(f"There's no result _{number}.") from None
+            return self._results[number][0]
+
+    def resolve(self, text: str):
+        """Return the result that text refers to, '_' being the latest and
+        '_N' the Nth. Return NOT_A_REFERENCE if it isn't a reference to a
+        result, e.g: '_' before there are any.
+
+        Raise UserInputError for a result that is no longer kept.
+        """
+        match = _REFERENCE_PATTERN.fullmatch(text)
+        if match is None:
+            return NOT_A_REFERENCE
+        if match[1] is None:
+            number = self.last
+            if number is None or number not in self._results:
+                return NOT_A_REFERENCE
+        else:
+            number = int(match[1])
+            if number >= self._next_number:
+                return NOT_A_REFERENCE
+        return self.get(number)
+
+    def items(self):
+        """Return a list of (number, result) pairs, oldest first."""
+        with self._lock:
+            return sorted((number, value) for number, (value, _)
+                          in self._results.items())
+
+    def clear(self):
+        """Forget all results. Numbering carries on."""
+        with self._lock:
+            self._results.clear()
+            self.bytes = 0
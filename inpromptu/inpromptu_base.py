@@ -1,70 +1,43 @@
 #!/usr/bin/env python3
 """Base Class for inferring an introspective prompt."""
+import asyncio
+import cProfile
 import inspect
 import logging
-import pprint
+import pstats
+import sys
+import threading
 import traceback
 import typing
+from time import perf_counter
 from abc import ABC, abstractmethod
-from ast import literal_eval
-from collections import OrderedDict
-from enum import Enum
-from inspect import signature, Parameter
+from collections.abc import Iterator, Mapping, Sequence, Set
+from functools import lru_cache
+from inspect import Parameter
 from inspect import _ParameterKind as ParamKind
-from .object_method_manager import ObjectMethodManager
+from .object_method_manager import ObjectManager, ObjectMethodManager, CallPlan
+from .object_method_manager import get_param_types
 from .errors import UserInputError
+from .converters import get_converter
+from .instrumentation import Instrumentation, PhaseTimer
+from .jobs import Job, JobManager
+from .history import NOT_A_REFERENCE, ResultHistory
+from .metrics import CommandStats
+from .renderers import ResultFormatter, elide
+from .tokenizer import Tokenizer, container_split
 
 
-# helper function for splitting user input containing nested {}, [], (), '', "".
-def container_split(s: str, sep: str = " "):
-    """split that splits on spaces while handling nested "", '', {}, [].
-
-    returns a tuple (list, bool) of the split items and a bool indicating
-            whether the final word was fully entered.
-    """
-    container_queue = []
-    text_queue = []
-    split_indices = []
-    text_delim = {'"', "'"}
-    container_start = { '{', '(', '[' }
-    container_end = { '}', ')', ']' }
-    container_end_to_start = { '}':'{', ')':'(', ']':'[' }
-
-    for i, c in enumerate(s):
-        if c in text_delim:
-            if len(text_queue) == 0: # start of string.
-                #print(f"{c} -> start of string") # start of string
-                text_queue.append(c)
-                continue
-            elif len(text_queue) > 0 and c == text_queue[-1]:  # end of string.
-                #print(f"{c} -> end of string") # end of string
-                text_queue.pop(-1)
-                continue
-        elif c in container_start:
-            #if len(container_queue) == 0: # start of outermost container.
-            #    print(f"{c} -> start of outermost container")
-            container_queue.append(c)
-            continue
-        elif c in container_end:
-            if len(container_queue) > 0:
-                if container_end_to_start[c] == container_queue[-1]:
-                    container_queue.pop(-1)
-                    if len(container_queue) == 0:
-                        #print(f"{c} -> end of outermost container")
-                        chunk_start = i+1
-                        continue
-        if c == sep and \
-           (len(text_queue) == 0) and (len(container_queue) == 0):
-            #print(f"{c} -> split here.")
-            split_indices.append(i)
-            continue
-        #print(c)
-    #print(split_indices)
-    split_indices = [0] + split_indices + [len(s)]
-    # Return a tuple
-    return [s[x:y].lstrip(sep) for x,y in zip(split_indices, split_indices[1:]) \
-            if len(s[x:y].lstrip()) > 0] , \
-            len(container_queue) == 0 and len(text_queue) == 0
+@lru_cache(maxsize=1024)
+def split_kwarg(arg_block: str):
+    """container_split an arg block on '='. Cached since completion re-parses
+    the same blocks on every keystroke."""
+    tokens, finished = container_split(arg_block, '=')
+    return tuple(tokens), finished
+
+
+async def _await(awaitable):
+    """Wrap any awaitable in a coroutine."""
+    return await awaitable
 
 
 class InpromptuBase(ABC):
@@ -73,18 +46,183 @@ class InpromptuBase(ABC):
     prompt = '>>>'
     complete_key = 'tab'
     DELIM = ' '
+    # How many of the most expensive calls 'profile' prints.
+    profile_entries = 20
+    # Keep per-command counts and latency histograms (see 'stats').
+    collect_stats = True
+    # Commands that may run in the background at once (see 'jobs').
+    max_jobs = 4
+    # Suffix that runs a command in the background.
+    JOB_SUFFIX = '&'
+    # Run background coroutines as tasks on the event loop rather than on
+    # threads, which lets 'cancel' stop them while they run.
+    coroutine_jobs_on_loop = True
+    # Sequences (and mappings) longer than this are displayed an item per
+    # line as they are formatted, like iterators, rather than all at once.
+    stream_threshold = 100
+    # Most items of such a sequence that are displayed.
+    max_items = 1000
+    # Items of a streamed result to display before asking whether to go on.
+    # None to never ask.
+    page_size = None
+    # How results are displayed: 'text' (size-limited, for people) or
+    # 'jsonl' (a line of JSON per result or streamed item, for programs).
+    output_format = 'text'
+    # Results kept to pass to later commands as _ (the latest) or _N, and
+    # the most bytes they may take up.
+    max_results = 100
+    max_result_bytes = 256 * 2**20
+    # Characters of each result that 'history' lists.
+    history_width = 76
 
-    def __init__(self, class_instance, methods_to_skip=[], var_arg_subs={}):
+    def __init__(self, class_instance, methods_to_skip=[], var_arg_subs={},
+                 snapshot=None):
         """Constructor."""
         self.log = logging.getLogger(self.__class__.__name__)
-        self.omm = ObjectMethodManager(class_instance,
-                                       methods_to_skip=methods_to_skip,
-                                       var_arg_subs=var_arg_subs)
+        self.omm, self.objects = self._create_managers(class_instance,
+                                                       methods_to_skip,
+                                                       var_arg_subs, snapshot)
 
         # In-function completions for calling input() within a fn.
         # Note that this variable must be cleared when finished with it.
         self.completions = None
         self.prompt = self.__class__.prompt
+        # Built-in commands, which get the rest of the line as is.
+        # Methods of the object with the same name take precedence.
+        self.line_commands = {name: func for name, func in
+                              [('time', self.time_command),
+                               ('profile', self.profile_command),
+                               ('stats', self.stats_command),
+                               ('jobs', self.jobs_command),
+                               ('wait', self.wait_command),
+                               ('result', self.result_command),
+                               ('cancel', self.cancel_command),
+                               ('history', self.history_command)]
+                              if name not in self.omm.callables}
+        # Built-ins whose argument is itself a command, e.g: time <cmd>.
+        self.command_prefixes = {'time', 'profile'} & self.line_commands.keys()
+        self.jobs = JobManager(max_workers=self.max_jobs, notify=self.notify)
+        # Persistent event loop that coroutine methods run on, and the
+        # thread running it if the backend doesn't run it itself.
+        self.loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+        # Incremental tokenizer of the line being completed and its last split.
+        self.tokenizer = Tokenizer()
+        self._split_cache = None
+        # Registered Instrumentation hooks, and those that time phases.
+        self.instrumentation = []
+        self._phase_hooks = []
+        self.stats = CommandStats()
+        if self.collect_stats:
+            self.add_instrumentation(self.stats)
+        # Formats results by type. Register Renderers for your own types.
+        self.formatter = ResultFormatter()
+        self.results = ResultHistory(self.max_results, self.max_result_bytes)
+
+    def _create_managers(self, class_instance, methods_to_skip, var_arg_subs,
+                         snapshot):
+        """Return the ObjectMethodManager of the object and the ObjectManager
+        that navigates to its sub-objects."""
+        omm = ObjectMethodManager(class_instance,
+                                  methods_to_skip=methods_to_skip,
+                                  var_arg_subs=var_arg_subs,
+                                  snapshot=snapshot)
+        # Sub-objects' methods, e.g: stage.x_axis.move, introspected on demand.
+        objects = ObjectManager(class_instance, snapshot=omm.snapshot,
+                                manager=omm)
+        return omm, objects
+
+    def add_instrumentation(self, hooks):
+        """Register an Instrumentation to be notified as commands run."""
+        self.instrumentation.append(hooks)
+        # Only time phases if someone is listening.
+        if type(hooks).phase_finished is not Instrumentation.phase_finished:
+            self._phase_hooks.append(hooks)
+
+    def remove_instrumentation(self, hooks):
+        self.instrumentation.remove(hooks)
+        if hooks in self._phase_hooks:
+            self._phase_hooks.remove(hooks)
+
+    def _timed(self, phase, func, *args):
+        """Call func, reporting how long it took if instrumented."""
+        if not self._phase_hooks:
+            return func(*args)
+        start = perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = perf_counter() - start
+            for hooks in self._phase_hooks:
+                self._call_hook(hooks.phase_finished, phase, elapsed)
+
+    def _call_hook(self, hook, *args):
+        """Call an instrumentation hook, logging rather than raising errors."""
+        try:
+            hook(*args)
+        except Exception:
+            self.log.exception(f"Instrumentation hook {hook.__qualname__} "
+                               f"failed.")
+
+    def _command_started(self, line):
+        """Notify instrumentation of a new command. Return its start time."""
+        if not self.instrumentation:
+            return None
+        for hooks in self.instrumentation:
+            self._call_hook(hooks.command_started, line)
+        return perf_counter()
+
+    def _command_finished(self, line, start, error=None):
+        if start is None or not self.instrumentation:
+            return
+        elapsed = perf_counter() - start
+        fn_name = self.command_name(line)
+        for hooks in self.instrumentation:
+            self._call_hook(hooks.command_finished, line, fn_name, elapsed,
+                            error)
+
+    def command_name(self, line):
+        """Return the name of the command a line of input runs."""
+        return line.split(maxsplit=1)[0] if line.strip() else ""
+
+    def command_manager(self, fn_name):
+        """Return the ObjectMethodManager of the object a command belongs to
+        and the command's name within it, e.g: the x_axis's manager and 'move'
+        for stage.x_axis.move. Raise UserInputError if there's no such object.
+        """
+        if self.objects.SEPARATOR not in fn_name:
+            return self.omm, fn_name
+        return self.objects.lookup(fn_name)
+
+    def get_method_def(self, fn_name):
+        """Return a command's method definition, or None if it has none."""
+        try:
+            omm, name = self.command_manager(fn_name)
+        except UserInputError:
+            return None
+        return omm.method_defs.get(name)
+
+    def match_commands(self, prefix: str = ""):
+        """Return the sorted callables, sub-objects (ending in '.') and
+        built-in commands that start with prefix."""
+        matches = self.objects.match(prefix)
+        built_ins = [name for name in self.line_commands if name.startswith(prefix)]
+        return sorted(matches + built_ins) if built_ins else matches
+
+    def strip_line_commands(self, line):
+        """Return the part of a line after any leading built-in commands,
+        e.g: the command to complete in 'time add_fuel 10'."""
+        while True:
+            name, delim, rest = line.partition(self.__class__.DELIM)
+            if not delim or name not in self.command_prefixes:
+                return line
+            line = rest.lstrip()
+
+    def notify(self, message: str):
+        """Report something that happened in the background, e.g: a job
+        finished. May be called from any thread."""
+        print(message)
 
     @abstractmethod
     def input(self):
@@ -93,148 +231,585 @@ class InpromptuBase(ABC):
         pass
 
     def set_completion_options(self, method: str, parameter: str,
-                               options: list[str]):
-        """Specify an explicit set of completion options for a method parameter.
-        Override existing options."""
-        self.omm.set_completion_options(method, parameter, options)
+                               options: typing.Union[list[str], typing.Callable],
+                               ttl: float = None):
+        """Specify an explicit set of completion options (or a callable that
+        provides them) for a method parameter. Override existing options.
+        Methods of sub-objects are named by their path, e.g: stage.x_axis.move.
+        """
+        omm, method = self.command_manager(method)
+        omm.set_completion_options(method, parameter, options, ttl)
+
+    def invalidate_completion_options(self, method: str = None,
+                                      parameter: str = None):
+        """Requery completion option providers on the next completion."""
+        omm, method = (self.omm, None) if method is None else \
+            self.command_manager(method)
+        omm.invalidate_completion_options(method, parameter)
 
     def get_completion_options(self, method: str, parameter: str):
-        return self.omm.get_completion_options(method, parameter)
+        omm, method = self.command_manager(method)
+        return omm.get_completion_options(method, parameter)
 
     def _get_param_options(self, func_name, param_name, partial_val_text):
         """Return list of valid parameter completions for the given input text."""
-        func_param_completions = []
         # See if this type has a specific list of completions.
-        param_opts = self.omm.method_defs[func_name]['parameters'][param_name].get('options', [])
-        for param in param_opts:
-            if param.startswith(partial_val_text):
-                func_param_completions.append(param)
+        omm, func_name = self.command_manager(func_name)
+        return omm.match_completion_options(func_name, param_name,
+                                            partial_val_text)
+
+    def _split_line(self, line):
+        """container_split the line buffer, reusing the last result if the
+        buffer has not changed."""
+        if self._split_cache is None or self._split_cache[0] != line:
+            # Resume tokenizing from the last split if the line only grew.
+            self._split_cache = (line, self.tokenizer.advance(line).split())
+        return self._split_cache[1]
+
+    def _get_completion_matches(self, line, text):
+        """Return the list of completions for text given the whole line.
+
+        This is the completion engine shared by the readline backend and
+        remote clients.
+        """
+
+        # readline delim must be set to ' ' such that {, [, (, etc aren't
+        # skipped. "container_split" will handle when to match the text we get.
+        text = text.lstrip() # what we are matching against.
+        # Complete the command after any built-ins, e.g: time <cmd>.
+        line = self.strip_line_commands(line)
+        cmd_with_args, last_word_finished = self._split_line(line)
+
+        # Complete the fn name.
+        if len(cmd_with_args) == 0 or \
+            (len(cmd_with_args) == 1 and line[-1] is not self.__class__.DELIM):
+            # Return matches but omit match if it is fully-typed.
+            return [fn for fn in self.match_commands(text) if fn != text]
+
+        # Complete the fn params.
+        self.func_name = cmd_with_args[0]
+        param_entries = cmd_with_args[1:]
+        # Check to make sure func name has parameters and was typed correctly.
+        try:
+            omm, method_name = self.command_manager(self.func_name)
+        except UserInputError:
+            return []
+        if method_name not in omm.method_defs:
+            return []
+
+        # Get function params that have not been entered.
+        plan = omm.call_plans[method_name]
+        # Don't search the last element if it is not fully entered.
+        param_entries_to_search = param_entries[:-1] if (line[-1] != self.__class__.DELIM) else param_entries
+        param_objects = self.get_remaining_params(plan, param_entries_to_search)
+
+        # Then generate completion list from remaining possible params.
+        func_param_completions = []
+        for param_order_index, param in enumerate(param_objects):
+            completion = f"{param.name}="
+            # No space case: <kwarg_name>=<value> is partially typed or fully typed but missing a space
+            if line[-1] is not self.__class__.DELIM and \
+                param_entries[-1].startswith(completion):
+                partial_val_text = param_entries[-1].split('=')[-1]
+                func_param_completions = self._get_param_options(self.func_name,
+                                                                 param.name,
+                                                                 partial_val_text)
+                break
+            # Bail early if the user entered unfinished text that can't be
+            # completed with predefined options.
+            if not last_word_finished:
+                return []
+            # Filter out already-populated argument options by name and position.
+            skip = False
+            for text_block in param_entries:
+                if text_block.startswith(completion):
+                    skip = True
+                    break
+            # regular check
+            if completion.startswith(text) and not skip:
+                func_param_completions.append(completion)
+            # Exit early: provide required args one-at-a-time so we complete
+            # them in order.
+            if param.default == param.empty:
+                break
+
         return func_param_completions
 
     @staticmethod
     def get_types(param: Parameter):
         """Return a list of valid Python types for a given parameter.
         """
-        if param.annotation is Parameter.empty:
-            return [typing.Any]
-        if typing.get_origin(param.annotation) is typing.Union:
-            return list(typing.get_args(param.annotation))
-        return [param.annotation]
+        return get_param_types(param)
 
     @staticmethod
-    def typed_eval(val_str, types):
+    def typed_eval(val_str, types, results: ResultHistory = None):
         """Evaluate string to an object representation according to type hint.
         For Union types, types are evaluated in order.
+        References to earlier results in results, e.g: _ or _3, evaluate to
+        the results themselves.
         """
-        # TODO: long-term we should be able to handle recursive type hinting.
-        # Use literal_eval first to avoid unwanted literal conversions
-        # from naively calling a literal constructor on the string representation.
-        try:
-            value = literal_eval(val_str)
-        except ValueError:  # Enums cannot be evaluated this way.
-            value = val_str
-        for obj_type in types:
-            # Enum access by name (not by value) requires brackets.
-            if issubclass(obj_type, Enum):
-                # Try to parse the input as an enum.
-                try:
-                    enum_class, name = val_str.split(".")
-                    if enum_class == obj_type.__name__:
-                        return obj_type[name]  # Use dict-like access.
-                except (ValueError, KeyError):
-                    pass
-            try:
-                return obj_type(value)  # Call constructor.
-            except ValueError:  # This constructor didn't work. Move on.
-                pass
-        raise ValueError(f"Cannot convert {val_str} to any of the following "
-                         f"types: {types}")
+        if results is not None and val_str[:1] == '_':
+            value = results.resolve(val_str)
+            if value is not NOT_A_REFERENCE:
+                return value
+        # Converters are compiled once per distinct list of types.
+        return get_converter(types)(val_str)
 
     def parse_args(self, func, arg_blocks, skip_self_or_cls: bool = True,
                    remaining_params_only: bool = False):
-        """For a given function and list of parameter inputs, parse out:
-        entered args, kwargs, remaining parameters, and
+        """For a given function (or its precompiled CallPlan) and list of
+        parameter inputs, parse out: entered args, kwargs, and remaining
+        parameters (as ParamSlots).
 
         Raise SyntaxError if input params are invalid.
         """
+        args, kwargs, remaining_params = \
+            self._match_args(func, arg_blocks, skip_self_or_cls,
+                             remaining_params_only)
+        if remaining_params_only:
+            return args, kwargs, remaining_params
+        return (*self._convert_args(args, kwargs), remaining_params)
+
+    def _convert_args(self, args, kwargs):
+        """Convert the (ParamSlot, text) pairs matched by _match_args to
+        values, passing references to earlier results as is."""
+        convert = self._convert_arg
+        return [convert(slot, text) for slot, text in args], \
+               {name: convert(slot, text) for name, (slot, text) in kwargs.items()}
+
+    def _convert_arg(self, slot, text):
+        """Convert an argument's text with its ParamSlot's converter, unless
+        it refers to an earlier result, e.g: _ or _3."""
+        if text[:1] == '_':
+            value = self.results.resolve(text)
+            if value is not NOT_A_REFERENCE:
+                return value
+        return slot.convert(text)
+
+    def _match_args(self, func, arg_blocks, skip_self_or_cls: bool = True,
+                    remaining_params_only: bool = False):
+        """Match input to parameters like parse_args, but leave the args and
+        kwargs as (ParamSlot, text) pairs to be converted."""
+        plan = func if isinstance(func, CallPlan) else CallPlan.from_callable(func)
+        slots = plan.slots
+        start = plan.first if skip_self_or_cls else 0
         args = []
         kwargs = {}
-        positional_params = [ParamKind.POSITIONAL_ONLY, ParamKind.POSITIONAL_OR_KEYWORD]
-        keyword_params = [ParamKind.POSITIONAL_OR_KEYWORD, ParamKind.KEYWORD_ONLY]
-        sig = signature(func)
-        remaining_params = OrderedDict(sig.parameters)
-        # Find **kwargs parameter if it exists.
-        varkwarg_search = [p for p in remaining_params.values() if p.kind == ParamKind.VAR_KEYWORD]
-        has_varkwargs = len(varkwarg_search) > 0
-        varkwarg_param = varkwarg_search[0] if len(varkwarg_search) else None
-
-        if skip_self_or_cls and remaining_params \
-                and list(remaining_params.values())[0].name in ['self', 'cls']:
-            remaining_params.popitem(last=False)
-        # Handle bail-early case: no params and no input.
-        if not len(remaining_params) and not arg_blocks:
-            return args, kwargs, list(remaining_params.values())
-        # Handle remaining cases.
-        # Match param to input (arg or kwarg).
+        cursor = start  # Index of the next slot to fill positionally.
+        filled = set()  # Indices of slots filled by name.
         parsing_kwargs = False  # Used to enforce args before kwargs
+        last_index = len(arg_blocks) - 1
+        # Match param to input (arg or kwarg).
         for index, arg_block in enumerate(arg_blocks):
-            sub_block, finished = container_split(arg_block, '=')
-            last_block = (index == (len(arg_blocks) - 1))
+            sub_block, finished = split_kwarg(arg_block)
             input_is_kwarg = len(sub_block) == 2
             parsing_kwargs = input_is_kwarg or parsing_kwargs
-            next_param = list(remaining_params.values())[0]
-            param_types = self.get_types(next_param)
-            if input_is_kwarg and (next_param.kind == ParamKind.POSITIONAL_ONLY):
-                raise SyntaxError(f"Next parameter {next_param.name} is position-only.")
-            try:
-                # arg cases
-                if not parsing_kwargs:
-                    arg = sub_block[0]
-                    if next_param.kind in positional_params:
-                        remaining_params.popitem(last=False)
-                        if remaining_params_only: # skip populating args.
-                            continue
-                        args.append(self.typed_eval(arg, param_types))
-                        continue
-                    if next_param.kind == ParamKind.VAR_POSITIONAL:
-                        if remaining_params_only: # skip populating args.
-                            continue
-                        args.append(self.typed_eval(arg, param_types))
-                        continue
-                # kwarg cases.
-                # Remove any *args present as soon as we start seeing kwargs.
-                if parsing_kwargs and next_param.kind == ParamKind.VAR_POSITIONAL:
-                    remaining_params.popitem(last=False)
-                    next_param = list(remaining_params.values())[0]
-                    param_types = self.get_types(next_param)
-                # Ensure final kwarg was fully entered. i.e: something after '='
-                if last_block and (not finished or (sub_block[1] == "")):
+            # arg cases
+            if not parsing_kwargs:
+                if cursor >= len(slots) or \
+                        slots[cursor].kind in (ParamKind.KEYWORD_ONLY,
+                                               ParamKind.VAR_KEYWORD):
+                    raise SyntaxError("Too many input arguments for the "
+                                      f"function: {func}.")
+                slot = slots[cursor]
+                # *args absorbs all remaining positional input.
+                if slot.kind != ParamKind.VAR_POSITIONAL:
+                    cursor += 1
+                if remaining_params_only: # skip populating args.
                     continue
-                kwarg_name, kwarg_val = sub_block
-                # kwargs can be input in any order.
-                if kwarg_name in remaining_params:
-                    del remaining_params[kwarg_name]
-                    if remaining_params_only: # skip populating args.
-                        continue
-                    kwargs[kwarg_name] = self.typed_eval(kwarg_val, param_types)
+                args.append((slot, sub_block[0]))
+                continue
+            # kwarg cases.
+            if cursor < len(slots) and slots[cursor].kind == ParamKind.POSITIONAL_ONLY:
+                raise SyntaxError(f"Next parameter {slots[cursor].name} is position-only.")
+            # When completing, skip a final kwarg that isn't fully entered
+            # yet, i.e: nothing after '='.
+            if remaining_params_only and index == last_index and \
+                    (not finished or not input_is_kwarg or sub_block[1] == ""):
+                continue
+            if not input_is_kwarg:
+                raise SyntaxError(f"Positional input: '{arg_block}' cannot "
+                                  "follow keyword input.")
+            kwarg_name, kwarg_val = sub_block
+            slot_index = plan.keywords.get(kwarg_name)
+            # kwargs can be input in any order.
+            if slot_index is not None and slot_index >= start:
+                if slot_index < cursor or slot_index in filled:
+                    raise SyntaxError(f"Parameter {kwarg_name} was entered "
+                                      "more than once.")
+                filled.add(slot_index)
+                if remaining_params_only: # skip populating args.
                     continue
-                # if **kwargs is present, we don't pop it until the end.
-                # Technically, this param will always remain.
-                elif has_varkwargs:
-                    if remaining_params_only: # skip populating args.
-                        continue
-                    kwargs[kwarg_name] = self.typed_eval(varkwarg_param, param_types)
+                kwargs[kwarg_name] = (slots[slot_index], kwarg_val)
+                continue
+            # if **kwargs is present, we don't remove it from the remaining
+            # params. Technically, this param will always remain.
+            elif plan.var_keyword is not None:
+                if remaining_params_only: # skip populating args.
                     continue
-                raise SyntaxError(f"Invalid parameter input: '{arg_block}' "
-                                  f"for parameter: {next_param.name}.")
-            except IndexError:
-                raise SyntaxError(f"Too many input arguments for the function: {func}.")
-        return args, kwargs, list(remaining_params.values())
+                kwargs[kwarg_name] = (slots[plan.var_keyword], kwarg_val)
+                continue
+            raise SyntaxError(f"Invalid parameter input: '{arg_block}' "
+                              f"for the function: {func}.")
+        # Any *args present are removed as soon as we start seeing kwargs.
+        remaining_params = [slots[i] for i in range(cursor, len(slots))
+                            if i not in filled and not (parsing_kwargs and
+                                i == plan.var_positional)]
+        return args, kwargs, remaining_params
 
     def get_remaining_params(self, func, arg_blocks, skip_self_or_cls = True):
         return self.parse_args(func, arg_blocks, skip_self_or_cls=skip_self_or_cls,
                                remaining_params_only=True)[2]
 
+    def parse_line(self, line):
+        """Resolve a line of input into the function to call and its inputs.
+
+        Return a tuple (fn_name, func, args, kwargs) where args includes any
+        'self' or 'cls' argument.
+        Raise UserInputError or SyntaxError if the line is invalid.
+        """
+        # Extract fn and arg/kwarg blocks.
+        try:
+            fn_name, args_and_kwargs_str = line.split(maxsplit=1)
+        except ValueError:
+            fn_name = line.split()[0]
+            args_and_kwargs_str = ""
+        # Built-ins get the rest of the line as is.
+        if fn_name in self.line_commands:
+            return fn_name, self.line_commands[fn_name], [args_and_kwargs_str], {}
+        # Extract function, e.g: move of the sub-object for stage.x_axis.move.
+        omm, method_name = self.command_manager(fn_name)
+        # Property getter shortcut.
+        if not args_and_kwargs_str.strip() and method_name in omm.property_getters:
+            func = omm.property_getters[method_name]
+            plan = omm.property_getter_plans[method_name]
+        elif method_name in omm.methods:
+            func = omm.methods[method_name]
+            plan = omm.call_plans[method_name]
+        else:
+            raise UserInputError(f"{fn_name} is not a callable method.")
+        args_and_kwargs, _ = self._timed('tokenize', container_split,
+                                         args_and_kwargs_str)
+        # Convert raw input to input appropriate for the signature.
+        args, kwargs, _ = self._timed('parse_args', self._match_args, plan,
+                                      args_and_kwargs)
+        args, kwargs = self._timed('typed_eval', self._convert_args, args, kwargs)
+        # Prepend 'self' or 'cls'.
+        if plan.bound_param == 'self':
+            args = [omm.class_instance] + args
+        elif plan.bound_param == 'cls':
+            args = [omm.class_instance.__class__] + args
+        return fn_name, func, args, kwargs
+
+    def get_event_loop(self):
+        """Return the event loop that coroutine methods run on.
+
+        The same loop is used for the whole session, so tasks started by
+        one command keep running for the next. Unless the backend runs the
+        loop itself, it runs forever in a background thread.
+        """
+        with self._loop_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+            if not self.loop.is_running() and self._loop_thread is None:
+                self._loop_thread = threading.Thread(
+                    target=self.loop.run_forever, name="inpromptu-loop",
+                    daemon=True)
+                self._loop_thread.start()
+            return self.loop
+
+    def run_coroutine(self, awaitable):
+        """Run an awaitable on the event loop from another thread and return
+        its result. Ctrl-C cancels it."""
+        loop = self.get_event_loop()
+        if loop.is_running() and self._in_loop_thread(loop):
+            raise RuntimeError("Can't wait for a coroutine on the thread "
+                               "running the event loop.")
+        if not asyncio.iscoroutine(awaitable):
+            awaitable = _await(awaitable)
+        future = asyncio.run_coroutine_threadsafe(awaitable, loop)
+        try:
+            return future.result()
+        except KeyboardInterrupt:
+            future.cancel()
+            raise
+
+    @staticmethod
+    def _in_loop_thread(loop):
+        try:
+            return asyncio.get_running_loop() is loop
+        except RuntimeError:
+            return False
+
+    def iterate_async(self, async_iterator):
+        """Yield the items of an async iterator as the event loop produces
+        them."""
+        try:
+            while True:
+                try:
+                    yield self.run_coroutine(async_iterator.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            # Let the generator clean up if we stopped early.
+            if inspect.isasyncgen(async_iterator):
+                self.run_coroutine(async_iterator.aclose())
+
+    def _call(self, func, args, kwargs):
+        """Call func, running the result to completion if it's awaitable."""
+        result = func(*args, **kwargs)
+        if inspect.isawaitable(result):
+            return self.run_coroutine(result)
+        return result
+
+    def invoke(self, fn_name, func, args, kwargs):
+        """Call a function parsed from user input and return its result.
+        Coroutines are run on the event loop."""
+        self.log.debug(f"Calling fn {fn_name} with args: {args}, "
+                       f"kwargs: {kwargs}")
+        try:
+            if not self._phase_hooks:
+                return self._call(func, args, kwargs)
+            return self._timed('invocation', self._call, func, args, kwargs)
+        # Reset any completions set during this function.
+        finally:
+            self.completions = None
+
+    def is_background(self, line):
+        """Return True if a line of input asks to run in the background."""
+        return line.rstrip().endswith(self.JOB_SUFFIX)
+
+    def submit_job(self, line):
+        """Parse a line of input, with or without its trailing JOB_SUFFIX,
+        and run it in the background. Return the Job.
+
+        Raise UserInputError or SyntaxError right away if the line is
+        invalid.
+        """
+        line = line.rstrip()
+        if line.endswith(self.JOB_SUFFIX):
+            line = line[:-len(self.JOB_SUFFIX)].rstrip()
+        if not line:
+            raise UserInputError(f"Usage: <command> [args...] {self.JOB_SUFFIX}")
+        start = self._command_started(line)
+        try:
+            fn_name, func, args, kwargs = self.parse_line(line)
+        except Exception as e:
+            self._command_finished(line, start, e)
+            raise
+
+        # Coroutines run concurrently on the event loop rather than a thread.
+        if self.coroutine_jobs_on_loop and inspect.iscoroutinefunction(func):
+            async def run_async_job():
+                error = None
+                try:
+                    return await func(*args, **kwargs)
+                except (Exception, asyncio.CancelledError) as e:
+                    error = e
+                    raise
+                finally:
+                    self._command_finished(line, start, error)
+            return self.jobs.submit_coroutine(line, run_async_job(),
+                                              self.get_event_loop())
+
+        def run_job():
+            error = None
+            try:
+                return self.invoke(fn_name, func, args, kwargs)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self._command_finished(line, start, error)
+        return self.jobs.submit(line, run_job)
+
+    def onecmd(self, line):
+        """Parse and execute a single line of input. Return the result, or
+        the Job if the line runs in the background."""
+        if self.is_background(line):
+            return self.submit_job(line)
+        start = self._command_started(line)
+        try:
+            result = self.invoke(*self.parse_line(line))
+        except Exception as e:
+            self._command_finished(line, start, e)
+            raise
+        self._command_finished(line, start)
+        return result
+
+    def render(self, return_val):
+        """Display a command's return value, timing it if instrumented.
+
+        The items of iterators (e.g: generators) and async generators are
+        displayed as they are produced. Sequences longer than
+        stream_threshold are displayed an item at a time too, up to
+        max_items of them, except as JSON lines, where they're one line.
+        Other results are kept in the results history, except background
+        Jobs, whose values are kept once fetched with 'result' or 'wait'.
+        """
+        if return_val is not None and not isinstance(return_val, Iterator) \
+                and not inspect.isasyncgen(return_val) \
+                and not isinstance(return_val, Job):
+            self.results.add(return_val)
+        if inspect.isasyncgen(return_val):
+            self.render_items(self.iterate_async(return_val))
+        elif isinstance(return_val, Iterator):
+            self.render_items(return_val)
+        elif self.output_format == 'text' and \
+                isinstance(return_val, (Sequence, Set, Mapping)) and \
+                not isinstance(return_val, (str, bytes, bytearray)) and \
+                len(return_val) > self.stream_threshold:
+            text = self.formatter.format
+            items = (f"{text(key)}: {text(value)}"
+                     for key, value in return_val.items()) \
+                if isinstance(return_val, Mapping) else iter(return_val)
+            self.render_items(items, total=len(return_val))
+        else:
+            self._timed('rendering', self.print_result, return_val)
+
+    def render_items(self, items, total: int = None):
+        """Display items one at a time as the iterator produces them, pausing
+        every page_size items. Ctrl-C stops the display and closes the
+        iterator, but not the prompt.
+
+        :param total: number of items, if known. At most max_items of them
+            are displayed.
+        """
+        shown = 0
+        try:
+            for item in items:
+                self._timed('rendering', self.print_result, item)
+                sys.stdout.flush()
+                shown += 1
+                if total is not None and total > shown >= self.max_items:
+                    print(f"... {total - shown} more items")
+                    break
+                if self.page_size and shown % self.page_size == 0 and \
+                        not self.more(shown, total):
+                    break
+        except KeyboardInterrupt:
+            print(f"\nStopped after {shown} items.")
+        finally:
+            # Let generators clean up if they didn't finish.
+            close = getattr(items, 'close', None)
+            if close is not None:
+                close()
+
+    def more(self, shown: int, total: int = None):
+        """Ask whether to display more items of a streamed result. Return
+        False to stop."""
+        of_total = "" if total is None else f" of {total}"
+        try:
+            answer = input(f"-- {shown}{of_total} shown. Enter for more, "
+                           "q to stop -- ")
+        except (EOFError, KeyboardInterrupt):
+            return False
+        return answer.strip().lower() != 'q'
+
+    def time_command(self, line: str):
+        """Run a command and print how long each phase of it took."""
+        if not line.strip():
+            raise UserInputError("Usage: time <command> [args...]")
+        timer = PhaseTimer()
+        self.add_instrumentation(timer)
+        try:
+            self.render(self.onecmd(line))
+        finally:
+            self.remove_instrumentation(timer)
+            print(timer.report())
+
+    def stats_command(self, line: str):
+        """Print per-command call counts, errors and latencies.
+
+        'stats reset' clears them. 'stats export <path> [prometheus|jsonl]'
+        writes them to a file; the format defaults to the file extension.
+        """
+        action, *args = line.split() or ["show"]
+        if action == "show" and not args:
+            print(self.stats.report())
+        elif action == "reset" and not args:
+            self.stats.reset()
+        elif action == "export" and 1 <= len(args) <= 2:
+            self.stats.export(*args)
+        else:
+            raise UserInputError("Usage: stats [reset | export <path> "
+                                 "[prometheus|jsonl]]")
+
+    def profile_command(self, line: str):
+        """Run a command under cProfile and print its most expensive calls."""
+        if not line.strip():
+            raise UserInputError("Usage: profile <command> [args...]")
+        fn_name, func, args, kwargs = self.parse_line(line)
+        profiler = cProfile.Profile()
+        try:
+            self.render(profiler.runcall(self.invoke, fn_name, func, args, kwargs))
+        finally:
+            stats = pstats.Stats(profiler, stream=sys.stdout)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE)
+            stats.print_stats(self.profile_entries)
+
+    def jobs_command(self, line: str):
+        """List background jobs. Run a command in the background by ending
+        it with '&'."""
+        if line.strip():
+            raise UserInputError("Usage: jobs")
+        print(self.jobs.report())
+
+    def wait_command(self, line: str):
+        """Wait for background jobs (default: all of them) to finish.
+        Return the result of a single job."""
+        job_ids = line.split()
+        try:
+            self.jobs.wait(job_ids or None)
+        except KeyboardInterrupt:
+            print("Stopped waiting. Jobs are still running.")
+            return None
+        if len(job_ids) == 1:
+            return self.result_command(job_ids[0])
+
+    def result_command(self, line: str):
+        """Print what a finished background job printed and return its
+        result. Raise the exception the job raised, if it did."""
+        if len(line.split()) != 1:
+            raise UserInputError("Usage: result <job id>")
+        job = self.jobs.get(line.strip())
+        if job.status in ("pending", "running"):
+            raise UserInputError(f"Job {job.id} is still {job.status}.")
+        if job.status == "cancelled":
+            raise UserInputError(f"Job {job.id} was cancelled.")
+        print(job.output, end="")
+        return job.future.result()
+
+    def cancel_command(self, line: str):
+        """Cancel background jobs that haven't started running yet."""
+        job_ids = line.split()
+        if not job_ids:
+            raise UserInputError("Usage: cancel <job id> [<job id>...]")
+        for job_id in job_ids:
+            self.jobs.cancel(job_id)
+
+    def history_command(self, line: str):
+        """List the kept results, which can be passed to commands as _ (the
+        latest) or _N. 'history clear' forgets them."""
+        if line.strip() == "clear":
+            self.results.clear()
+            return
+        if line.strip():
+            raise UserInputError("Usage: history [clear]")
+        for number, value in self.results.items():
+            text = self.formatter.format(value).replace("\n", " ")
+            print(f"_{number}: {elide(text, self.history_width)}")
+
+    def print_result(self, return_val):
+        """Display a command's return value with the formatter, as text or
+        as a line of JSON according to output_format."""
+        if return_val is None:
+            return
+        if self.output_format == 'jsonl':
+            print(self.formatter.to_json_line(return_val))
+        else:
+            print(self.formatter.format(return_val))
+
     def cmdloop(self, loop=True):
         """Repeatedly issue a prompt, accept input, and dispatch to action
         methods, passing them the line remainder as argument.
@@ -244,47 +819,92 @@ class InpromptuBase(ABC):
                 line = self.input()
                 if line.lstrip() == "":
                     continue
-                # Extract fn and arg/kwarg blocks.
-                try:
-                    fn_name, args_and_kwargs_str = line.split(maxsplit=1)
-                except ValueError:
-                    fn_name = line.split()[0]
-                    args_and_kwargs_str = ""
-                # Extract function.
-                # Property getter shortcut.
-                if not args_and_kwargs_str.strip() and fn_name in self.omm.property_getters:
-                    func = self.omm.property_getters[fn_name]
-                else:
-                    func = self.omm.methods[fn_name]
-                args_and_kwargs, _ = container_split(args_and_kwargs_str)
-                params = list(signature(func).parameters.keys())
-                # Convert raw input to input appropriate for the signature.
-                args, kwargs, _ = self.parse_args(func, args_and_kwargs)
-                # Prepend 'self' or 'cls'.
-                if params:
-                    if params[0] == 'self':
-                        args = [self.omm.class_instance] + args
-                    if params[0] == 'cls':
-                        args = [self.omm.class_instance.__class__] + args
-                # Invoke the function
-                return_val = None
-                try:
-                    self.log.debug(f"Calling fn {fn_name} with args: {args}, "
-                                   f"kwargs: {kwargs}")
-                    return_val = func(*args, **kwargs)
-                except Exception as e:
-                    self.log.error(f"{fn_name} raised an exception while being executed.")
-                    print(traceback.format_exc())
-                # Reset any completions set during this function.
-                finally:
-                    self.completions = None
-                if return_val is not None:
-                    print(return_val)
-            except (EOFError, ValueError, UserInputError) as e:
-                print(traceback.format_exc())
-            except KeyboardInterrupt:
+                self.run_line(line)
+            except (EOFError, KeyboardInterrupt):
                 print()
                 return
             if not loop:
                 return
 
+    def run_line(self, line):
+        """Execute a line of input as cmdloop does, printing the result or a
+        traceback of what went wrong. Return the error, if any."""
+        if self.is_background(line):
+            try:
+                print(self.submit_job(line))
+            except Exception as e:
+                print(traceback.format_exc())
+                return e
+            return None
+        start = self._command_started(line)
+        error = None
+        try:
+            fn_name, func, args, kwargs = self.parse_line(line)
+            # Invoke the function and display the result. Streamed results
+            # (e.g: generators) may raise while being displayed too.
+            try:
+                self.render(self.invoke(fn_name, func, args, kwargs))
+            except Exception as e:
+                error = e
+                self.log.error(f"{fn_name} raised an exception while being executed.")
+                print(traceback.format_exc())
+        except Exception as e:
+            error = e
+            print(traceback.format_exc())
+        finally:
+            self._command_finished(line, start, error)
+        return error
+
+    def run_script(self, lines, stop_on_error: bool = True):
+        """Execute commands from an iterable of lines without prompting.
+
+        Lines are consumed lazily, so a file or stdin can be streamed.
+        Blank lines and lines starting with '#' are skipped.
+        Errors are reported as one line on stderr rather than a traceback.
+
+        :param lines: iterable of command strings.
+        :param stop_on_error: if True, stop at the first failing command.
+            Otherwise, continue on with the next command.
+        :return: a BatchSummary of the run.
+        """
+        summary = BatchSummary()
+        for line_number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            summary.executed += 1
+            try:
+                self.render(self.onecmd(line))
+            except Exception as e:
+                summary.errors.append((line_number, line, e))
+                print(f"Error on line {line_number} ({line}): "
+                      f"{e.__class__.__name__}: {e}", file=sys.stderr)
+                if stop_on_error:
+                    summary.stopped = True
+                    break
+        return summary
+
+
+class BatchSummary:
+    """Outcome of running a batch of commands with run_script."""
+
+    def __init__(self):
+        """Constructor."""
+        self.executed = 0
+        self.errors = [] # (line number, line, exception) tuples.
+        self.stopped = False # True if the run stopped early on an error.
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+    @property
+    def succeeded(self):
+        return self.executed - self.failed
+
+    def __str__(self):
+        summary = f"{self.executed} commands executed, {self.succeeded} " \
+                  f"succeeded, {self.failed} failed."
+        if self.stopped:
+            summary += f" Stopped on line {self.errors[-1][0]}."
+        return summary
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""Non-interactive implementation of Inpromptu for running command scripts."""
+
+from .inpromptu_base import InpromptuBase
+
+
+class Inpromptu(InpromptuBase):
+    """Dispatches commands from an iterable of lines instead of a terminal.
+
+    No readline or prompt_toolkit state is initialized, so this backend
+    starts instantly and works in piped and headless sessions.
+    """
+
+    def __init__(self, class_instance, methods_to_skip = [], lines = (),
+                 snapshot = None):
+        """Constructor."""
+        super().__init__(class_instance, methods_to_skip=methods_to_skip,
+                         snapshot=snapshot)
+        self.lines = iter(lines)
+
+    def input(self, prompt=None):
+        """Return the next line of input. Raise EOFError when exhausted."""
+        try:
+            return next(self.lines)
+        except StopIteration:
+            raise EOFError
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""Prompt that runs each command on many instances of a class at once."""
+
+import asyncio
+import copy
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from functools import partial
+from time import perf_counter
+from . import Inpromptu as DefaultInpromptu
+from .errors import UserInputError
+from .metrics import format_seconds
+from .object_method_manager import ObjectManager
+
+
+class BroadcastResult:
+    """Per-instance outcomes of a broadcast command, in selection order."""
+
+    def __init__(self):
+        """Constructor."""
+        self.results = {} # name -> (value, error, seconds)
+
+    def __getitem__(self, name):
+        """Return an instance's value, or raise the error it raised."""
+        value, error, _ = self.results[name]
+        if error is not None:
+            raise error
+        return value
+
+    @property
+    def values(self):
+        """Values of the instances that succeeded."""
+        return {name: value for name, (value, error, _) in self.results.items()
+                if error is None}
+
+    @property
+    def errors(self):
+        """Errors of the instances that failed."""
+        return {name: error for name, (_, error, _) in self.results.items()
+                if error is not None}
+
+    def __str__(self):
+        width = max(len("instance"), *(len(name) for name in self.results))
+        lines = [f"{'instance':<{width}} {'time':>9}  result"]
+        for name, (value, error, seconds) in self.results.items():
+            outcome = f"{error.__class__.__name__}: {error}" \
+                if error is not None else ("" if value is None else str(value))
+            lines.append(f"{name:<{width}} {format_seconds(seconds)}  {outcome}")
+        if self.errors:
+            lines.append(f"{len(self.errors)} of {len(self.results)} "
+                         "instances failed.")
+        return "\n".join(lines)
+
+
+class BroadcastMixin:
+    """Runs each command on all (or a selected subset) of several instances
+    of the same class, in parallel on a pool of threads.
+
+    Completion, parsing and conversion are done once, using the first
+    instance. Prefix a command with @<selector> to run it on a subset, or
+    change the default subset with the 'select' built-in. A selector is a
+    comma-separated list of instance names, name ranges (first-last) and
+    glob patterns (e.g: @ch1*).
+    """
+
+    # Most instances a command runs on at once.
+    max_broadcast_workers = 32
+    SELECT_PREFIX = '@'
+
+    def __init__(self, instances, *args, **kwargs):
+        """Constructor. instances is a dict of instances by name, or a list
+        of them, named by index."""
+        if not isinstance(instances, dict):
+            instances = {str(index): instance
+                         for index, instance in enumerate(instances)}
+        if not instances:
+            raise ValueError("At least one instance is required.")
+        self.instances = {str(name): instance
+                          for name, instance in instances.items()}
+        first = next(iter(self.instances.values()))
+        for name, instance in self.instances.items():
+            if type(instance) is not type(first):
+                raise TypeError(f"Instance {name} is a "
+                                f"{type(instance).__name__}, not a "
+                                f"{type(first).__name__}.")
+        super().__init__(first, *args, **kwargs)
+        self.selected = list(self.instances)
+        if 'select' not in self.omm.callables:
+            self.line_commands['select'] = self.select_command
+        self._broadcast_executor = ThreadPoolExecutor(
+            max_workers=min(self.max_broadcast_workers, len(self.instances)),
+            thread_name_prefix="inpromptu-broadcast")
+
+    def select_instances(self, selector: str):
+        """Return the names of the instances a selector picks, in order."""
+        names = list(self.instances)
+        picked = set()
+        for part in filter(None, selector.split(',')):
+            if part == "all":
+                picked.update(names)
+            elif part in self.instances:
+                picked.add(part)
+            elif '-' in part and all(end in self.instances
+                                     for end in part.split('-', 1)):
+                first, last = sorted(names.index(end)
+                                     for end in part.split('-', 1))
+                picked.update(names[first:last + 1])
+            else:
+                matches = [name for name in names if fnmatchcase(name, part)]
+                if not matches:
+                    raise UserInputError(f"No instance matches '{part}'. "
+                                         f"Instances are: {', '.join(names)}.")
+                picked.update(matches)
+        if not picked:
+            raise UserInputError("No instances selected.")
+        return [name for name in names if name in picked]
+
+    def _split_selector(self, line):
+        """Return the selected instance names and the rest of the line."""
+        stripped = line.lstrip()
+        if not stripped.startswith(self.SELECT_PREFIX):
+            return self.selected, line
+        selector, _, rest = stripped[len(self.SELECT_PREFIX):].partition(
+            self.__class__.DELIM)
+        return self.select_instances(selector), rest
+
+    def command_name(self, line):
+        if line.lstrip().startswith(self.SELECT_PREFIX):
+            line = line.lstrip().partition(self.__class__.DELIM)[2]
+        return super().command_name(line)
+
+    def strip_line_commands(self, line):
+        # Complete the command after any @<selector>.
+        if line.lstrip().startswith(self.SELECT_PREFIX):
+            _, delim, line = line.lstrip().partition(self.__class__.DELIM)
+            if not delim:
+                return ""
+        return super().strip_line_commands(line)
+
+    def parse_line(self, line):
+        """Parse a line as usual, but return a function that calls the
+        method on each selected instance and returns a BroadcastResult."""
+        names, line = self._split_selector(line)
+        if not line.strip():
+            raise UserInputError(f"Usage: {self.SELECT_PREFIX}<selector> "
+                                 "<command> [args...]")
+        fn_name, func, args, kwargs = super().parse_line(line)
+        if fn_name in self.line_commands:
+            return fn_name, func, args, kwargs
+        # Call sub-objects' methods (e.g: stage.x_axis.move) on the object at
+        # the same path of each instance.
+        target = self.omm.class_instance
+        path = fn_name.rpartition(self.objects.SEPARATOR)[0]
+        if path and args and args[0] is self.objects.resolve(path):
+            func = partial(_call_at_path, path, func)
+            args = [target, *args[1:]]
+        elif not args or (args[0] is not target and args[0] is not type(target)):
+            # Not bound to the instance, e.g: help. Run it once.
+            return fn_name, func, args, kwargs
+        return fn_name, partial(self.broadcast, names, func), args, kwargs
+
+    def broadcast(self, names, func, *args, **kwargs):
+        """Call func on each named instance in place of the first instance
+        (or its class) in args. Return a BroadcastResult."""
+        target = self.omm.class_instance
+        bound, inputs = (args[0], list(args[1:])) \
+            if args and (args[0] is target or args[0] is type(target)) \
+            else (None, list(args))
+        calls = []
+        for index, name in enumerate(names):
+            instance = self.instances[name]
+            # Each instance gets its own copy of (possibly mutable) inputs.
+            call_args = inputs if index == 0 else copy.deepcopy(inputs)
+            call_kwargs = kwargs if index == 0 else copy.deepcopy(kwargs)
+            if bound is target:
+                call_args = [instance, *call_args]
+            elif bound is not None:
+                call_args = [type(instance), *call_args]
+            calls.append((name, call_args, call_kwargs))
+        if inspect.iscoroutinefunction(func):
+            outcomes = self.run_coroutine(_gather_timed(func, calls))
+        else:
+            outcomes = self._broadcast_executor.map(
+                lambda call: self._timed_call(func, call[1], call[2]), calls)
+        result = BroadcastResult()
+        for (name, _, _), outcome in zip(calls, outcomes):
+            result.results[name] = outcome
+        return result
+
+    def _timed_call(self, func, args, kwargs):
+        """Return (value, error, seconds) of calling func."""
+        start = perf_counter()
+        try:
+            return self._call(func, args, kwargs), None, perf_counter() - start
+        except Exception as e:
+            return None, e, perf_counter() - start
+
+    def select_command(self, line: str):
+        """Choose the instances commands run on by default, e.g:
+        'select ch0-ch7', 'select all'. Without a selector, list them."""
+        if line.strip():
+            self.selected = self.select_instances(line.strip())
+        print(f"{len(self.selected)} of {len(self.instances)} instances "
+              f"selected: {', '.join(self.selected)}")
+
+
+def _call_at_path(path, func, instance, *args, **kwargs):
+    """Call func on the object at a dotted path of attributes of instance."""
+    for name in path.split(ObjectManager.SEPARATOR):
+        instance = getattr(instance, name)
+    return func(instance, *args, **kwargs)
+
+
+async def _gather_timed(func, calls):
+    """Await func for each (name, args, kwargs) call at once. Return their
+    (value, error, seconds) outcomes."""
+    return await asyncio.gather(*(_timed_coroutine(func, args, kwargs)
+                                  for _, args, kwargs in calls))
+
+
+async def _timed_coroutine(func, args, kwargs):
+    """Return (value, error, seconds) of awaiting func."""
+    start = perf_counter()
+    try:
+        return await func(*args, **kwargs), None, perf_counter() - start
+    except Exception as e:
+        return None, e, perf_counter() - start
+
+
+class Inpromptu(BroadcastMixin, DefaultInpromptu):
+    """Interactive prompt that broadcasts commands to many instances."""
+    pass
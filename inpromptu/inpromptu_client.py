@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Thin client for a prompt served by inpromptu_server.
+
+Usage: python -m inpromptu.inpromptu_client [unix:PATH | HOST:PORT]
+"""
+
+import itertools
+import json
+import socket
+import sys
+import traceback
+from .inpromptu_server import parse_address
+
+
+class InpromptuClient:
+    """Connection to an Inpromptu server. Runs and completes commands remotely."""
+
+    def __init__(self, address = "127.0.0.1:7777", timeout = None):
+        """Constructor. Connect to the server."""
+        kind, address = parse_address(address)
+        if kind == 'unix':
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+        self.stream = self.sock.makefile('rwb')
+        self._ids = itertools.count(1)
+        self.prompt = self._receive().get("prompt", ">>>")
+
+    def close(self):
+        self.stream.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _receive(self):
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError("Server closed the connection.")
+        return json.loads(line)
+
+    def request(self, op: str, **fields):
+        """Send a request and return the server's response."""
+        request_id = next(self._ids)
+        self.stream.write(json.dumps({"id": request_id, "op": op, **fields})
+                          .encode() + b"\n")
+        self.stream.flush()
+        response = self._receive()
+        if response.get("id") != request_id:
+            raise ConnectionError(f"Expected a response to request {request_id}, "
+                                  f"got: {response}")
+        return response
+
+    def run(self, line: str):
+        """Run a line of input remotely. Return (output, error) where error
+        describes any exception the command raised."""
+        response = self.request("run", line=line)
+        return response.get("output", ""), response.get("error")
+
+    def complete(self, line: str, text: str = None):
+        """Return the completion matches for text given the whole line, and
+        display hints for them."""
+        if text is None:
+            text = line.rsplit(" ", 1)[-1]
+        response = self.request("complete", line=line, text=text)
+        return response.get("matches", []), response.get("hints", {})
+
+    def cmdloop(self):
+        """Prompt for commands and run them remotely, with tab completion."""
+        import readline
+        from .inpromptu_readline import print_columnized_list
+        completion_cache = None
+        hints = {}
+
+        def complete(text, state):
+            nonlocal completion_cache, hints
+            try:
+                line = readline.get_line_buffer()
+                if completion_cache is None or completion_cache[0] != (line, text):
+                    matches, hints = self.complete(line, text)
+                    # Omit a match that is already fully typed.
+                    completion_cache = ((line, text),
+                                        [m for m in matches if m != text.lstrip()])
+                return completion_cache[1][state]
+            except IndexError:
+                return None
+            except Exception:
+                traceback.print_exc()
+
+        def display_matches(substitution, matches, longest_match_length):
+            print()
+            print_columnized_list([hints.get(m, m) for m in matches])
+            print(self.prompt + " ", readline.get_line_buffer(), sep='', end='',
+                  flush=True)
+
+        readline.set_completer(complete)
+        readline.set_completer_delims("= ")
+        readline.set_completion_display_matches_hook(display_matches)
+        readline.parse_and_bind("tab: complete")
+        while True:
+            try:
+                line = input(self.prompt + " ")
+            except (EOFError, KeyboardInterrupt):
+                print()
+                return
+            if not line.strip():
+                continue
+            output, _ = self.run(line)
+            print(output, end="")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    with InpromptuClient(*argv[:1]) as client:
+        client.cmdloop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,590 @@
+#!/usr/bin/env python3
+"""Prompt for an object that lives in a separate worker process.
+
+The prompt holds only the object's method definitions, so completion,
+parsing and conversion never wait on the object. Commands are sent to the
+worker over a pipe as (path, method, args, kwargs) with already converted
+arguments. Large bytes-like and NumPy array results come back through
+shared memory rather than the pipe, as views of the block the worker copied
+them into. If the worker hangs, Ctrl-C interrupts it and 'restart' replaces
+it without ending the session.
+
+Messages are pickled tuples. Requests are (id, op, args) with op one of
+'describe', 'call' or 'stop'. Responses are (id, response) where response is
+a separately pickled (value, error, traceback, output), so that a response
+the prompt can't unpickle fails only its own request.
+"""
+
+import ctypes
+import logging
+import os
+import pickle
+import queue
+import signal
+import sys
+import threading
+import traceback
+import weakref
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import NamedTuple, Optional
+from . import Inpromptu as DefaultInpromptu
+from . import capture
+from .completions import PrefixIndex
+from .errors import UserInputError
+from .object_method_manager import ObjectManager, ObjectMethodManager
+
+
+class WorkerError(RuntimeError):
+    """The worker process exited, was interrupted or stopped responding."""
+    pass
+
+
+class RemoteTraceback(Exception):
+    """Traceback of an exception raised in the worker process."""
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.text = text
+
+    def __str__(self):
+        return f"\n\"\"\"\n{self.text}\"\"\""
+
+
+class SharedResult(NamedTuple):
+    """A result left in shared memory by the worker process."""
+    name: str # of the SharedMemory block.
+    size: int # in bytes.
+    kind: str # 'bytes', 'bytearray' or 'ndarray'.
+    dtype: Optional[str] = None
+    shape: Optional[tuple] = None
+
+
+def share_result(value, min_bytes: int):
+    """Copy a bytes-like result or NumPy array of at least min_bytes into
+    shared memory. Return a SharedResult, or value itself if it is smaller
+    or of another type."""
+    numpy = sys.modules.get('numpy')
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        data = memoryview(value)
+        kind = 'bytearray' if isinstance(value, bytearray) else 'bytes'
+        if data.nbytes < min_bytes:
+            return value
+        if not data.c_contiguous:
+            data = memoryview(data.tobytes())
+        memory = SharedMemory(create=True, size=data.nbytes)
+        try:
+            memory.buf[:data.nbytes] = data.cast('B')
+        finally:
+            memory.close()
+        return SharedResult(memory.name, data.nbytes, kind)
+    if numpy is not None and isinstance(value, numpy.ndarray) and \
+            not value.dtype.hasobject and value.nbytes >= max(min_bytes, 1):
+        memory = SharedMemory(create=True, size=value.nbytes)
+        try:
+            view = numpy.ndarray(value.shape, value.dtype, buffer=memory.buf)
+            view[...] = value
+            del view
+        finally:
+            memory.close()
+        return SharedResult(memory.name, value.nbytes, 'ndarray',
+                            value.dtype.str, value.shape)
+    return value
+
+
+def unshare_result(shared: SharedResult):
+    """Return a view of a SharedResult's shared memory: a NumPy array, or a
+    memoryview of a bytes-like result (read-only for bytes).
+
+    The block is unlinked right away, and closed once the view (and any
+    other view of it) is no longer used.
+    """
+    memory = SharedMemory(shared.name)
+    try:
+        memory.unlink() # Mapped until closed.
+        # Views are of a ctypes array at the block's address rather than of
+        # memory.buf, which memory.close() needs to release.
+        address = ctypes.addressof(ctypes.c_char.from_buffer(memory.buf))
+        block = (ctypes.c_ubyte * shared.size).from_address(address)
+    except BaseException:
+        memory.close()
+        raise
+    # Views keep block alive; close the memory once the last one is gone.
+    weakref.finalize(block, memory.close).atexit = False
+    if shared.kind == 'ndarray':
+        import numpy
+        return numpy.frombuffer(block, numpy.dtype(shared.dtype)) \
+            .reshape(shared.shape)
+    view = memoryview(block).cast('B')
+    return view if shared.kind == 'bytearray' else view.toreadonly()
+
+
+def _worker_main(connection, target, methods_to_skip, snapshot,
+                 min_shared_bytes):
+    """Run the worker process: build the target and serve requests.
+
+    Calls run one at a time on the main thread so that SIGINT (sent by
+    WorkerProcess.interrupt) interrupts them. Requests are read and
+    responses written on other threads, which signals never interrupt.
+    'describe' requests are answered right away, even while a call runs.
+    """
+    # Don't receive the terminal's Ctrl-C; the prompt forwards it.
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    from .inpromptu_batch import Inpromptu as BatchInpromptu
+    from .__main__ import load_target
+    stdout = capture.install()
+    outbox = queue.SimpleQueue()
+    calls = queue.SimpleQueue()
+
+    def respond(request_id, value=None, error=None, output=""):
+        """Queue a response, falling back to an error for values and
+        exceptions that can't be pickled."""
+        traceback_text = None
+        if error is not None:
+            traceback_text = "".join(traceback.format_exception(
+                type(error), error, error.__traceback__))
+        try:
+            response = pickle.dumps((value, error, traceback_text, output),
+                                    pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            if isinstance(value, SharedResult):
+                unshare_result(value)
+            if error is None:
+                error = TypeError(f"A {type(value).__name__} result can't be "
+                                  f"sent from the worker process: {e}")
+            else:
+                error = WorkerError(f"{error.__class__.__name__}: {error}")
+            response = pickle.dumps((None, error, traceback_text, output),
+                                    pickle.HIGHEST_PROTOCOL)
+        outbox.put(pickle.dumps((request_id, response), pickle.HIGHEST_PROTOCOL))
+
+    def send():
+        while True:
+            message = outbox.get()
+            if message is None:
+                return
+            connection.send_bytes(message)
+
+    try:
+        instance = load_target(target) if isinstance(target, str) else target()
+        prompt = BatchInpromptu(instance, methods_to_skip=methods_to_skip,
+                                snapshot=snapshot)
+    except BaseException as e:
+        error = WorkerError(f"Could not create the target: "
+                            f"{e.__class__.__name__}: {e}")
+        connection.send_bytes(pickle.dumps(
+            (0, pickle.dumps((None, error, traceback.format_exc(), "")))))
+        return
+
+    def describe(path):
+        """Return the definitions of the object at path and the names of
+        its sub-objects."""
+        obj = prompt.objects.resolve(path)
+        definitions = prompt.objects.manager(obj).get_definitions()
+        # Skip definitions that can't be sent, e.g: unpicklable defaults.
+        for kind in ['methods', 'property_getters']:
+            for name, definition in list(definitions[kind].items()):
+                try:
+                    pickle.dumps(definition)
+                except Exception as e:
+                    prompt.log.warning(f"Cannot send the definition of "
+                                       f"{path}{'.' if path else ''}{name}: {e}")
+                    del definitions[kind][name]
+        return {'id': id(obj), 'children': prompt.objects.children(obj).words,
+                **definitions}
+
+    def receive():
+        try:
+            while True:
+                request_id, op, args = pickle.loads(connection.recv_bytes())
+                if op == 'describe':
+                    try:
+                        respond(request_id, describe(*args))
+                    except Exception as e:
+                        respond(request_id, error=e)
+                else:
+                    calls.put((request_id, op, args))
+        except (EOFError, OSError):
+            calls.put((None, 'stop', ()))
+
+    threading.Thread(target=send, name="inpromptu-worker-send",
+                     daemon=True).start()
+    threading.Thread(target=receive, name="inpromptu-worker-receive",
+                     daemon=True).start()
+    respond(0, describe(""))
+    while True:
+        try:
+            request_id, op, args = calls.get()
+            if op == 'stop':
+                break
+            path, name, getter, call_args, kwargs = args
+            with stdout.capture() as output:
+                try:
+                    omm = prompt.objects.manager(prompt.objects.resolve(path))
+                    if getter:
+                        func = omm.property_getters[name]
+                        plan = omm.property_getter_plans[name]
+                    else:
+                        func = omm.methods[name]
+                        plan = omm.call_plans[name]
+                    if plan.bound_param == 'self':
+                        call_args = [omm.class_instance, *call_args]
+                    value = share_result(prompt._call(func, call_args, kwargs),
+                                         min_shared_bytes)
+                except BaseException as e:
+                    respond(request_id, error=e, output=output.getvalue())
+                    continue
+            respond(request_id, value, output=output.getvalue())
+        except KeyboardInterrupt:
+            continue # Interrupted between calls.
+    if prompt.omm.snapshot is not None and prompt.omm.snapshot.modified:
+        prompt.omm.snapshot.save()
+    outbox.put(None)
+
+
+class WorkerProcess:
+    """A target object in a separate process and the pipe to it.
+
+    Requests may be made from any thread. Each gets its own response, so a
+    long-running call doesn't hold up describing objects for completion.
+    """
+
+    # Smallest bytes-like or array result returned through shared memory.
+    min_shared_bytes = 2**20
+    # Seconds to wait for the target to be created.
+    start_timeout = 60
+    # Seconds to wait for a call to stop after Ctrl-C before giving up.
+    interrupt_timeout = 2
+    # Seconds to wait for the worker to exit before killing it.
+    stop_timeout = 2
+
+    def __init__(self, target, methods_to_skip = [], snapshot = None):
+        """Constructor.
+
+        :param target: 'module:attribute' string naming a class, factory or
+            instance (see load_target), or a picklable callable (e.g: a
+            class) that returns the object. Either is resolved in the worker.
+        :param snapshot: path of a StructureSnapshot for the worker to use.
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.target = target
+        self.methods_to_skip = list(methods_to_skip)
+        self.snapshot = None if snapshot is None else os.fspath(snapshot)
+        self.process = None
+        self.root = None # Description of the object, sent on starting.
+        self._connection = None
+        self._pending = {} # request id -> Future
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    def start(self):
+        """Start the worker process and wait for it to describe the object."""
+        context = get_context('spawn')
+        self._connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, name="inpromptu-worker", daemon=True,
+            args=(child_connection, self.target, self.methods_to_skip,
+                  self.snapshot, self.min_shared_bytes))
+        self.process.start()
+        child_connection.close()
+        # Request 0 is the object's description, sent once it's created.
+        self._pending = {0: Future()}
+        threading.Thread(target=self._receive,
+                         args=(self._connection, self._pending),
+                         name="inpromptu-worker-receive", daemon=True).start()
+        try:
+            self.root = self._result(self._pending[0], self.start_timeout)
+        except FutureTimeoutError:
+            self.stop()
+            raise WorkerError("The worker process didn't start within "
+                              f"{self.start_timeout} seconds.") from None
+        except BaseException:
+            self.stop()
+            raise
+
+    def _receive(self, connection, pending):
+        """Hand responses to the futures waiting for them."""
+        try:
+            while True:
+                request_id, response = pickle.loads(connection.recv_bytes())
+                with self._lock:
+                    future = pending.pop(request_id, None)
+                try:
+                    response = pickle.loads(response)
+                except Exception as e:
+                    if future is not None:
+                        future.set_exception(WorkerError(
+                            f"Could not receive the worker's response: {e}"))
+                    continue
+                if future is None: # Abandoned, e.g: after a timeout.
+                    if isinstance(response[0], SharedResult):
+                        unshare_result(response[0])
+                    continue
+                future.set_result(response)
+        except (EOFError, OSError):
+            pass
+        with self._lock:
+            abandoned = list(pending.values())
+            pending.clear()
+        for future in abandoned:
+            future.set_exception(WorkerError("The worker process exited."))
+
+    def request(self, op, *args, timeout=None):
+        """Send a request to the worker and return its result.
+
+        Raise WorkerError if the worker exits or doesn't respond within
+        timeout seconds. Ctrl-C interrupts the worker.
+        """
+        future = Future()
+        with self._lock:
+            request_id = self._next_id
+            self._next_id += 1
+            self._pending[request_id] = future
+            pending = self._pending
+        try:
+            self._connection.send_bytes(pickle.dumps((request_id, op, args)))
+        except (OSError, ValueError, AttributeError):
+            pending.pop(request_id, None)
+            raise WorkerError("The worker process isn't running. Use "
+                              "'restart' to start it again.") from None
+        try:
+            return self._result(future, timeout)
+        except FutureTimeoutError:
+            raise WorkerError("The worker process didn't respond within "
+                              f"{timeout} seconds.") from None
+        except KeyboardInterrupt:
+            self.interrupt()
+            try:
+                return self._result(future, self.interrupt_timeout)
+            except FutureTimeoutError:
+                raise WorkerError("The worker process isn't responding. Use "
+                                  "'restart' to restart it.") from None
+        finally:
+            with self._lock:
+                pending.pop(request_id, None)
+
+    def _result(self, future, timeout):
+        """Wait for a response. Print what the call printed and return its
+        value or raise its error."""
+        value, error, traceback_text, output = future.result(timeout)
+        if output:
+            print(output, end="")
+        if error is not None:
+            if traceback_text is not None:
+                error.__cause__ = RemoteTraceback(traceback_text)
+            if isinstance(error, KeyboardInterrupt):
+                raise WorkerError("Interrupted.") from error
+            raise error
+        if isinstance(value, SharedResult):
+            return unshare_result(value)
+        return value
+
+    def describe(self, path: str, timeout=None):
+        """Return the description of the object at a dotted path."""
+        return self.request('describe', path, timeout=timeout)
+
+    def call(self, path, name, getter, args, kwargs):
+        """Call a method (or property getter) of the object at path."""
+        return self.request('call', path, name, getter, args, kwargs)
+
+    def interrupt(self):
+        """Interrupt the call the worker is running, as Ctrl-C would."""
+        if self.process is not None and self.process.is_alive() and \
+                hasattr(signal, 'SIGINT') and os.name != 'nt':
+            os.kill(self.process.pid, signal.SIGINT)
+
+    def stop(self):
+        """Stop the worker, killing it if it doesn't stop by itself."""
+        if self.process is None:
+            return
+        try:
+            self._connection.send_bytes(pickle.dumps((None, 'stop', ())))
+        except (OSError, ValueError):
+            pass
+        self.process.join(self.stop_timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(self.stop_timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self._connection.close()
+        self.process = None
+
+    def restart(self):
+        """Replace the worker with a new one. Requests waiting on the old
+        one fail with WorkerError."""
+        self.stop()
+        self.start()
+
+
+class RemoteObject:
+    """Stand-in for an object in the worker process."""
+
+    def __init__(self, worker, path, description):
+        """Constructor."""
+        self.worker = worker
+        self.path = path
+        self.remote_id = description['id']
+        self.children = PrefixIndex(description['children'])
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.path or 'root'}>"
+
+
+class RemoteMethod:
+    """Calls a method (or property getter) of an object in the worker."""
+
+    def __init__(self, owner: RemoteObject, name: str, getter: bool = False,
+                 doc: str = None):
+        """Constructor."""
+        self.owner = owner
+        self.name = name
+        self.getter = getter
+        self.__doc__ = doc
+
+    def __call__(self, *args, **kwargs):
+        # The owner is passed as 'self' (or its class as 'cls').
+        if args and (args[0] is self.owner or args[0] is RemoteObject):
+            args = args[1:]
+        return self.owner.worker.call(self.owner.path, self.name, self.getter,
+                                      args, kwargs)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.owner.path}.{self.name}>" \
+            if self.owner.path else f"<{self.__class__.__name__} {self.name}>"
+
+
+class RemoteMethodManager(ObjectMethodManager):
+    """ObjectMethodManager of an object in the worker process, built from
+    the definitions the worker sent rather than the object itself."""
+
+    def __init__(self, remote_object: RemoteObject, definitions):
+        """Constructor."""
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.class_instance = remote_object
+        self.snapshot = None
+        self.structure = None
+        self.definitions = definitions
+        self.methods = {name: RemoteMethod(remote_object, name)
+                        for name in definitions['methods']}
+        self.property_getters = \
+            {name: RemoteMethod(remote_object, name, getter=True, doc=doc)
+             for name, (_, doc) in definitions['property_getters'].items()}
+        self._instance_members = set()
+        self._index_callables()
+
+    def _get_call_plan(self, name):
+        if self.methods[name] == self.help:
+            return super()._get_call_plan(name)
+        return self.definitions['methods'][name][0]
+
+    def _get_property_getter_plan(self, name):
+        return self.definitions['property_getters'][name][0]
+
+    def _get_method_def(self, name):
+        if self.methods[name] == self.help:
+            return super()._get_method_def(name)
+        template = self.definitions['methods'][name][1]
+        if template is None:
+            return None
+        return self._bind_method_def(template)
+
+
+class RemoteObjectManager(ObjectManager):
+    """Navigates the objects in the worker process, asking the worker to
+    describe each one once, when a path through it is first used."""
+
+    # Seconds to wait for the worker to describe an object. Completion gives
+    # up after this rather than waiting on a busy worker.
+    describe_timeout = 1.0
+
+    def __init__(self, worker: WorkerProcess):
+        """Constructor."""
+        self.worker = worker
+        self.snapshot = None
+        self._managers = {} # id -> (RemoteObject, RemoteMethodManager)
+        self._objects = {} # path -> RemoteObject
+        self._remote_objects = {} # id in the worker -> RemoteObject
+        self.class_instance = self._add("", worker.root)
+
+    def _add(self, path, description):
+        """Return the RemoteObject for a description, reusing the one for the
+        same object if it was described through another path."""
+        obj = self._remote_objects.get(description['id'])
+        if obj is None:
+            obj = RemoteObject(self.worker, path, description)
+            self._remote_objects[obj.remote_id] = obj
+            self._managers[id(obj)] = (obj, RemoteMethodManager(obj, description))
+        self._objects[path] = obj
+        return obj
+
+    def reset(self):
+        """Forget the sub-objects, e.g: after the worker restarted. The root
+        keeps its manager and any completion options set on it."""
+        root, root_manager = self._managers[id(self.class_instance)]
+        root.remote_id = self.worker.root['id']
+        root.children = PrefixIndex(self.worker.root['children'])
+        self._managers = {id(root): (root, root_manager)}
+        self._objects = {"": root}
+        self._remote_objects = {root.remote_id: root}
+
+    def child(self, obj, name: str):
+        if name not in obj.children:
+            return None
+        path = f"{obj.path}{self.SEPARATOR}{name}" if obj.path else name
+        if path not in self._objects:
+            self._add(path, self.worker.describe(path, self.describe_timeout))
+        return self._objects[path]
+
+    def children(self, obj):
+        return obj.children
+
+    def resolve(self, path: str):
+        try:
+            return super().resolve(path)
+        except WorkerError as e:
+            raise UserInputError(f"Could not look up {path}: {e}") from e
+
+
+class ProcessMixin:
+    """Runs the object in a worker process, so that completion and the
+    prompt stay responsive whatever the object is doing.
+
+    Pass a 'module:attribute' string or a picklable callable (e.g: a class)
+    that creates the object in place of the object itself.
+    """
+
+    def __init__(self, target, *args, **kwargs):
+        """Constructor."""
+        super().__init__(target, *args, **kwargs)
+        if 'restart' not in self.omm.callables:
+            self.line_commands['restart'] = self.restart_command
+
+    def _create_managers(self, target, methods_to_skip, var_arg_subs,
+                         snapshot):
+        self.worker = WorkerProcess(target, methods_to_skip=methods_to_skip,
+                                    snapshot=snapshot)
+        self.worker.start()
+        objects = RemoteObjectManager(self.worker)
+        return objects.manager(objects.class_instance), objects
+
+    def restart_command(self, line: str):
+        """Replace the worker process with a new one, e.g: if it hangs.
+        Commands still waiting on the old one fail."""
+        if line.strip():
+            raise UserInputError("Usage: restart")
+        self.worker.restart()
+        self.objects.reset()
+        print("Worker process restarted.")
+
+    def close(self):
+        """Stop the worker process."""
+        self.worker.stop()
+
+
+class Inpromptu(ProcessMixin, DefaultInpromptu):
+    """Interactive prompt for an object that lives in a worker process."""
+    pass
@@ -1,28 +1,94 @@
 #!/usr/bin/env python3
 """Prompt-toolkit implementation of Inpromptu."""
 
-from inspect import _ParameterKind as ParamKind
-from prompt_toolkit import prompt, PromptSession
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from prompt_toolkit import PromptSession
+from prompt_toolkit.application import run_in_terminal
 from prompt_toolkit.shortcuts import CompleteStyle
 from prompt_toolkit.completion import Completer, Completion
 from prompt_toolkit import print_formatted_text as print
 from .inpromptu_base import InpromptuBase
-from .inpromptu_base import container_split
 
 
-class Inpromptu(InpromptuBase):
+class Inpromptu(InpromptuBase, Completer):
     """Inspects an object and enables the invoking of any attribute's methods."""
 
-    def __init__(self, class_instance, methods_to_skip = []):
+    def __init__(self, class_instance, methods_to_skip = [], snapshot = None):
         """Constructor."""
-        super().__init__(class_instance, methods_to_skip=methods_to_skip)
+        super().__init__(class_instance, methods_to_skip=methods_to_skip,
+                         snapshot=snapshot)
         self.completions = None # unused for now.
+        # Completions are computed off the UI thread one request at a time.
+        # Each request bumps the generation; older requests are stale.
+        self._completion_executor = \
+            ThreadPoolExecutor(max_workers=1,
+                               thread_name_prefix="inpromptu-completer")
+        self._completion_generation = 0
 
         self.session = PromptSession(self.prompt, completer=self)
 
     def input(self):
-        return self.session.prompt(self.prompt + " ",
-                                   complete_style=CompleteStyle.READLINE_LIKE)
+        """Wait for input with prompt_async on the event loop, which coroutine
+        methods also run on. The loop runs in a background thread, so that
+        commands run on this one and Ctrl-C interrupts them."""
+        return self.run_coroutine(self.session.prompt_async(
+            self.prompt + " ", complete_style=CompleteStyle.READLINE_LIKE))
+
+    def cmdloop(self, loop=True):
+        """Like InpromptuBase.cmdloop, but Ctrl-C while a command runs only
+        interrupts the command. Ctrl-C or Ctrl-D at the prompt ends the loop."""
+        while True:
+            try:
+                line = self.input()
+            except (EOFError, KeyboardInterrupt):
+                print()
+                return
+            if line.lstrip() == "":
+                continue
+            try:
+                self.run_line(line)
+            except KeyboardInterrupt:
+                print()
+            if not loop:
+                return
+
+    def notify(self, message: str):
+        """Print a message from the background. At the prompt, print it above
+        the line being edited, which prompt_toolkit then redraws."""
+        app = self.session.app
+        if not app.is_running or app.loop is None:
+            print(message)
+            return
+        app.loop.call_soon_threadsafe(
+            lambda: run_in_terminal(lambda: print(message)))
+
+    async def get_completions_async(self, document, complete_event):
+        """Yield completions computed in a worker thread.
+
+        Typing keeps rendering while completions are computed. A request is
+        abandoned once a newer one arrives (i.e: the document changed).
+        """
+        self._completion_generation += 1
+        generation = self._completion_generation
+        completions = await asyncio.get_running_loop().run_in_executor(
+            self._completion_executor, self._compute_completions,
+            document, complete_event, generation)
+        for completion in completions:
+            if generation != self._completion_generation:
+                return
+            yield completion
+
+    def _compute_completions(self, document, complete_event, generation):
+        """Collect completions, bailing out if the request becomes stale."""
+        completions = []
+        if generation != self._completion_generation:
+            return completions # superseded while queued.
+        for completion in self.get_completions(document, complete_event):
+            if generation != self._completion_generation:
+                return []
+            completions.append(completion)
+        return completions
 
     def get_completions(self, document, complete_event):
         """yields completions for invoking a function with its parameters.
@@ -41,32 +107,39 @@ class Inpromptu(InpromptuBase):
         # TODO: maybe it's worth just writing a REGEX for this?
 
         #word = document.get_word_before_cursor()
-        text = document.text
-        word = container_split(text)[0][-1] if (len(text) and text[-1] != " ") else ""
         # Check word against valid completions.
-        line = document.lines[0]
-        cmd_with_args, last_word_finished = container_split(line)
+        # Complete the command after any built-ins, e.g: time <cmd>.
+        line = self.strip_line_commands(document.lines[0])
+        # Resume tokenizing from the last keystroke if the line only grew.
+        cmd_with_args, last_word_finished = self.tokenizer.advance(line).split()
+        word = cmd_with_args[-1] if (cmd_with_args and line[-1] != " ") else ""
         completions = []
         display={} # what to show onscreen as the completion option.
 
         # Complete the fn name.
         if len(cmd_with_args) == 0 or \
             (len(cmd_with_args) == 1 and line[-1] != self.__class__.DELIM):
-                completions = [c for c in self.omm.callables if c.startswith(word)]
+                completions = self.match_commands(word)
+                # Display sub-objects' commands without their path.
+                path = word.rpartition(self.objects.SEPARATOR)[0]
+                if path:
+                    display = {c: c[len(path) + 1:] for c in completions}
         # Complete the fn params (i.e: args in order then kwargs by name)
         else:
             self.func_name = cmd_with_args[0]
             param_entries = cmd_with_args[1:]
             # Check to make sure func name has parameters and was typed correctly.
-            if self.func_name not in self.omm.method_defs:
+            method_def = self.get_method_def(self.func_name)
+            if method_def is None:
                 return None
 
             # Get function params that have not been entered
-            func = self.omm.methods[self.func_name]
+            omm, method_name = self.command_manager(self.func_name)
+            plan = omm.call_plans[method_name]
             # Don't search the last element if it's not fully entered.
             param_entries_to_search = param_entries[:-1] \
                 if (line[-1] != self.__class__.DELIM) else param_entries
-            param_objects = self.get_remaining_params(func, param_entries_to_search)
+            param_objects = self.get_remaining_params(plan, param_entries_to_search)
             self.func_params = [p.name for p in param_objects]
 
             # Now generate completion list for params not yet entered.
@@ -95,9 +168,8 @@ class Inpromptu(InpromptuBase):
                 # regular check
                 if completion.startswith(word) and not skip:
                     completions.append(completion)
-                    arg_types = self.omm.method_defs[self.func_name]['parameters'][param.name]['types']
-                    arg_types_str = "|".join([a.__name__ for a in arg_types])
-                    display[completion] = completion + f"<{arg_types_str}>"
+                    arg_hint = method_def['parameters'][param.name]['hint']
+                    display[completion] = completion + f"<{arg_hint}>"
                 # Exit early: provide required args one-at-a-time so we complete
                 # them in order.
                 if param.default == param.empty:
@@ -1,24 +1,30 @@
 #!/usr/bin/env python3
 """Class for inferring an introspective prompt."""
 import readline
-import os
+import sys
+import threading
 from math import floor
 import traceback
 
 from .inpromptu_base import InpromptuBase
-from .inpromptu_base import container_split
+from .terminal import get_terminal_size
 
 
 # helper function for displaying completions.
-def print_columnized_list(my_list):
+def print_columnized_list(my_list, window_width=None):
     """Prints a list as a set of columns, maximizing screen space."""
+    if not my_list:
+        return
     max_string_len = max(map(len, my_list)) + 1 # add 1 for minimum whitespace.
-    _, window_width = map(int, os.popen('stty size', 'r').read().split())
+    if window_width is None:
+        window_width = get_terminal_size().columns
     # Longest string and window width dictate columnized printing output
     # Either we have multiple rows worth of printing, or we have a single
     # row spread out across the whole window.
     text_fits_on_one_row = max_string_len * len(my_list) < window_width
-    column_count = len(my_list) if text_fits_on_one_row else floor(window_width/max_string_len)
+    # Always print at least one column, even if the window is too narrow.
+    column_count = len(my_list) if text_fits_on_one_row else \
+        max(1, floor(window_width/max_string_len))
     column_width = floor(window_width/len(my_list)) if text_fits_on_one_row else max_string_len
     list_iter = iter(my_list)
     list_item = next(list_iter)
@@ -40,19 +46,28 @@ class Inpromptu(InpromptuBase):
     complete_key = 'tab'
     DELIM = ' '
 
-    def __init__(self, class_instance, methods_to_skip = []):
+    def __init__(self, class_instance, methods_to_skip = [], snapshot = None):
         """Constructor."""
-        super().__init__(class_instance, methods_to_skip=methods_to_skip)
+        super().__init__(class_instance, methods_to_skip=methods_to_skip,
+                         snapshot=snapshot)
         readline.set_completer(self.complete)
         # Only split text to match on spaces. Default includes '{', '[', etc
         # which will be skipped by the results of text.
         readline.set_completer_delims("= ") # Split on equals and spaces.
         readline.set_completion_display_matches_hook(self._match_display_hook)
         readline.parse_and_bind(f"{self.__class__.complete_key}: complete")
+        # Start tracking the terminal size for columnized completion display.
+        get_terminal_size()
 
         # In-function completions for calling input() within a fn.
         # Note that this variable must be cleared when finished with it.
         self.completions = None
+        # Completion results for the last (line buffer, text).
+        # readline queries these repeatedly.
+        self._completion_cache = None
+        # True while waiting at the prompt for a line of input.
+        self._reading_input = False
+        self._notify_lock = threading.Lock()
 
     def _match_display_hook(self, substitution, matches, longest_match_length):
         """_match_display_hook wrapper so we can at least read the exception.
@@ -72,7 +87,8 @@ class Inpromptu(InpromptuBase):
         # This issue is connected to the readline implementation.
 
         line = readline.get_line_buffer() # entire line of entered text so far.
-        cmd_with_args, _ = container_split(line)
+        line = self.strip_line_commands(line)
+        cmd_with_args, _ = self._split_line(line)
         print()
         # Render explicitly specified completions in the original order:
         if self.completions:
@@ -84,26 +100,29 @@ class Inpromptu(InpromptuBase):
         # Render Function Name:
         elif len(cmd_with_args) == 0 or \
             (len(cmd_with_args) == 1 and line[-1] is not self.__class__.DELIM):
-            # Render function name matches.
+            # Render function name matches, less any path, e.g: 'stage.'.
             #for match in matches:
             #    print(match, end=" ")
-            print_columnized_list(matches)
+            path = cmd_with_args[0].rpartition(self.objects.SEPARATOR)[0] \
+                if cmd_with_args else ""
+            print_columnized_list([match[len(path) + 1:] if path else match
+                                   for match in matches])
         # Render Function arg values if any exist:
         elif len(cmd_with_args[-1].split("=")) > 1:
             matches = sorted(matches)
             print_columnized_list(matches)
         # Render Function arg names.
         else:
-            param_order = [f"{x}=" for x in self.omm.method_defs[self.func_name]['param_order']]
+            method_def = self.get_method_def(self.func_name)
+            param_order = [f"{x}=" for x in method_def['param_order']]
             # matches arrive alphebatized. Specify order according to original.
             matches = sorted(matches, key=lambda x: param_order.index(x))
             # Render argument matches with type.
             # Track argument index such that we only display valid options.
             for arg_completion in matches:
                 arg = arg_completion.split("=")[0]
-                arg_types = self.omm.method_defs[self.func_name]['parameters'][arg]['types']
-                arg_types_str = "|".join([a.__name__ for a in arg_types])
-                print(f"{arg}=<{arg_types_str}>", end=" ")
+                arg_hint = method_def['parameters'][arg]['hint']
+                print(f"{arg}=<{arg_hint}>", end=" ")
         print()
         print(self.prompt, readline.get_line_buffer(), sep='', end='', flush=True)
 
@@ -115,7 +134,23 @@ class Inpromptu(InpromptuBase):
             self.prompt = prompt + " "
         else:
             self.prompt = self.__class__.prompt + " "
-        return input(self.prompt)
+        self._reading_input = True
+        try:
+            return input(self.prompt)
+        finally:
+            self._reading_input = False
+
+    def notify(self, message: str):
+        """Print a message from the background. At the prompt, print it above
+        the line being edited, then redraw the prompt and the typed text."""
+        with self._notify_lock:
+            if not self._reading_input:
+                print(message)
+                return
+            # Clear the line, then let the message push the prompt down.
+            sys.stdout.write(f"\r\x1b[K{message}\n"
+                             f"{self.prompt}{readline.get_line_buffer()}")
+            sys.stdout.flush()
 
     def complete(self, text, state, *args, **kwargs):
         """_complete wrapper so we can at least read the exceptions.
@@ -140,72 +175,16 @@ class Inpromptu(InpromptuBase):
         Note: this fn gets called by readline really weirdly.
         This fn gets called repeatedly with increasing values of state until
         the fn returns the available completions (list) or None.
+        The completion list is computed once per (line buffer, text) and
+        subsequent states are served from the cache.
         """
-
-        # readline delim must be set to ' ' such that {, [, (, etc aren't
-        # skipped. "container_split" will handle when to match the text we get.
-        text = text.lstrip() # what we are matching against.
         line = readline.get_line_buffer() # The whole line.
-        cmd_with_args, last_word_finished = container_split(line)
-
-        # Complete the fn name.
-        if len(cmd_with_args) == 0 or \
-            (len(cmd_with_args) == 1 and line[-1] is not self.__class__.DELIM):
-            # Return matches but omit match if it is fully-typed.
-            results = [fn for fn in self.omm.callables if fn.startswith(text) and fn != text]
-            try:
-                return results[state]
-            except IndexError:
-                return None
-
-        # Complete the fn params.
-        self.func_name = cmd_with_args[0]
-        param_entries = cmd_with_args[1:]
-        # Check to make sure func name has parameters and was typed correctly.
-        if self.func_name not in self.omm.method_defs:
-            return None
-
-        # Get function params that have not been entered.
-        func = self.omm.methods[self.func_name]
-        # Don't search the last element if it is not fully entered.
-        param_entries_to_search = param_entries[:-1] if (line[-1] != self.__class__.DELIM) else param_entries
-        param_objects = self.get_remaining_params(func, param_entries_to_search)
-
-        # Then generate completion list from remaining possible params.
-        func_param_completions = []
-        for param_order_index, param in enumerate(param_objects):
-            completion = f"{param.name}="
-            # No space case: <kwarg_name>=<value> is partially typed or fully typed but missing a space
-            if line[-1] is not self.__class__.DELIM and \
-                param_entries[-1].startswith(completion):
-                partial_val_text = param_entries[-1].split('=')[-1]
-                func_param_completions = self._get_param_options(self.func_name,
-                                                                 param.name,
-                                                                 partial_val_text)
-                break
-            # Bail early if the user entered unfinished text that can't be
-            # completed with predefined options.
-            if not last_word_finished:
-                return None
-            # Filter out already-populated argument options by name and position.
-            skip = False
-            for text_block in param_entries:
-                if text_block.startswith(completion):
-                    skip = True
-                    break
-            # regular check
-            if completion.startswith(text) and not skip:
-                func_param_completions.append(completion)
-            # Exit early: provide required args one-at-a-time so we complete
-            # them in order.
-            if param.default == param.empty:
-                break
-
-        # Recall: this fn is called multiple times with increasing values of
-        # of state until None (i.e no more completions) is returned.
+        if self._completion_cache is None or \
+                self._completion_cache[0] != (line, text):
+            self._completion_cache = ((line, text),
+                                      self._get_completion_matches(line, text))
         try:
-            return func_param_completions[state]
+            return self._completion_cache[1][state]
         except IndexError:
             # IndexError means state has incremented too far, and we're done.
             return None
-
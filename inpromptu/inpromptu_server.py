@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Serves an Inpromptu session to many clients over a Unix or TCP socket.
+
+Clients send JSON objects, one per line, and get one JSON line back each:
+  {"id": 1, "op": "run", "line": "add_fuel 10"}
+      -> {"id": 1, "output": "<printed text>", "error": null}
+  {"id": 2, "op": "complete", "line": "add_f", "text": "add_f"}
+      -> {"id": 2, "matches": ["add_fuel"], "hints": {}}
+On connecting, the server sends {"prompt": ">>>"}.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from . import capture
+from .history import ResultHistory
+from .inpromptu_base import InpromptuBase
+from .jobs import JobManager
+
+
+def parse_address(address):
+    """Return ('unix', path) or ('tcp', (host, port)) for an address.
+
+    Accepts 'unix:PATH', 'HOST:PORT', a (host, port) tuple, or a bare path.
+    """
+    if isinstance(address, tuple):
+        return 'tcp', address
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return 'tcp', (host or '127.0.0.1', int(port))
+    return 'unix', address
+
+
+def _text(value):
+    """Return a request field that must be a string."""
+    if not isinstance(value, str):
+        raise TypeError(f"Expected a string, not {value!r}.")
+    return value
+
+
+class Inpromptu(InpromptuBase):
+    """Serves one object to any number of clients connected over a socket.
+
+    Commands run on a pool of worker threads. Access to the object is
+    serialized according to the lock policy:
+      * 'exclusive': one command at a time across all clients (default).
+      * None: no locking. The object must be thread-safe.
+      * any context manager, e.g: a lock shared with other code.
+    Background jobs ('cmd &') take the lock too. Completions are computed
+    (one at a time) on a separate thread so they are not held up by
+    long-running commands. Each client has its own history of results
+    (referenced as _ and _N) and its own jobs.
+    """
+
+    # Longest request line accepted, e.g: for pasted container arguments.
+    max_request_bytes = 16 * 2**20
+
+    def __init__(self, class_instance, methods_to_skip = [], snapshot = None,
+                 address = "127.0.0.1:7777", lock = 'exclusive',
+                 max_workers = 8):
+        """Constructor."""
+        # ResultHistory of the client whose command is running.
+        self._client_results = contextvars.ContextVar("inpromptu_results",
+                                                      default=None)
+        # JobManager of the client whose command is running.
+        self._client_jobs = contextvars.ContextVar("inpromptu_jobs",
+                                                   default=None)
+        super().__init__(class_instance, methods_to_skip=methods_to_skip,
+                         snapshot=snapshot)
+        self.address = address
+        if lock == 'exclusive':
+            lock = threading.Lock()
+        self.lock = contextlib.nullcontext() if lock is None else lock
+        # Coroutine jobs run on threads, where they can take the lock, unless
+        # there is none.
+        self.coroutine_jobs_on_loop = lock is None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="inpromptu-cmd")
+        # Completion state (e.g: the tokenizer) is shared; use one thread.
+        self._completion_executor = \
+            ThreadPoolExecutor(max_workers=1,
+                               thread_name_prefix="inpromptu-completer")
+        self._stdout = None
+        self.server = None
+
+    @property
+    def results(self):
+        """The results of the client whose command is running, or those of
+        commands run locally."""
+        results = self._client_results.get()
+        return self._results if results is None else results
+
+    @results.setter
+    def results(self, results):
+        self._results = results
+
+    @property
+    def jobs(self):
+        """The jobs of the client whose command is running, or those of
+        commands run locally."""
+        jobs = self._client_jobs.get()
+        return self._jobs if jobs is None else jobs
+
+    @jobs.setter
+    def jobs(self, jobs):
+        self._jobs = jobs
+
+    def input(self):
+        raise EOFError # Input comes from clients.
+
+    def cmdloop(self, loop=True):
+        """Serve clients until interrupted."""
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            print()
+
+    async def start(self):
+        """Start listening. Return the asyncio server.
+
+        Coroutine methods run on the same event loop as the server.
+        """
+        with self._loop_lock:
+            if self.loop is None:
+                self.loop = asyncio.get_running_loop()
+        kind, address = parse_address(self.address)
+        if kind == 'unix':
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(address)
+            self.server = await asyncio.start_unix_server(
+                self._serve_client, path=address, limit=self.max_request_bytes)
+        else:
+            self.server = await asyncio.start_server(
+                self._serve_client, *address, limit=self.max_request_bytes)
+        # Route output printed by commands back to the client that ran them.
+        self._stdout = capture.install()
+        return self.server
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop listening and restore sys.stdout."""
+        if self.server is not None:
+            self.server.close()
+        if self._stdout is not None:
+            capture.uninstall(self._stdout)
+        kind, address = parse_address(self.address)
+        if kind == 'unix':
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(address)
+
+    async def _serve_client(self, reader, writer):
+        """Answer a client's requests, in order, until it disconnects."""
+        loop = asyncio.get_running_loop()
+        results = ResultHistory(self.max_results, self.max_result_bytes)
+        jobs = JobManager(max_workers=self.max_jobs, notify=self.notify)
+        try:
+            await self._send(writer, {"prompt": self.prompt})
+            while line := await reader.readline():
+                request = {}
+                response = None
+                # Only decoding the request is guarded here; _run reports
+                # errors of the command itself.
+                try:
+                    request = json.loads(line)
+                    op = request.get("op")
+                    if op == "run":
+                        call = (self._executor, self._run,
+                                _text(request["line"]), results, jobs)
+                    elif op == "complete":
+                        call = (self._completion_executor,
+                                self._complete_remote, _text(request["line"]),
+                                _text(request.get("text", "")))
+                    else:
+                        response = {"error": f"Unknown op: {op}."}
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    response = {"error": f"Bad request: {e!r}"}
+                if response is None:
+                    response = await loop.run_in_executor(*call)
+                response["id"] = request.get("id") \
+                    if isinstance(request, dict) else None
+                await self._send(writer, response)
+        except (ConnectionError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, ValueError):
+            pass # Client left or sent an oversized request; drop it.
+        finally:
+            writer.close()
+            # Drop the client's pending jobs. Running ones carry on.
+            jobs.shutdown(wait=False)
+
+    async def _send(self, writer, message):
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+
+    def invoke(self, fn_name, func, args, kwargs):
+        """Call a function under the lock policy, in the foreground or as a
+        job. Built-ins don't take the lock: e.g: 'wait' would keep the jobs
+        it waits for from running."""
+        if fn_name in self.line_commands:
+            return super().invoke(fn_name, func, args, kwargs)
+        with self.lock:
+            return super().invoke(fn_name, func, args, kwargs)
+
+    def render(self, return_val):
+        """Display a result under the lock policy, since streamed results
+        (e.g: generators) run code of the object."""
+        with self.lock:
+            super().render(return_val)
+
+    def _run(self, line, results=None, jobs=None):
+        """Run a line of input, capturing everything it prints. results and
+        jobs are the ResultHistory and JobManager of the client running it."""
+        results_token = self._client_results.set(results)
+        jobs_token = self._client_jobs.set(jobs)
+        try:
+            with self._stdout.capture() as output:
+                error = None
+                if line.strip():
+                    try:
+                        error = self.run_line(line)
+                    except Exception as e: # e.g: from a hook or a converter.
+                        error = e
+                        print(traceback.format_exc())
+        finally:
+            self._client_jobs.reset(jobs_token)
+            self._client_results.reset(results_token)
+        return {"output": output.getvalue(),
+                "error": None if error is None else
+                    f"{error.__class__.__name__}: {error}"}
+
+    def _complete_remote(self, line, text):
+        """Return completion matches and, for parameter names, hints of their
+        types (e.g: 'gallons=<float>')."""
+        matches = self._get_completion_matches(line, text)
+        hints = {}
+        method_def = self.get_method_def(getattr(self, 'func_name', ''))
+        if method_def is not None:
+            for match in matches:
+                name, sep, value = match.partition("=")
+                param = method_def['parameters'].get(name)
+                if sep and not value and param is not None and 'hint' in param:
+                    hints[match] = f"{match}<{param['hint']}>"
+        return {"matches": matches, "hints": hints}
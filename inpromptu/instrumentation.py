@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Opt-in hooks for timing and tracing commands as they run."""
+
+# Phases of running a command, in order.
+PHASES = ("tokenize", "parse_args", "typed_eval", "invocation", "rendering")
+
+
+class Instrumentation:
+    """Hooks invoked while a prompt runs commands.
+
+    Subclass and override the hooks of interest, then register an instance
+    with InpromptuBase.add_instrumentation(). Without any registered, the
+    prompt doesn't read the clock at all.
+    """
+
+    def command_started(self, line: str):
+        """Called before a line of input is parsed."""
+        pass
+
+    def phase_finished(self, phase: str, seconds: float):
+        """Called after each phase (see PHASES) of the current command."""
+        pass
+
+    def command_finished(self, line: str, fn_name: str, seconds: float,
+                         error: Exception = None):
+        """Called after a command ran (or failed with error)."""
+        pass
+
+
+class PhaseTimer(Instrumentation):
+    """Accumulates how long each phase of a command took."""
+
+    def __init__(self):
+        """Constructor."""
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+    def phase_finished(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def report(self):
+        """Return a table of the time spent in each phase."""
+        width = max(len(phase) for phase in self.phases)
+        lines = [f"{phase:<{width}}  {seconds * 1000:10.3f} ms"
+                 for phase, seconds in self.phases.items()]
+        lines.append(f"{'total':<{width}}  "
+                     f"{sum(self.phases.values()) * 1000:10.3f} ms")
+        return "\n".join(lines)
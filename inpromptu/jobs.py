@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""Commands running in the background on a bounded pool of threads."""
+
+import asyncio
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from . import capture
+from .errors import UserInputError
+from .metrics import format_seconds
+
+
+class Job:
+    """A command submitted to run in the background."""
+
+    def __init__(self, job_id: int, line: str):
+        """Constructor."""
+        self.id = job_id
+        self.line = line
+        self.future = None
+        self.output = "" # Everything the command printed.
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+
+    @property
+    def status(self):
+        """One of: pending, running, done, failed or cancelled."""
+        if self.future.cancelled():
+            return "cancelled"
+        if not self.future.done():
+            return "running" if self.started is not None else "pending"
+        return "failed" if self.future.exception() is not None else "done"
+
+    @property
+    def done(self):
+        return self.future.done()
+
+    @property
+    def error(self):
+        """The exception the command raised, if it did."""
+        if not self.future.done() or self.future.cancelled():
+            return None
+        return self.future.exception()
+
+    @property
+    def elapsed(self):
+        """Seconds spent running so far, or None if it never started."""
+        if self.started is None:
+            return None
+        return (self.finished or time.monotonic()) - self.started
+
+    def notice(self):
+        """Return a one-line report of how the job ended."""
+        error = self.error
+        if error is None:
+            return str(self)
+        return f"{self}: {error.__class__.__name__}: {error}"
+
+    def __str__(self):
+        return f"[{self.id}] {self.status:<9} {self.line}"
+
+
+class JobManager:
+    """Runs commands on at most max_workers threads at once.
+
+    Up to max_queued more jobs may wait for a free thread; submitting
+    beyond that is refused. notify is called with a notice (from a worker
+    thread) whenever a job finishes. Output printed by a job is captured
+    into job.output rather than interleaved with the prompt, by replacing
+    sys.stdout while any job is unfinished. Only the newest max_finished
+    finished jobs are kept.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queued: int = 32,
+                 max_finished: int = 100, notify=print):
+        """Constructor."""
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.notify = notify
+        self.jobs = OrderedDict() # id -> Job, oldest first.
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._stdout = None
+        self._unfinished = 0 # Jobs whose output is being captured.
+
+    def submit(self, line: str, func, *args):
+        """Call func(*args) in the background. Return its Job."""
+        def start(job):
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="inpromptu-job")
+            return self._executor.submit(self._run, job, func, args)
+        return self._add_job(line, start)
+
+    def submit_coroutine(self, line: str, coroutine, loop):
+        """Run a coroutine as a task on an event loop (running in another
+        thread). Return its Job. Unlike threads, these can be cancelled
+        while running."""
+        try:
+            return self._add_job(line,
+                lambda job: asyncio.run_coroutine_threadsafe(
+                    self._run_async(job, coroutine), loop))
+        except UserInputError:
+            coroutine.close() # Never to be awaited.
+            raise
+
+    def _add_job(self, line, start):
+        """Create a Job and start it with start(job), which returns its
+        concurrent.futures.Future."""
+        with self._lock:
+            unfinished = sum(not job.done for job in self.jobs.values())
+            if unfinished >= self.max_workers + self.max_queued:
+                raise UserInputError(f"Too many jobs ({unfinished}) are "
+                                     "pending or running.")
+            if not self._unfinished:
+                self._stdout = capture.install()
+            job = Job(next(self._ids), line)
+            try:
+                job.future = start(job)
+            except BaseException:
+                self._release_stdout()
+                raise
+            self._unfinished += 1
+            self.jobs[job.id] = job
+            self._prune()
+        job.future.add_done_callback(lambda _: self._finished(job))
+        return job
+
+    def _run(self, job, func, args):
+        job.started = time.monotonic()
+        with self._stdout.capture() as output:
+            try:
+                return func(*args)
+            finally:
+                job.output = output.getvalue()
+
+    async def _run_async(self, job, coroutine):
+        job.started = time.monotonic()
+        with self._stdout.capture() as output:
+            try:
+                return await coroutine
+            finally:
+                job.output = output.getvalue()
+
+    def _finished(self, job):
+        job.finished = time.monotonic()
+        with self._lock:
+            self._unfinished -= 1
+            self._release_stdout()
+        if self.notify is not None:
+            self.notify(job.notice())
+
+    def _release_stdout(self):
+        """Restore sys.stdout once no job needs it captured."""
+        if not self._unfinished and self._stdout is not None:
+            capture.uninstall(self._stdout)
+            self._stdout = None
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond max_finished."""
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        """Return a job by id (an int or a string of one)."""
+        try:
+            return self.jobs[int(job_id)]
+        except (KeyError, ValueError):
+            raise UserInputError(f"No such job: {job_id}.") from None
+
+    def cancel(self, job_id):
+        """Cancel a job that hasn't started yet, or a running coroutine.
+        Running threads can't be interrupted, so raise UserInputError for
+        those."""
+        job = self.get(job_id)
+        if not job.future.cancel() and not job.done:
+            raise UserInputError(f"Job {job.id} is already running and "
+                                 "can't be cancelled.")
+        return job
+
+    def wait(self, job_ids=None, timeout: float = None):
+        """Wait for jobs (default: all of them) to finish. Return the jobs."""
+        with self._lock:
+            jobs = list(self.jobs.values()) if job_ids is None else \
+                [self.get(job_id) for job_id in job_ids]
+        wait_futures([job.future for job in jobs], timeout=timeout)
+        return jobs
+
+    def report(self):
+        """Return a table of the jobs, oldest first."""
+        with self._lock:
+            jobs = list(self.jobs.values())
+        if not jobs:
+            return "No jobs."
+        return "\n".join(f"[{job.id}] {job.status:<9} "
+                         f"{format_seconds(job.elapsed)}  {job.line}"
+                         for job in jobs)
+
+    def shutdown(self, wait: bool = True):
+        """Cancel pending jobs and release the threads, waiting for running
+        jobs to finish if wait."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+        if self._stdout is not None:
+            capture.uninstall(self._stdout)
+            self._stdout = None
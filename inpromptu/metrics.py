@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Fixed-memory command counters and latency histograms."""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from array import array
+from .instrumentation import Instrumentation
+
+# Quantiles reported by stats and exports.
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class LatencyHistogram:
+    """HDR-style histogram of latencies with bounded relative error.
+
+    Latencies are recorded in whole microseconds into log-linear buckets:
+    every power of two is split into 2**(precision_bits - 1) buckets, so a
+    reported value is within ~2**-(precision_bits - 1) of the recorded one.
+    Memory is fixed no matter how many values are recorded.
+    """
+
+    def __init__(self, precision_bits: int = 5, max_value_bits: int = 40):
+        """Constructor. Values beyond 2**max_value_bits microseconds
+        (~12 days by default) are clamped."""
+        self.precision_bits = precision_bits
+        self.max_value = (1 << max_value_bits) - 1
+        self.counts = array('Q', bytes(8 * (self._index(self.max_value) + 1)))
+        self.count = 0
+        self.total = 0.0 # seconds
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        """Return the bucket index of a value in microseconds."""
+        bits = self.precision_bits
+        if value < (1 << bits):
+            return value
+        shift = value.bit_length() - bits
+        half = 1 << (bits - 1)
+        return (1 << bits) + (shift - 1) * half + (value >> shift) - half
+
+    def _lowest_value(self, index):
+        """Return the lowest value in microseconds of a bucket."""
+        bits = self.precision_bits
+        if index < (1 << bits):
+            return index
+        half = 1 << (bits - 1)
+        shift, sub_index = divmod(index - (1 << bits), half)
+        return (sub_index + half) << (shift + 1)
+
+    def _highest_value(self, index):
+        if index + 1 < len(self.counts):
+            return self._lowest_value(index + 1) - 1
+        return self.max_value
+
+    def record(self, seconds: float):
+        """Record a latency in seconds."""
+        micros = min(max(int(seconds * 1e6), 0), self.max_value)
+        self.counts[self._index(micros)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float):
+        """Return the latency in seconds at quantile q (0 to 1), or None if
+        nothing was recorded."""
+        if not self.count:
+            return None
+        rank = max(1, round(q * self.count))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                # Report the middle of the bucket, within the observed range.
+                middle = (self._lowest_value(index) +
+                          self._highest_value(index)) / 2e6
+                return min(max(middle, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class CommandStats(Instrumentation):
+    """Per-command call counts, error counts and latency histograms.
+
+    At most max_commands distinct commands are tracked; any more are
+    lumped together under OTHER so memory stays bounded. If export_path is
+    given, stats are exported there at most every export_interval seconds
+    (and always by export()). Commands may finish on several threads at once,
+    e.g: background jobs and server clients.
+    """
+
+    OTHER = "<other>"
+
+    def __init__(self, max_commands: int = 256, export_path: str = None,
+                 export_format: str = None, export_interval: float = 60):
+        """Constructor."""
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.max_commands = max_commands
+        self.export_path = export_path
+        self.export_format = export_format
+        self.export_interval = export_interval
+        self._lock = threading.Lock() # Guards commands and _last_export.
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.commands = {} # name -> [calls, errors, LatencyHistogram]
+            self.started = time.time()
+            self._last_export = time.monotonic()
+
+    def command_finished(self, line, fn_name, seconds, error=None):
+        with self._lock:
+            entry = self.commands.get(fn_name)
+            if entry is None:
+                if len(self.commands) >= self.max_commands:
+                    fn_name = self.OTHER
+                entry = self.commands.setdefault(fn_name, [0, 0, LatencyHistogram()])
+            entry[0] += 1
+            if error is not None:
+                entry[1] += 1
+            entry[2].record(seconds)
+            export_due = self.export_path and \
+                time.monotonic() - self._last_export >= self.export_interval
+            if export_due:
+                # Only one of the threads finishing now exports.
+                self._last_export = time.monotonic()
+        if export_due:
+            # A failed periodic export shouldn't fail the command that ran.
+            try:
+                self.export()
+            except Exception:
+                self.log.exception(f"Could not export stats to "
+                                   f"{self.export_path}.")
+
+    def report(self):
+        """Return a table of each command's calls, errors and latencies."""
+        with self._lock:
+            return self._report()
+
+    def _report(self):
+        if not self.commands:
+            return "No commands run yet."
+        width = max(len("command"), *(len(name) for name in self.commands))
+        columns = ["calls", "errors", "mean", *(f"p{q * 100:g}" for q in QUANTILES),
+                   "max"]
+        lines = [f"{'command':<{width}} " + " ".join(f"{c:>9}" for c in columns)]
+        for name, (calls, errors, histogram) in sorted(self.commands.items()):
+            latencies = [histogram.mean, *map(histogram.quantile, QUANTILES),
+                         histogram.max]
+            lines.append(f"{name:<{width}} {calls:>9} {errors:>9} " +
+                         " ".join(format_seconds(s) for s in latencies))
+        return "\n".join(lines)
+
+    def to_prometheus(self):
+        """Return the stats in the Prometheus text exposition format."""
+        with self._lock:
+            return self._to_prometheus()
+
+    def _to_prometheus(self):
+        lines = ["# HELP inpromptu_commands_total Commands run.",
+                 "# TYPE inpromptu_commands_total counter"]
+        entries = sorted(self.commands.items())
+        for name, (calls, _, _) in entries:
+            lines.append(f'inpromptu_commands_total{{command="{escape_label(name)}"}} {calls}')
+        lines += ["# HELP inpromptu_command_errors_total Commands that raised an error.",
+                  "# TYPE inpromptu_command_errors_total counter"]
+        for name, (_, errors, _) in entries:
+            lines.append(f'inpromptu_command_errors_total{{command="{escape_label(name)}"}} {errors}')
+        lines += ["# HELP inpromptu_command_latency_seconds Command latency.",
+                  "# TYPE inpromptu_command_latency_seconds summary"]
+        for name, (_, _, histogram) in entries:
+            label = f'command="{escape_label(name)}"'
+            for q in QUANTILES:
+                lines.append(f'inpromptu_command_latency_seconds{{{label},quantile="{q}"}} '
+                             f'{histogram.quantile(q):.9g}')
+            lines.append(f"inpromptu_command_latency_seconds_sum{{{label}}} "
+                         f"{histogram.total:.9g}")
+            lines.append(f"inpromptu_command_latency_seconds_count{{{label}}} "
+                         f"{histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self):
+        """Return the stats as one JSON object per command and line."""
+        with self._lock:
+            return self._to_json_lines()
+
+    def _to_json_lines(self):
+        timestamp = time.time()
+        lines = []
+        for name, (calls, errors, histogram) in sorted(self.commands.items()):
+            record = {"timestamp": timestamp, "command": name, "calls": calls,
+                      "errors": errors, "sum_seconds": histogram.total,
+                      "min_seconds": histogram.min,
+                      "max_seconds": histogram.max}
+            for q in QUANTILES:
+                record[f"p{q * 100:g}_seconds"] = histogram.quantile(q)
+            lines.append(json.dumps(record))
+        return "".join(line + "\n" for line in lines)
+
+    def export(self, path: str = None, export_format: str = None):
+        """Write the stats to a file.
+
+        Prometheus text replaces the file atomically (e.g: for a node
+        exporter textfile collector). JSON lines are appended so the file
+        keeps a history. The format is 'prometheus' or 'jsonl', or inferred
+        from the file extension if not given.
+        """
+        path = path or self.export_path
+        export_format = export_format or self.export_format or \
+            ("jsonl" if path.endswith((".jsonl", ".json")) else "prometheus")
+        if export_format not in ("jsonl", "prometheus"):
+            raise ValueError(f"Unknown export format: {export_format}. "
+                             "Valid formats are: prometheus, jsonl.")
+        # Render under the lock, but write without holding up commands.
+        with self._lock:
+            self._last_export = time.monotonic()
+            text = self._to_json_lines() if export_format == "jsonl" else \
+                self._to_prometheus()
+        if export_format == "jsonl":
+            with open(path, 'a') as export_file:
+                export_file.write(text)
+        else:
+            directory = os.path.dirname(os.path.abspath(path))
+            with tempfile.NamedTemporaryFile('w', dir=directory, delete=False) \
+                    as export_file:
+                export_file.write(text)
+            os.replace(export_file.name, path)
+
+
+def escape_label(value: str):
+    """Escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_seconds(seconds):
+    """Format a duration in seconds for a fixed-width table column."""
+    if seconds is None:
+        return f"{'-':>9}"
+    if seconds >= 1:
+        return f"{seconds:8.2f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:7.2f}ms"
+    return f"{seconds * 1e6:7.1f}us"
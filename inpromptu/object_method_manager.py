@@ -2,10 +2,19 @@
 """Class for Inspecting and managing the methods of an object instance."""
 
 import logging
+import os
 import sys
-from inspect import signature
+import weakref
+from collections import deque
+from collections.abc import Mapping
 from enum import Enum
-from typing import Union
+from inspect import signature, Parameter
+from inspect import _ParameterKind as ParamKind
+from types import MappingProxyType
+from typing import Any, Callable, NamedTuple, Optional, Union
+from .completions import OptionCache, PrefixIndex
+from .converters import get_converter, type_hint_name, type_hint_options
+from .errors import UserInputError
 # For versions before python 3.7, we need the backport of get_origin
 if sys.version_info < (3,7):
     from typing_extensions import get_origin, get_args
@@ -13,7 +22,6 @@ else:
     from typing import get_origin, get_args
 
 # TODO: figure out how to warn against multipledispatch
-# TODO: have a way of exporting and importing structure.
 
 # Workaround because getmembers does not get functions decorated with @property
 # https://stackoverflow.com/questions/3681272/can-i-get-a-reference-to-a-python-property
@@ -25,52 +33,511 @@ def get_dict_attr(class_def, attr):
     raise AttributeError
 
 
+def get_param_types(param: Parameter):
+    """Return a list of valid Python types for a given parameter."""
+    if param.annotation is Parameter.empty:
+        return [Any]
+    if get_origin(param.annotation) is Union:
+        return list(get_args(param.annotation))
+    return [param.annotation]
+
+
+class ParamSlot(NamedTuple):
+    """Precompiled parsing data for a single parameter.
+
+    Mirrors the attributes of inspect.Parameter used for parsing, but is
+    much cheaper to store and load.
+    """
+    name: str
+    kind: ParamKind
+    types: tuple  # Types that input text is converted to, in order.
+    annotation: Any
+    default: Any
+
+    empty = Parameter.empty
+
+    @property
+    def convert(self):
+        """Function converting input text to this parameter's types."""
+        return get_converter(self.types)
+
+
+class CallPlan(NamedTuple):
+    """Immutable, precompiled description of how to map input onto a callable.
+
+    Built once per method at introspection time so that dispatching and
+    completing a command never needs to call signature() again.
+    """
+    slots: tuple  # ParamSlots for every parameter, in signature order.
+    bound_param: Optional[str]  # 'self' or 'cls' if the first parameter.
+    first: int  # index of the first slot the user fills in.
+    positional: tuple  # indices of slots that accept positional input.
+    keywords: MappingProxyType  # name -> index of slots accepting kwargs.
+    var_positional: Optional[int]  # index of the *args slot.
+    var_keyword: Optional[int]  # index of the **kwargs slot.
+
+    @classmethod
+    def from_callable(cls, func):
+        """Build the call plan for a callable from its signature."""
+        slots = []
+        positional = []
+        keywords = {}
+        var_positional = None
+        var_keyword = None
+        for index, param in enumerate(signature(func).parameters.values()):
+            slots.append(ParamSlot(param.name, param.kind,
+                                   tuple(get_param_types(param)),
+                                   param.annotation, param.default))
+            if param.kind in (ParamKind.POSITIONAL_ONLY,
+                              ParamKind.POSITIONAL_OR_KEYWORD):
+                positional.append(index)
+            if param.kind in (ParamKind.POSITIONAL_OR_KEYWORD,
+                              ParamKind.KEYWORD_ONLY):
+                keywords[param.name] = index
+            if param.kind == ParamKind.VAR_POSITIONAL:
+                var_positional = index
+            elif param.kind == ParamKind.VAR_KEYWORD:
+                var_keyword = index
+        bound_param = None
+        if slots and slots[0].name in ['self', 'cls']:
+            bound_param = slots[0].name
+        return cls(slots=tuple(slots),
+                   bound_param=bound_param,
+                   first=1 if bound_param else 0,
+                   positional=tuple(positional),
+                   keywords=MappingProxyType(keywords),
+                   var_positional=var_positional,
+                   var_keyword=var_keyword)
+
+    def __reduce__(self):
+        # mappingproxy cannot be pickled, so restore it from a dict.
+        fields = self._asdict()
+        fields['keywords'] = dict(self.keywords)
+        return (_restore_call_plan, (fields,))
+
+
+def _restore_call_plan(fields):
+    fields['keywords'] = MappingProxyType(fields['keywords'])
+    return CallPlan(**fields)
+
+
 class ObjectManager:
-    """Inspects an object recursively and enables the invoking of any attribute's methods."""
+    """Navigates the objects reachable through an object's public attributes,
+    e.g: stage.x_axis.move.
+
+    Nothing is introspected up front. An object's sub-objects are listed and
+    its ObjectMethodManager is built the first time a path through it is
+    completed or invoked, and both are remembered. Objects are tracked by
+    identity, so an object reachable by several paths (e.g: through a
+    back-reference to its parent) is only introspected once.
+    """
+
+    SEPARATOR = '.'
+
+    def __init__(self, class_instance, snapshot = None, manager = None):
+        """Constructor.
+
+        :param manager: ObjectMethodManager of class_instance, if one was
+            already built.
+        """
+        self.class_instance = class_instance
+        self.snapshot = snapshot
+        # Keyed by id(). Each object is held alongside so its id isn't reused.
+        self._managers = {} # id -> (object, ObjectMethodManager)
+        self._children = {} # id -> (object, attribute count, PrefixIndex)
+        if manager is not None:
+            self._managers[id(class_instance)] = (class_instance, manager)
+
+    def manager(self, obj):
+        """Return the ObjectMethodManager of an object, building it once."""
+        try:
+            return self._managers[id(obj)][1]
+        except KeyError:
+            pass
+        omm = ObjectMethodManager(obj, snapshot=self.snapshot)
+        self._managers[id(obj)] = (obj, omm)
+        return omm
+
+    def child(self, obj, name: str):
+        """Return the sub-object held by an attribute of an object, or None
+        if the attribute doesn't hold one."""
+        value = getattr(obj, '__dict__', {}).get(name)
+        if value is None or not is_sub_object(name, value) or \
+                name in self.manager(obj).callables:
+            return None
+        return value
+
+    def children(self, obj):
+        """Return the names of an object's sub-objects as a PrefixIndex.
+
+        The names are listed once, and again only if the object's attributes
+        are added to or removed.
+        """
+        attributes = getattr(obj, '__dict__', {})
+        entry = self._children.get(id(obj))
+        if entry is None or entry[1] != len(attributes):
+            names = [name for name in list(attributes)
+                     if self.child(obj, name) is not None]
+            entry = self._children[id(obj)] = \
+                (obj, len(attributes), PrefixIndex(names))
+        return entry[2]
+
+    def resolve(self, path: str):
+        """Return the object at a dotted path of attribute names, relative to
+        the root object. Raise UserInputError if there is no such object."""
+        obj = self.class_instance
+        if not path:
+            return obj
+        for name in path.split(self.SEPARATOR):
+            obj = self.child(obj, name)
+            if obj is None:
+                raise UserInputError(f"{path} is not an object with callable "
+                                     "methods.")
+        return obj
+
+    def lookup(self, path: str):
+        """Return the ObjectMethodManager of the object a dotted command
+        belongs to and the command's name within it. Raise UserInputError if
+        there is no such object."""
+        owner_path, _, name = path.rpartition(self.SEPARATOR)
+        return self.manager(self.resolve(owner_path)), name
+
+    def match(self, prefix: str = ""):
+        """Return the sorted callables and sub-objects (ending in SEPARATOR)
+        at a dotted path that start with prefix."""
+        owner_path, separator, partial = prefix.rpartition(self.SEPARATOR)
+        try:
+            obj = self.resolve(owner_path)
+        except UserInputError:
+            return []
+        matches = self.manager(obj).match_callables(partial)
+        sub_objects = self.children(obj).match(partial)
+        if sub_objects:
+            matches = sorted(matches + [name + self.SEPARATOR
+                                        for name in sub_objects])
+        if not separator:
+            return matches
+        return [owner_path + separator + match for match in matches]
+
+    def walk(self):
+        """Yield (path, object) for every object reachable from the root,
+        breadth first. Objects reachable by several paths are only yielded
+        once, at their shortest path."""
+        visited = {id(self.class_instance)}
+        queue = deque([("", self.class_instance)])
+        while queue:
+            path, obj = queue.popleft()
+            yield path, obj
+            for name in self.children(obj).words:
+                child = self.child(obj, name)
+                if child is not None and id(child) not in visited:
+                    visited.add(id(child))
+                    queue.append((f"{path}{self.SEPARATOR}{name}" if path
+                                  else name, child))
+
+    def validate(self):
+        """Introspect every reachable object up front and warn about methods
+        that are missing type hints.
+
+        :return: Dictionary of the omitted methods of each object by path.
+        """
+        missing = {}
+        for path, obj in self.walk():
+            missing_hints = self.manager(obj).validate()
+            if missing_hints:
+                missing[path] = missing_hints
+        return missing
+
+
+def is_sub_object(name, value):
+    """True if an attribute holds an object whose methods can be navigated to,
+    e.g: a sub-device, rather than plain data."""
+    if name.startswith('_') or isinstance(value, Enum):
+        return False
+    # Skip instances of builtins (numbers, containers, functions, classes...)
+    return value.__class__.__module__ not in ['__builtins__', 'builtins']
+
+
+class ClassStructure:
+    """Introspection results for a class that do not depend on an instance.
+
+    Built once per class and shared by every ObjectMethodManager inspecting
+    an instance of it. Only names and precompiled data are held (not the
+    class's functions) so the structure does not keep its class alive.
+    """
+
+    def __init__(self, cls):
+        """Constructor. Call plans and method definitions are built lazily."""
+        # Name of each user-facing attribute mapped to the index into
+        # cls.__mro__ of the class whose __dict__ defines it.
+        self.locations = {}
+        for name in dir(cls):
+            for index, klass in enumerate(cls.__mro__):
+                if name in klass.__dict__:
+                    value = klass.__dict__[name]
+                    if is_member(name, value):
+                        self.locations[name] = index
+                    break
+        self.call_plans = {}
+        self.property_getter_plans = {}
+        # Method definitions without instance-bound defaults for self & cls.
+        # Methods that are missing type hints map to None.
+        self.method_defs = {}
+        # Previously built (call plan, method definition) pairs and property
+        # getter plans, e.g. from a snapshot, used before building anew.
+        self.stored_methods = {}
+        self.stored_property_getters = {}
+
+    def get_call_plan(self, name, method):
+        """Return the call plan of a class-level method, building it once."""
+        try:
+            return self.call_plans[name]
+        except KeyError:
+            pass
+        try:
+            self.call_plans[name], self.method_defs[name] = \
+                self.stored_methods[name]
+        except KeyError:
+            self.call_plans[name] = CallPlan.from_callable(method)
+        return self.call_plans[name]
+
+    def get_property_getter_plan(self, name, getter):
+        """Return the call plan of a class-level property getter."""
+        try:
+            return self.property_getter_plans[name]
+        except KeyError:
+            pass
+        try:
+            self.property_getter_plans[name] = self.stored_property_getters[name]
+        except KeyError:
+            self.property_getter_plans[name] = CallPlan.from_callable(getter)
+        return self.property_getter_plans[name]
+
+    def get_method_def(self, name, method):
+        """Return the method definition template of a class-level method."""
+        plan = self.get_call_plan(name, method)
+        try:
+            return self.method_defs[name]
+        except KeyError:
+            definition = self.method_defs[name] = build_method_def(method, plan)
+            return definition
+
+    def resolve_all(self, cls):
+        """Build every call plan and method definition of cls."""
+        methods, property_getters = {}, {}
+        for name, value in self.members(cls):
+            add_member(name, value, methods, property_getters)
+        for name, method in methods.items():
+            self.get_method_def(name, method)
+        for name, getter in property_getters.items():
+            self.get_property_getter_plan(name, getter)
+
+    @classmethod
+    def from_state(cls, state):
+        """Recreate a ClassStructure from the output of get_state().
+
+        The 'methods' and 'property_getters' entries may be any Mapping,
+        such as one that loads entries on demand.
+        """
+        structure = cls.__new__(cls)
+        structure.locations = state['locations']
+        structure.call_plans = {}
+        structure.property_getter_plans = {}
+        structure.method_defs = {}
+        structure.stored_methods = state['methods']
+        structure.stored_property_getters = state['property_getters']
+        return structure
+
+    def get_state(self, cls):
+        """Return the whole structure of cls as a dict of picklable data."""
+        self.resolve_all(cls)
+        return {'locations': self.locations,
+                'methods': {name: (plan, self.method_defs[name])
+                            for name, plan in self.call_plans.items()},
+                'property_getters': dict(self.property_getter_plans)}
+
+    def members(self, cls):
+        """Yield (name, value) pairs of the cls's user-facing attributes."""
+        mro = cls.__mro__
+        for name, index in self.locations.items():
+            yield name, mro[index].__dict__[name]
+
+
+# Shared ClassStructures keyed weakly so that classes can be collected.
+_class_structures = weakref.WeakKeyDictionary()
+
+def get_class_structure(cls, snapshot=None):
+    """Return the (cached) ClassStructure for a class.
+
+    If a StructureSnapshot is provided, the structure is loaded from it when
+    it is up-to-date and added to it otherwise.
+    """
+    try:
+        return _class_structures[cls]
+    except KeyError:
+        pass
+    except TypeError: # Class does not support weak references.
+        return ClassStructure(cls)
+    structure = snapshot.load(cls) if snapshot is not None else None
+    if structure is None:
+        structure = ClassStructure(cls)
+        if snapshot is not None:
+            snapshot.store(cls, structure)
+    _class_structures[cls] = structure
+    return structure
+
+
+def is_member(name, value):
+    """True if an attribute should be exposed as a callable.
 
-    def __init__(self, class_instance):
+    Classmethod objects are not callable and so are never exposed, as before.
+    """
+    if isinstance(value, property):
+        return value.fset is not None or value.fget is not None
+    # Skip over special "dunder" methods.
+    # Skip over anything that isn't callable.
+    return not name.startswith('_') and callable(value)
+
+
+def add_member(name, value, methods, property_getters, method_ignore_list=[]):
+    """Sort an attribute into methods or property getters."""
+    # Special case properties, which may be tied to 2 relevant methods.
+    if isinstance(value, property):
+        if value.fset is not None:
+            methods[name] = value.fset
+        if value.fget is not None:
+            # Store the getter elsewhere to prevent name clash
+            property_getters[name] = value.fget
+    # Skip over methods we should explicitly ignore.
+    elif name not in method_ignore_list and is_member(name, value):
+        methods[name] = value
+
+
+def get_missing_hints(plan):
+    """Return the names of a call plan's parameters that lack type hints."""
+    return [slot.name for slot in plan.slots
+            if slot.annotation is slot.empty and slot.name not in ['self', 'cls']]
+
+
+def build_method_def(method, plan):
+    """Build a method definition. Return None if the method is missing type
+    hints.
+
+    Defaults of 'self' and 'cls' parameters are left for the caller to bind.
+    """
+    parameters = {}
+    param_order = []
+    # FIXME: how does we handle functions wrapped in decorators??
+    # Collapse to the function any wrapped functions.
+    # This works only for function decorator wrappers using
+    # functools.wraps to do the wrapping
+    #while hasattr(method, "__wrapped__"):
+    #    method = method.__wrapped__
+
+    # Useful for parsing function signature.
+    # https://docs.python.org/3/tutorial/controlflow.html#special-parameters
+    # Enforce type hinting for all decorated methods.
+    if get_missing_hints(plan):
+        return None
+    for slot in plan.slots:
+        parameter_name = slot.name
+        # Note: parameter_name does not include '*' or '**' prefix.
+        param_order.append(parameter_name)
+        param_data = {'kind': slot.kind}
+        param_types = []
+        if slot.annotation is not slot.empty:
+            param_types = list(slot.types)
+        # Check for parameter default value.
+        if slot.default is not slot.empty:
+            param_data["default"] = slot.default
+        # Add completions implied by the types, e.g: enum members and bools.
+        param_options = []
+        for param_type in param_types:
+            param_options.extend(type_hint_options(param_type))
+        # Populate non-empty dict fields.
+        if param_options:
+            param_data['options'] = param_options
+        if param_types:
+            param_data['types'] = param_types
+            # What to display as the parameter's type, e.g: list[int]|None.
+            param_data['hint'] = "|".join(type_hint_name(t) for t in param_types)
+        parameters[parameter_name] = param_data
+    # Create the top-level dictionary structure for this method.
+    return \
+    {
+        "param_order": param_order,
+        "parameters": parameters,
+        "doc": method.__doc__
+    }
+
+
+class LazyDefinitions(Mapping):
+    """Read-only mapping whose values are built on first access.
+
+    Keys are drawn from a collection of candidate names. build(name) returns
+    the value for a name, or None to omit that name from the mapping.
+    """
+
+    def __init__(self, names, build):
         """Constructor."""
+        self._names = names
+        self._build = build
+        self._values = {}
 
-        def get_callable_dag(object_inst, indentation="    "):
-            """Retrieve the directed acyclic graph for this object. (recursive)."""
+    def __getitem__(self, name):
+        try:
+            value = self._values[name]
+        except KeyError:
+            if name not in self._names:
+                raise
+            value = self._values[name] = self._build(name)
+        if value is None:
+            raise KeyError(name)
+        return value
 
-            attributes = {}
-            for attribute_name in dir(object_inst):
-                if attribute_name.startswith('_'): # skip hidden attributes.
-                    continue
-                try:
-                    value = get_dict_attr(object_inst, attribute_name)
-                    # Skip non-userdefined classes since we don't care about their methods.
-                    if value.__class__.__module__ in ['__builtins__', 'builtins']: # 3.6, 3.7+
-                        continue
-                    # Check if this object inst has callables.
-                    print(indentation + attribute_name)
-                    omm = ObjectMethodManager(value)
-                    if len(omm.callables) == 0:
-                        del omm
-                        continue
-                    #print(indentation + attribute_name)
-                    attributes[attribute_name] = {"instance": value}
-                    subattributes = get_callable_dag(value, indentation=indentation + "    ")
-                    attributes[attribute_name]["attributes"] = subattributes
-                except Exception as e:
-                    print(indentation + str(e))
-                    pass
-            return attributes
-
-        # Directed Acyclic Graph of all nested (nonbuiltin) object instances with callables.
-        self.callable_dag = get_callable_dag(class_instance)
-        import pprint
-        pprint.pprint(self.callable_dag)
+    def __contains__(self, name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return (name for name in list(self._names) if name in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._values})"
 
 
 class ObjectMethodManager:
-    """Inspects an object and aggregates its callable methods."""
+    """Inspects an object and aggregates its callable methods.
+
+    Call plans and method definitions are built the first time a method is
+    completed, dispatched, or asked for help. Use validate() to check all
+    methods up front.
+    """
 
-    def __init__(self, class_instance, methods_to_skip = [], var_arg_subs = {}):
-        """collect functions."""
+    # Number of (method, parameter, prefix) provider results to keep.
+    OPTION_CACHE_SIZE = 256
+
+    def __init__(self, class_instance, methods_to_skip = [], var_arg_subs = {},
+                 snapshot = None):
+        """collect functions.
+
+        :param snapshot: optional StructureSnapshot (or path to one) to load
+            the class's introspection results from and save them to.
+        """
         self.log = logging.getLogger(self.__class__.__name__)
         self.class_instance = class_instance
+        # Introspection results shared with other instances of this class.
+        if isinstance(snapshot, (str, os.PathLike)):
+            from .snapshot import StructureSnapshot
+            snapshot = StructureSnapshot.open(snapshot)
+        self.snapshot = snapshot
+        self.structure = get_class_structure(class_instance.__class__, snapshot)
 
         # Containers for methods and their signatures.
         # Methods decorated with @property become property objects which can
@@ -79,15 +546,7 @@ class ObjectMethodManager:
         # different signature, so we hold onto all properties so that we can
         # invoke fgets separately.
         self.methods, self.property_getters = self._get_methods(methods_to_skip)
-        # Insert a 'help' method into the callables that prints the docstring.
-        # Note: do this before calling _get_method_defs() so we get sig params.
-        self.methods['help'] = self.help
-        self.callables = set({**self.methods, **self.property_getters}.keys())
-        self.method_defs = self._get_method_defs()
-        # Provide help's arg completion options.
-        self.method_defs['help']['parameters']['func_name']['types'] = [str]
-        self.method_defs['help']['parameters']['func_name']['options'] = \
-            [str(a) for a in self.callables]
+        self._index_callables()
 
         #self._apply_variable_argument_substitutions(var_arg_subs)
 
@@ -99,106 +558,137 @@ class ObjectMethodManager:
         #print("callables")
         #pprint.pprint(self.callables)
 
+    def _index_callables(self):
+        """Add 'help' to the collected methods and set up the lazily built
+        call plans, method definitions and completion indexes."""
+        # Insert a 'help' method into the callables that prints the docstring.
+        self.methods['help'] = self.help
+        self._instance_members.add('help')
+        self.callables = set({**self.methods, **self.property_getters}.keys())
+        self.callable_index = PrefixIndex(self.callables)
+        # Prefix indexes of parameter options, built on first lookup.
+        self._option_indexes = {}
+        # Options from provider callables, cached by (method, param, prefix).
+        self._option_providers = {} # (method, param) -> (provider, ttl)
+        self.option_cache = OptionCache(self.OPTION_CACHE_SIZE)
+        # Precompile how input is mapped onto each callable's parameters.
+        # Plans for callables defined by the class come from the structure.
+        self.call_plans = LazyDefinitions(self.methods, self._get_call_plan)
+        self.property_getter_plans = \
+            LazyDefinitions(self.property_getters, self._get_property_getter_plan)
+        self.method_defs = LazyDefinitions(self.methods, self._get_method_def)
+        # Provide help's arg completion options.
+        self.method_defs['help']['parameters']['func_name']['types'] = [str]
+        self.method_defs['help']['parameters']['func_name']['hint'] = 'str'
+        self.method_defs['help']['parameters']['func_name']['options'] = \
+            [str(a) for a in self.callables]
+
     def _get_methods(self, method_ignore_list = []):
         """Collect all methods but avoid the ones in the method_ignore_list."""
 
         methods = {}
         property_getters = {}
-
-        for name in dir(self.class_instance):
-            #print(name)
-            # Custom fn since getmembers does not get functions decorated with @property
-            value = get_dict_attr(self.class_instance, name)
-            # Special case properties, which may be tied to 2 relevant methods.
-            if isinstance(value, property):
-                if value.fset is not None:
-                    methods[name] = value.fset
-                if value.fget is not None:
-                    # Store the getter elsewhere to prevent name clash
-                    property_getters[name] = value.fget
-            elif isinstance(value, classmethod):
-                value = value.__func__
-            # Skip over methods we should explicitly ignore.
-            # Skip over special "dunder" methods.
-            # Skip over anything that isn't callable.
-            elif name in method_ignore_list or name.startswith('_') or \
-                 not callable(value):
-                continue
-            else:
-                methods[name] = value
+        # Attributes set on the instance shadow those of its class.
+        instance_dict = getattr(self.class_instance, '__dict__', {})
+        self._instance_members = set()
+        for name, value in self.structure.members(self.class_instance.__class__):
+            if name not in instance_dict:
+                add_member(name, value, methods, property_getters,
+                           method_ignore_list)
+        for name, value in instance_dict.items():
+            if is_member(name, value):
+                self._instance_members.add(name)
+                add_member(name, value, methods, property_getters,
+                           method_ignore_list)
 
         return methods, property_getters
 
-    def _get_method_defs(self):
-        """Build method definitions. Skip methods that are missing type hints.
+    def _get_call_plan(self, name):
+        """Build the call plan for a method, reusing the class's if possible."""
+        method = self.methods[name]
+        if name == 'help' and method == self.help:
+            # help is bound to this manager rather than the class instance.
+            cls = self.__class__
+            if '_help_plan' not in cls.__dict__:
+                cls._help_plan = CallPlan.from_callable(self.help)
+            return cls._help_plan
+        if name in self._instance_members:
+            return CallPlan.from_callable(method)
+        return self.structure.get_call_plan(name, method)
 
-        :return: Dictionary of method names mapped to their definitions.
-        """
-        definitions = {}
-        for method_name, method in self.methods.items():
-            parameters = {}
-            param_order = []
-            sig = signature(method)
-            # FIXME: how does we handle functions wrapped in decorators??
-            # Collapse to the function any wrapped functions.
-            # This works only for function decorator wrappers using
-            # functools.wraps to do the wrapping
-            #while hasattr(method, "__wrapped__"):
-            #    method = method.__wrapped__
-
-            # Useful for parsing function signature.
-            # https://docs.python.org/3/tutorial/controlflow.html#special-parameters
-            missing_hints = []
-            for parameter_name, param in sig.parameters.items():
-                # Note: parameter_name does not include '*' or '**' prefix.
-                param_order.append(parameter_name)
-                param_data = {'kind': param.kind}
-                param_types = []
-                if param.annotation is not param.empty:
-                    if get_origin(param.annotation) is Union:
-                        param_types = list(get_args(param.annotation))
-                    else:
-                        param_types = [param.annotation]
-                # Enforce type hinting for all decorated methods.
-                if not param_types and parameter_name not in ['self', 'cls']:
-                    missing_hints.append(param)
-                    continue
-                # Check for parameter default value. Populate self & cls.
-                if param.default is not param.empty:
-                    param_data["default"] = param.default
-                elif parameter_name == 'self':
+    def _get_property_getter_plan(self, name):
+        """Build the call plan for a property getter."""
+        getter = self.property_getters[name]
+        if name in self._instance_members:
+            return CallPlan.from_callable(getter)
+        return self.structure.get_property_getter_plan(name, getter)
+
+    def _get_method_def(self, name):
+        """Build a method definition. Return None for methods that are
+        missing type hints."""
+        method = self.methods[name]
+        if name in self._instance_members:
+            template = build_method_def(method, self.call_plans[name])
+        else:
+            template = self.structure.get_method_def(name, method)
+        if template is None:
+            return None
+        return self._bind_method_def(template)
+
+    def _bind_method_def(self, template):
+        """Return a copy of a method definition with self & cls populated."""
+        parameters = {}
+        for parameter_name, param_data in template['parameters'].items():
+            param_data = dict(param_data)
+            # Converters aren't part of the (picklable) template.
+            if 'types' in param_data:
+                param_data['converter'] = get_converter(param_data['types'])
+            if 'default' not in param_data:
+                if parameter_name == 'self':
                     param_data["default"] = self.class_instance
                 elif parameter_name == 'cls':
                     param_data["default"] = self.class_instance.__class__
-                # Add enum completions for each enum type in the list of types.
-                param_options = []
-                for param_type in param_types:
-                    if param_type is not None and issubclass(param_type, Enum):
-                        param_options.extend([str(a) for a in param_type])
-                    # Add bool completions.
-                    elif param_type is bool:
-                        param_options.extend(["True", "False"])
-                # Populate non-empty dict fields.
-                if param_options:
-                    param_data['options'] = param_options
-                if param_types:
-                    param_data['types'] = param_types
-                parameters[parameter_name] = param_data
-            # Skip methods that do not have all parameters type hinted.
-            if len(missing_hints):
+            parameters[parameter_name] = param_data
+        return {**template, "param_order": list(template["param_order"]),
+                "parameters": parameters}
+
+    def get_definitions(self):
+        """Return the call plans and method definitions (without self & cls
+        defaults) of every callable but 'help', e.g: to complete commands for
+        this object in another process.
+
+        :return: {'methods': {name: (call plan, method definition or None)},
+            'property_getters': {name: (call plan, docstring)}}
+        """
+        methods = {}
+        for name, method in self.methods.items():
+            if name == 'help' and method == self.help:
+                continue
+            if name in self._instance_members:
+                template = build_method_def(method, self.call_plans[name])
+            else:
+                template = self.structure.get_method_def(name, method)
+            methods[name] = (self.call_plans[name], template)
+        property_getters = {name: (self.property_getter_plans[name], getter.__doc__)
+                            for name, getter in self.property_getters.items()}
+        return {'methods': methods, 'property_getters': property_getters}
+
+    def validate(self):
+        """Build every method definition and warn about methods that are
+        omitted because they are missing type hints.
+
+        :return: Dictionary of omitted method names mapped to the names of
+            their parameters that are missing type hints.
+        """
+        missing = {}
+        for method_name in self.methods:
+            missing_hints = get_missing_hints(self.call_plans[method_name])
+            if missing_hints:
+                missing[method_name] = missing_hints
                 self.log.warning(f"Method: '{method_name}' is missing type hints for "
                                  f"the following parameters: {missing_hints}. "
                                  "Omitting this method.")
-                continue
-            # Create the top-level dictionary structure for this method.
-            definitions[method_name] = \
-            {
-                "param_order": param_order,
-                "parameters": parameters,
-                "doc": method.__doc__
-            }
-
-        return definitions
+        return missing
 
     def help(self, func_name: str):
         """Print a cli method's docstring."""
@@ -229,22 +719,92 @@ class ObjectMethodManager:
             print(f"Error: {func_name} is not a callable method.")
 
     def set_completion_options(self, method: str, parameter: str,
-                           options: list[str]):
+                               options: Union[list[str], Callable],
+                               ttl: float = None):
         """Specify a specific set of completion options for a method parameter.
-         Override existing options."""
+         Override existing options.
+
+        options may also be a provider: a callable returning the options,
+        either taking no arguments or taking the text typed so far. Provider
+        results are cached per prefix for ttl seconds (or until invalidated
+        if ttl is None).
+        """
         self._check_method_completion_options(method, parameter)
         self.method_defs[method]['parameters'][parameter]['options'] = options
+        self.option_cache.invalidate(method, parameter)
+        if callable(options):
+            self._option_providers[(method, parameter)] = \
+                (self._prefix_provider(options), ttl)
+            self._option_indexes.pop((method, parameter), None)
+        else:
+            self._option_providers.pop((method, parameter), None)
+            self._option_indexes[(method, parameter)] = PrefixIndex(options)
+
+    def invalidate_completion_options(self, method: str = None,
+                                      parameter: str = None):
+        """Discard cached provider results for a method parameter, a method,
+        or all methods so that the next completion queries the provider."""
+        self.option_cache.invalidate(method, parameter)
 
     def get_completion_options(self, method: str, parameter: str):
-        """Get completion options for a method's parameter."""
+        """Get completion options (or their provider) for a method's parameter."""
         self._check_method_completion_options(method, parameter)
         return self.method_defs[method]['parameters'][parameter]['options']
 
+    @staticmethod
+    def _prefix_provider(provider: Callable):
+        """Return provider as a callable that takes the typed prefix."""
+        try:
+            takes_prefix = len(signature(provider).parameters) > 0
+        except (TypeError, ValueError): # Uninspectable builtin.
+            takes_prefix = True
+        if takes_prefix:
+            return provider
+        return lambda prefix: provider()
+
+    def match_callables(self, prefix: str = ""):
+        """Return the sorted callable names that start with prefix."""
+        return self.callable_index.match(prefix)
+
+    def match_completion_options(self, method: str, parameter: str,
+                                 prefix: str = ""):
+        """Return the sorted completion options of a method parameter that
+        start with prefix."""
+        if (method, parameter) in self._option_providers:
+            return self._match_provided_options(method, parameter, prefix)
+        options = self.method_defs[method]['parameters'][parameter].get('options', [])
+        index = self._option_indexes.get((method, parameter))
+        # Rebuild if the options were replaced since the index was built.
+        if index is None or index.source is not options:
+            index = PrefixIndex(options)
+            self._option_indexes[(method, parameter)] = index
+        return index.match(prefix)
+
+    def _match_provided_options(self, method: str, parameter: str,
+                                prefix: str):
+        """Return a provider's options that start with prefix, querying the
+        provider only on a cache miss."""
+        key = (method, parameter, prefix)
+        matches = self.option_cache.get(key)
+        if matches is not None:
+            return list(matches)
+        provider, ttl = self._option_providers[(method, parameter)]
+        try:
+            options = [str(o) for o in provider(prefix)]
+        except Exception as e:
+            # A failing provider offers nothing, but shouldn't break input.
+            self.log.warning(f"Completion option provider for {method}"
+                             f"({parameter}) failed: {e!r}")
+            return []
+        matches = PrefixIndex(options).match(prefix)
+        self.option_cache.put(key, matches, ttl)
+        return list(matches)
+
     def _check_method_completion_options(self, method: str, parameter: str):
         if method not in self.methods:
             raise ValueError(f"{method} is not a valid method. Valid methods "
                              f"are: {self.methods}.")
         if parameter not in self.method_defs[method]['parameters']:
             raise ValueError(f"{parameter} is not a parameter of method: "
-                f"{method}. Valid parameters are: {list(self.method_defs['method']['parameters'].keys())}.")
+                f"{method}. Valid parameters are: {list(self.method_defs[method]['parameters'].keys())}.")
 
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""Size-limited formatting of command results, chosen by the result's type."""
+
+import base64
+import json
+import sys
+from collections import deque
+from enum import Enum
+from itertools import islice
+
+
+def elide(text: str, max_chars: int):
+    """Return text, with its middle replaced by '...' if it is longer than
+    max_chars."""
+    if len(text) <= max_chars:
+        return text
+    half = max(1, (max_chars - 5) // 2)
+    return f"{text[:half]} ... {text[-half:]}"
+
+
+class Renderer:
+    """Formats values of a type for display and for JSON output.
+
+    Subclass and register an instance for a type with
+    ResultFormatter.register().
+    """
+
+    def format(self, value, formatter, depth: int):
+        """Return value as display text. depth is 0 for a command's result
+        and 1 more for each container it's nested in. Format nested values
+        with formatter.format(item, depth + 1)."""
+        return str(value) if depth == 0 else repr(value)
+
+    def to_json(self, value, formatter):
+        """Return value as JSON-compatible data. Convert nested values with
+        formatter.to_json(item)."""
+        return str(value)
+
+
+class ScalarRenderer(Renderer):
+    """Numbers, bools and None, which JSON represents as they are."""
+
+    def to_json(self, value, formatter):
+        return value
+
+
+class StringRenderer(Renderer):
+    """Strings, of which only the characters shown are ever copied: up to
+    max_chars of a result, or max_string of a nested string."""
+
+    def format(self, value, formatter, depth):
+        limit = formatter.max_string if depth else formatter.max_chars
+        if len(value) > limit:
+            half = limit // 2
+            text = f"{value[:half]} ... {value[-half:]}"
+        else:
+            text = value
+        return text if depth == 0 else repr(text)
+
+    def to_json(self, value, formatter):
+        return value
+
+
+class BytesRenderer(Renderer):
+    """bytes, bytearrays and memoryviews of bytes, shown elided and sent as
+    base64 in JSON."""
+
+    def format(self, value, formatter, depth):
+        if isinstance(value, memoryview):
+            if value.format != 'B' or value.ndim != 1:
+                return super().format(value, formatter, depth)
+            text = lambda data: repr(bytes(data))
+        else:
+            text = repr
+        if len(value) <= formatter.max_string:
+            return text(value)
+        half = formatter.max_string // 2
+        return f"{text(value[:half])} ... {text(value[-half:])} " \
+               f"({len(value)} bytes)"
+
+    def to_json(self, value, formatter):
+        return base64.b64encode(value).decode('ascii')
+
+
+class EnumRenderer(Renderer):
+    """Enum members, sent by name in JSON."""
+
+    def format(self, value, formatter, depth):
+        return str(value)
+
+    def to_json(self, value, formatter):
+        return value.name
+
+
+class SequenceRenderer(Renderer):
+    """Lists, tuples and deques. Only the items at either end of a long
+    sequence are formatted. Subclasses with their own __repr__, e.g:
+    namedtuples, are formatted by it instead."""
+
+    BASES = (list, tuple, deque)
+
+    def format(self, value, formatter, depth):
+        if not value or type(value).__repr__ not in \
+                [base.__repr__ for base in self.BASES]:
+            return super().format(value, formatter, depth)
+        if isinstance(value, tuple):
+            opening, closing = "(", ")"
+        elif isinstance(value, deque):
+            opening, closing = f"{type(value).__name__}([", "])"
+        else:
+            opening, closing = "[", "]"
+        if depth >= formatter.max_depth:
+            return f"{opening}...{closing}"
+        items = formatter.format_items(iter(value), reversed(value), len(value),
+                                       lambda item: formatter.format(item, depth + 1))
+        if isinstance(value, tuple) and len(value) == 1:
+            closing = ",)"
+        return f"{opening}{', '.join(items)}{closing}"
+
+    def to_json(self, value, formatter):
+        return [formatter.to_json(item) for item in value]
+
+
+class SetRenderer(Renderer):
+    """Sets and frozensets. Sets aren't ordered, so only their first items
+    are shown."""
+
+    def format(self, value, formatter, depth):
+        if not value:
+            return repr(value)
+        opening, closing = ("{", "}") if type(value) is set else \
+            (f"{type(value).__name__}({{", "})")
+        if depth >= formatter.max_depth:
+            return f"{opening}...{closing}"
+        items = formatter.format_items(iter(value), None, len(value),
+                                       lambda item: formatter.format(item, depth + 1))
+        return f"{opening}{', '.join(items)}{closing}"
+
+    def to_json(self, value, formatter):
+        return [formatter.to_json(item) for item in value]
+
+
+class MappingRenderer(Renderer):
+    """Dicts. Only the entries at either end of a long dict are formatted."""
+
+    def format(self, value, formatter, depth):
+        if not value:
+            return repr(value)
+        if depth >= formatter.max_depth:
+            return "{...}"
+        def format_entry(entry):
+            key, item = entry
+            return f"{formatter.format(key, depth + 1)}: " \
+                   f"{formatter.format(item, depth + 1)}"
+        entries = formatter.format_items(iter(value.items()),
+                                         reversed(value.items()), len(value),
+                                         format_entry)
+        return f"{{{', '.join(entries)}}}"
+
+    def to_json(self, value, formatter):
+        return {key if isinstance(key, str) else str(formatter.to_json(key)):
+                formatter.to_json(item) for key, item in value.items()}
+
+
+class NumpyArrayRenderer(Renderer):
+    """NumPy arrays, summarized by NumPy itself."""
+
+    def format(self, value, formatter, depth):
+        numpy = sys.modules['numpy']
+        with numpy.printoptions(threshold=formatter.max_items, edgeitems=3):
+            return repr(value) if depth else str(value)
+
+    def to_json(self, value, formatter):
+        return value.tolist()
+
+
+class NumpyScalarRenderer(Renderer):
+    """NumPy scalars, e.g: numpy.float64."""
+
+    def format(self, value, formatter, depth):
+        return str(value) if depth == 0 else repr(value.item())
+
+    def to_json(self, value, formatter):
+        return value.item()
+
+
+class DataFrameRenderer(Renderer):
+    """pandas DataFrames and Series, truncated by pandas itself."""
+
+    def format(self, value, formatter, depth):
+        if depth:
+            return f"<{type(value).__name__} {value.shape}>"
+        if hasattr(value, 'columns'):
+            return value.to_string(max_rows=formatter.max_rows,
+                                   max_cols=formatter.max_columns)
+        return value.to_string(max_rows=formatter.max_rows)
+
+    def to_json(self, value, formatter):
+        if hasattr(value, 'columns'):
+            return formatter.to_json(value.to_dict(orient='records'))
+        return formatter.to_json(value.to_dict())
+
+
+class ResultFormatter:
+    """Formats command results with the Renderer registered for their type
+    (or the nearest base class), within size limits.
+
+    Containers are formatted lazily: long ones have their middle items
+    elided, and only the items that will be shown are formatted.
+    """
+
+    def __init__(self, max_chars: int = 4000, max_items: int = 100,
+                 max_depth: int = 6, max_string: int = 1000,
+                 max_rows: int = 60, max_columns: int = 20):
+        """Constructor.
+
+        :param max_chars: longest display text of a result.
+        :param max_items: most items of a container that are shown.
+        :param max_depth: deepest nesting of containers that is shown.
+        :param max_string: most characters of a string that are shown.
+        :param max_rows: most rows of a table (e.g: a DataFrame) shown.
+        :param max_columns: most columns of a table shown.
+        """
+        self.max_chars = max_chars
+        self.max_items = max_items
+        self.max_depth = max_depth
+        self.max_string = max_string
+        self.max_rows = max_rows
+        self.max_columns = max_columns
+        # Types or 'module.QualifiedName' strings (for types of optional
+        # libraries that might not be imported) -> Renderer.
+        self.renderers = {}
+        self._resolved = {} # type -> Renderer, following the mro.
+        scalars = ScalarRenderer()
+        for cls in [int, float, bool, type(None)]:
+            self.register(cls, scalars)
+        self.register(object, Renderer())
+        self.register(str, StringRenderer())
+        self.register(bytes, BytesRenderer())
+        self.register(bytearray, BytesRenderer())
+        self.register(memoryview, BytesRenderer())
+        self.register(Enum, EnumRenderer())
+        for cls in [list, tuple, deque]:
+            self.register(cls, SequenceRenderer())
+        self.register(set, SetRenderer())
+        self.register(frozenset, SetRenderer())
+        self.register(dict, MappingRenderer())
+        self.register("numpy.ndarray", NumpyArrayRenderer())
+        self.register("numpy.generic", NumpyScalarRenderer())
+        self.register("pandas.core.frame.DataFrame", DataFrameRenderer())
+        self.register("pandas.core.series.Series", DataFrameRenderer())
+
+    def register(self, cls, renderer: Renderer):
+        """Format values of a type (and its subclasses) with a renderer.
+        cls may be a type or a 'module.QualifiedName' string."""
+        self.renderers[cls] = renderer
+        self._resolved.clear()
+
+    def get_renderer(self, cls):
+        """Return the renderer for a type."""
+        try:
+            return self._resolved[cls]
+        except KeyError:
+            pass
+        for klass in cls.__mro__:
+            renderer = self.renderers.get(klass) or \
+                self.renderers.get(f"{klass.__module__}.{klass.__qualname__}")
+            if renderer is not None:
+                break
+        self._resolved[cls] = renderer
+        return renderer
+
+    def format(self, value, depth: int = 0):
+        """Return the display text of a value, at most max_chars long."""
+        text = self.get_renderer(type(value)).format(value, self, depth)
+        return elide(text, self.max_chars)
+
+    def format_items(self, items, reversed_items, count: int, format_item):
+        """Format the items of a container for display.
+
+        If there are more than max_items, or their text would be longer than
+        max_chars, those in the middle are replaced by a '...' entry and
+        never formatted.
+
+        :param items: iterator of the items.
+        :param reversed_items: iterator of the items from last to first, or
+            None if there isn't one. Then only the first items are shown.
+        :param count: number of items.
+        :param format_item: function formatting an item.
+        """
+        head_count = count if count <= self.max_items else self.max_items // 2
+        head = self._format_some(items, head_count, format_item)
+        if len(head) == count:
+            return head
+        tail = []
+        if reversed_items is not None:
+            tail_count = min(self.max_items - len(head), count - len(head),
+                             max(1, self.max_items // 2))
+            tail = self._format_some(reversed_items, tail_count, format_item)
+            tail.reverse()
+        return head + [f"...{count - len(head) - len(tail)} more..."] + tail
+
+    def _format_some(self, items, count, format_item):
+        """Format up to count items, or fewer if their text would be longer
+        than about half of max_chars. The first item is always kept."""
+        formatted = []
+        length = 0
+        budget = (self.max_chars - 40) // 2
+        for item in islice(items, count):
+            text = format_item(item)
+            length += len(text) + 2
+            if formatted and length > budget:
+                break
+            formatted.append(text)
+        return formatted
+
+    def to_json(self, value):
+        """Return a value as JSON-compatible data."""
+        return self.get_renderer(type(value)).to_json(value, self)
+
+    def to_json_line(self, value):
+        """Return a value as a line of JSON."""
+        return json.dumps(self.to_json(value), default=str)
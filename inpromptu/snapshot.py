@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""On-disk snapshots of introspected class structure for faster startup."""
+
+import atexit
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import typing
+from enum import Enum
+from .object_method_manager import ClassStructure, LazyDefinitions
+
+
+SNAPSHOT_VERSION = 4
+
+
+def class_key(cls):
+    """Return the key identifying a class in a snapshot."""
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def annotation_types(hint):
+    """Yield the classes a type hint refers to, e.g: Color and int for
+    list[Color] | int, or Mode for Literal[Mode.a]."""
+    if isinstance(hint, type):
+        yield hint
+    elif isinstance(hint, Enum):
+        yield type(hint)
+    args = hint if isinstance(hint, list) else typing.get_args(hint)
+    for arg in args:
+        yield from annotation_types(arg)
+
+
+class StructureSnapshot:
+    """A file of ClassStructures keyed by class name and source hash.
+
+    Entries whose source hash no longer matches the class's current source,
+    or the source of the modules defining its parameters' types (e.g: an
+    Enum whose members are offered as options), are treated as stale: they
+    are ignored on load and replaced when the class is re-introspected.
+    Modified snapshots are saved at exit, or explicitly with save().
+    """
+
+    # Snapshots opened by path, shared within this process.
+    _open_snapshots = {}
+
+    def __init__(self, path):
+        """Constructor. Load the snapshot at path if it exists."""
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.path = os.fspath(path)
+        self.entries = {}
+        self.modified = False
+        # Source file hashes computed in this process.
+        self._file_hashes = {}
+        try:
+            with open(self.path, 'rb') as snapshot_file:
+                data = pickle.load(snapshot_file)
+            if data.get('version') == SNAPSHOT_VERSION:
+                self.entries = data['classes']
+            else:
+                self.log.info(f"Ignoring snapshot {self.path} from a "
+                              "different version of inpromptu.")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # A corrupt or unloadable snapshot is simply rebuilt.
+            self.log.warning(f"Could not load snapshot {self.path}: {e}")
+
+    @classmethod
+    def open(cls, path):
+        """Return the snapshot for a path, loading it at most once."""
+        path = os.path.abspath(os.fspath(path))
+        if path not in cls._open_snapshots:
+            cls._open_snapshots[path] = cls(path)
+        return cls._open_snapshots[path]
+
+    def source_hash(self, cls):
+        """Hash the source of a class and its bases.
+
+        Return None if any user-defined class in the MRO has no source file.
+        """
+        digest = hashlib.sha256()
+        for klass in cls.__mro__:
+            if klass.__module__ == 'builtins':
+                continue
+            digest.update(klass.__qualname__.encode())
+            try:
+                source_file = inspect.getsourcefile(klass)
+            except TypeError: # Built-in or extension class.
+                source_file = None
+            if source_file is None:
+                if klass.__module__ == '__main__':
+                    return None
+                continue # Compiled class; its name is all we can hash.
+            file_hash = self._file_hash(source_file)
+            if file_hash is None:
+                return None
+            digest.update(file_hash)
+        return digest.hexdigest()
+
+    def files_hash(self, source_files):
+        """Hash the contents of files. Return None if one can't be read."""
+        digest = hashlib.sha256()
+        for source_file in source_files:
+            file_hash = self._file_hash(source_file)
+            if file_hash is None:
+                return None
+            digest.update(file_hash)
+        return digest.hexdigest()
+
+    def _file_hash(self, source_file):
+        """Return the (cached) digest of a file or None if it can't be read."""
+        if source_file not in self._file_hashes:
+            try:
+                with open(source_file, 'rb') as source:
+                    self._file_hashes[source_file] = \
+                        hashlib.sha256(source.read()).digest()
+            except OSError:
+                return None
+        return self._file_hashes[source_file]
+
+    @staticmethod
+    def annotation_files(stored):
+        """Return the source files of the modules defining the types that
+        the stored call plans' parameters are annotated with."""
+        source_files = set()
+        for kind, values in stored.items():
+            for value in values.values():
+                plan = value[0] if kind == 'methods' else value
+                for slot in plan.slots:
+                    for hint in [slot.annotation, *slot.types]:
+                        for cls in annotation_types(hint):
+                            module = sys.modules.get(cls.__module__)
+                            source_file = getattr(module, '__file__', None)
+                            if source_file is not None:
+                                source_files.add(source_file)
+        return sorted(source_files)
+
+    def load(self, cls):
+        """Return the ClassStructure for a class or None if absent or stale."""
+        entry = self.entries.get(class_key(cls))
+        if entry is None:
+            return None
+        if entry['source_hash'] != self.source_hash(cls) or \
+                entry['mro'] != [class_key(klass) for klass in cls.__mro__] or \
+                entry['dependencies_hash'] != \
+                self.files_hash(entry['dependencies']):
+            self.log.info(f"Snapshot of {class_key(cls)} is stale.")
+            return None
+        # Structures are unpickled on first use of one of the class's
+        # methods, so unused classes cost nothing beyond the file load.
+        stored = {}
+        def loader(kind):
+            def load_entry(name):
+                if not stored:
+                    try:
+                        stored.update(pickle.loads(entry['structure']))
+                    except Exception as e:
+                        # Fall back to introspecting the class.
+                        self.log.warning(f"Could not load {class_key(cls)} "
+                                         f"from snapshot {self.path}: {e}")
+                        stored.update({'methods': {}, 'property_getters': {}})
+                return stored[kind].get(name)
+            return LazyDefinitions(entry['names'][kind], load_entry)
+        return ClassStructure.from_state(
+            {'locations': entry['locations'],
+             'methods': loader('methods'),
+             'property_getters': loader('property_getters')})
+
+    def store(self, cls, structure):
+        """Add (or replace) a class's structure in the snapshot."""
+        source_hash = self.source_hash(cls)
+        if source_hash is None:
+            return
+        # Snapshot everything, not just what this session has used.
+        state = structure.get_state(cls)
+        stored = {kind: state[kind] for kind in ['methods', 'property_getters']}
+        try:
+            pickled_structure = pickle.dumps(stored)
+        except Exception:
+            # Skip entries that can't be written out. They will be
+            # introspected when used.
+            for kind in stored:
+                for name, value in list(stored[kind].items()):
+                    try:
+                        pickle.dumps(value)
+                    except Exception as e:
+                        self.log.debug(f"Cannot snapshot {class_key(cls)}.{name}: {e}")
+                        del stored[kind][name]
+            pickled_structure = pickle.dumps(stored)
+        # Options and hints derived from parameter types, e.g: an Enum's
+        # members, go stale when the modules defining those types change.
+        dependencies = self.annotation_files(stored)
+        dependencies_hash = self.files_hash(dependencies)
+        if dependencies_hash is None:
+            return
+        self.entries[class_key(cls)] = \
+            {'source_hash': source_hash,
+             'dependencies': dependencies,
+             'dependencies_hash': dependencies_hash,
+             'mro': [class_key(klass) for klass in cls.__mro__],
+             'locations': state['locations'],
+             'names': {kind: set(stored[kind]) for kind in stored},
+             'structure': pickled_structure}
+        if not self.modified:
+            # Write once rather than once per class added.
+            atexit.register(self.save)
+        self.modified = True
+
+    def save(self):
+        """Write the snapshot to disk atomically."""
+        if self.modified:
+            atexit.unregister(self.save)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile('wb', dir=directory, delete=False) \
+                as snapshot_file:
+            pickle.dump({'version': SNAPSHOT_VERSION, 'classes': self.entries},
+                        snapshot_file)
+        os.replace(snapshot_file.name, self.path)
+        self.modified = False
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Cached terminal geometry that follows window resizes."""
+
+import shutil
+import signal
+import threading
+
+
+class TerminalSize:
+    """Tracks the terminal size without spawning subprocesses.
+
+    The size is queried once up front and refreshed on SIGWINCH where the
+    platform supports it. When there is no terminal (piped or headless
+    sessions), the fallback size is used.
+    """
+
+    def __init__(self, fallback=(80, 24)):
+        """Constructor."""
+        self.fallback = fallback
+        self.columns, self.lines = self._query()
+        self._previous_handler = None
+        self.tracking = False
+
+    def _query(self):
+        # Checks $COLUMNS/$LINES, then ioctl(TIOCGWINSZ) on stdout.
+        size = shutil.get_terminal_size(self.fallback)
+        return size.columns, size.lines
+
+    def refresh(self):
+        """Re-query the terminal size."""
+        self.columns, self.lines = self._query()
+
+    def track_resizes(self):
+        """Refresh the size on SIGWINCH, chaining any previous handler.
+
+        Return True if resizes are being tracked.
+        """
+        if self.tracking:
+            return True
+        # Signal handlers can only be installed from the main thread.
+        if not hasattr(signal, 'SIGWINCH') or \
+                threading.current_thread() is not threading.main_thread():
+            return False
+        self._previous_handler = signal.signal(signal.SIGWINCH, self._on_resize)
+        self.tracking = True
+        return True
+
+    def _on_resize(self, signum, frame):
+        self.refresh()
+        if callable(self._previous_handler):
+            self._previous_handler(signum, frame)
+
+
+_terminal_size = None
+
+def get_terminal_size():
+    """Return the TerminalSize shared by all prompts in this process."""
+    global _terminal_size
+    if _terminal_size is None:
+        _terminal_size = TerminalSize()
+        _terminal_size.track_resizes()
+    return _terminal_size
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Resumable splitting of user input containing nested {}, [], (), '', ""."""
+
+TEXT_DELIMS = {'"', "'"}
+CONTAINER_START = {'{', '(', '['}
+CONTAINER_END_TO_START = {'}': '{', ')': '(', ']': '['}
+
+
+class Tokenizer:
+    """Splits text on a separator while handling nested "", '', {}, [], ().
+
+    The nesting/quote state and token boundaries are kept between calls so
+    that text which grows by appending (i.e: typing) is only scanned once.
+    """
+
+    def __init__(self, sep: str = " "):
+        """Constructor."""
+        self.sep = sep
+        self.reset()
+
+    def reset(self):
+        """Forget all consumed text."""
+        self.text = ""
+        self.container_queue = []
+        self.text_queue = []
+        self.split_indices = [0]
+        # Tokens between split indices. These cannot change as text is added.
+        self.tokens = []
+
+    @property
+    def finished(self):
+        """True if no quotes or containers are left open."""
+        return len(self.container_queue) == 0 and len(self.text_queue) == 0
+
+    def feed(self, suffix: str):
+        """Consume text appended to the text consumed so far."""
+        container_queue = self.container_queue
+        text_queue = self.text_queue
+        start = len(self.text)
+        self.text += suffix
+        for i, c in enumerate(suffix, start):
+            if c in TEXT_DELIMS:
+                if len(text_queue) == 0: # start of string.
+                    text_queue.append(c)
+                    continue
+                elif c == text_queue[-1]: # end of string.
+                    text_queue.pop(-1)
+                    continue
+            elif c in CONTAINER_START:
+                container_queue.append(c)
+                continue
+            elif c in CONTAINER_END_TO_START:
+                if len(container_queue) > 0 and \
+                        CONTAINER_END_TO_START[c] == container_queue[-1]:
+                    container_queue.pop(-1)
+                    if len(container_queue) == 0: # end of outermost container.
+                        continue
+            if c == self.sep and \
+               (len(text_queue) == 0) and (len(container_queue) == 0):
+                self._add_token(self.split_indices[-1], i)
+                self.split_indices.append(i)
+        return self
+
+    def advance(self, text: str):
+        """Consume text, reusing prior work if it extends the consumed text."""
+        if not text.startswith(self.text):
+            self.reset()
+        return self.feed(text[len(self.text):])
+
+    def _add_token(self, start, end):
+        chunk = self.text[start:end]
+        if len(chunk.lstrip()) > 0:
+            self.tokens.append(chunk.lstrip(self.sep))
+
+    def split(self):
+        """Return a tuple (list, bool) of the split items and a bool
+        indicating whether the final word was fully entered.
+        """
+        tokens = list(self.tokens)
+        last_chunk = self.text[self.split_indices[-1]:]
+        if len(last_chunk.lstrip()) > 0:
+            tokens.append(last_chunk.lstrip(self.sep))
+        return tokens, self.finished
+
+
+# helper function for splitting user input containing nested {}, [], (), '', "".
+def container_split(s: str, sep: str = " "):
+    """split that splits on spaces while handling nested "", '', {}, [].
+
+    returns a tuple (list, bool) of the split items and a bool indicating
+            whether the final word was fully entered.
+    """
+    return Tokenizer(sep).feed(s).split()
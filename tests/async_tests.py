@@ -0,0 +1,138 @@
+#!/usr/bin/env/python3
+import asyncio
+import os
+import signal
+import threading
+import time
+import pytest
+from inpromptu.inpromptu_batch import Inpromptu
+
+
+class TestClass:
+    __test__ = False
+
+    def __init__(self):
+        self.events = []
+        self.loops = set()
+        self.ticks = 0
+        self.threads = set()
+
+    async def double(self, amount: int):
+        self.loops.add(asyncio.get_running_loop())
+        await asyncio.sleep(0)
+        print("doubling")
+        return amount * 2
+
+    async def count(self, stop: int):
+        for i in range(stop):
+            self.events.append(f"produce {i}")
+            await asyncio.sleep(0)
+            yield i
+
+    async def start_ticker(self):
+        async def tick():
+            while True:
+                self.ticks += 1
+                await asyncio.sleep(0.001)
+        self.ticker = asyncio.create_task(tick())
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+    def nap(self, seconds: float):
+        self.threads.add(threading.current_thread())
+        time.sleep(seconds)
+
+    def ticks_forever(self):
+        while True:
+            time.sleep(0.01)
+            yield self.ticks
+
+    async def fail(self):
+        raise RuntimeError("Broken.")
+
+
+class RecordingInpromptu(Inpromptu):
+
+    def print_result(self, return_val):
+        self.omm.class_instance.events.append(f"print {return_val}")
+
+
+def test_coroutines_run_on_one_persistent_loop(capsys):
+    my_prompt = Inpromptu(TestClass())
+    assert my_prompt.onecmd("double 2") == 4
+    assert my_prompt.onecmd("double 3") == 6
+    assert capsys.readouterr().out == "doubling\ndoubling\n"
+    assert my_prompt.omm.class_instance.loops == {my_prompt.loop}
+    # Tasks started by one command keep running between commands.
+    my_prompt.onecmd("start_ticker")
+    ticks = my_prompt.omm.class_instance.ticks
+    my_prompt.onecmd("sleep 0.02")
+    assert my_prompt.omm.class_instance.ticks > ticks
+    with pytest.raises(RuntimeError):
+        my_prompt.onecmd("fail")
+
+
+def test_async_generators_are_streamed():
+    my_prompt = RecordingInpromptu(TestClass())
+    my_prompt.render(my_prompt.onecmd("count 3"))
+    assert my_prompt.omm.class_instance.events == \
+        ["produce 0", "print 0", "produce 1", "print 1", "produce 2", "print 2"]
+
+
+def test_coroutine_jobs_run_on_the_loop():
+    my_prompt = Inpromptu(TestClass())
+    jobs = [my_prompt.onecmd(f"double {i} &") for i in range(3)]
+    my_prompt.jobs.wait()
+    assert [job.future.result() for job in jobs] == [0, 2, 4]
+    assert [job.output for job in jobs] == ["doubling\n"] * 3
+    assert my_prompt.jobs._executor is None # No threads needed.
+    # Unlike threads, running coroutines can be cancelled.
+    job = my_prompt.onecmd("sleep 10 &")
+    while job.status != "running":
+        my_prompt.onecmd("sleep 0.001")
+    my_prompt.onecmd(f"cancel {job.id}")
+    my_prompt.jobs.wait([job.id], timeout=5)
+    assert job.status == "cancelled"
+
+
+def test_prompt_toolkit_prompts_on_the_same_loop(capsys):
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.input import create_pipe_input
+    from prompt_toolkit.output import DummyOutput
+    from inpromptu.inpromptu_prompt_toolkit import Inpromptu as PTInpromptu
+    with create_pipe_input() as pipe_input:
+        my_prompt = PTInpromptu(TestClass())
+        my_prompt.session = PromptSession(my_prompt.prompt, completer=my_prompt,
+                                          input=pipe_input, output=DummyOutput())
+        pipe_input.send_text("double 2\ncount 2\nnap 0\n")
+        pipe_input.close()
+        my_prompt.cmdloop()
+    assert capsys.readouterr().out.split() == ["doubling", "4", "0", "1"]
+    assert my_prompt.omm.class_instance.loops == {my_prompt.loop}
+    # Plain methods run on the main thread, e.g: for thread-affine drivers.
+    assert my_prompt.omm.class_instance.threads == {threading.main_thread()}
+
+
+def test_prompt_toolkit_ctrl_c_interrupts_the_command(capsys):
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.application import create_app_session
+    from prompt_toolkit.input import create_pipe_input
+    from prompt_toolkit.output import DummyOutput
+    from inpromptu.inpromptu_prompt_toolkit import Inpromptu as PTInpromptu
+    with create_pipe_input() as pipe_input, \
+            create_app_session(input=pipe_input, output=DummyOutput()):
+        my_prompt = PTInpromptu(TestClass())
+        my_prompt.session = PromptSession(my_prompt.prompt, completer=my_prompt,
+                                          input=pipe_input, output=DummyOutput())
+        pipe_input.send_text("nap 30\nsleep 30\nticks_forever\ndouble 2\n")
+        pipe_input.close()
+        for delay in (0.3, 0.6, 0.9):
+            threading.Timer(delay, os.kill, [os.getpid(), signal.SIGINT]).start()
+        start = time.perf_counter()
+        my_prompt.cmdloop()
+    assert time.perf_counter() - start < 5
+    out = capsys.readouterr().out
+    # Each command stopped, and the prompt went on to the next.
+    assert "Stopped after" in out
+    assert out.split()[-2:] == ["doubling", "4"]
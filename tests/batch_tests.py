@@ -0,0 +1,64 @@
+#!/usr/bin/env/python3
+import pytest
+from inpromptu.inpromptu_batch import Inpromptu
+from inpromptu.__main__ import main
+
+
+class TestClass:
+    __test__ = False
+
+    def __init__(self):
+        self.total = 0
+
+    def add(self, amount: int):
+        self.total += amount
+        return self.total
+
+    def fail(self):
+        raise RuntimeError("Broken.")
+
+
+def test_run_script_streams_lines(capsys):
+    my_prompt = Inpromptu(TestClass())
+    consumed = []
+    def lines():
+        for line in ["add 1", "", "# comment", "add 2"]:
+            consumed.append(line)
+            yield line
+    summary = my_prompt.run_script(lines())
+    assert capsys.readouterr().out.split() == ["1", "3"]
+    assert summary.executed == 2 and summary.failed == 0
+    assert len(consumed) == 4
+
+
+def test_run_script_stop_on_error(capsys):
+    my_prompt = Inpromptu(TestClass())
+    summary = my_prompt.run_script(["add 1", "fail", "add 2"])
+    assert summary.stopped and summary.failed == 1
+    assert summary.errors[0][0] == 2
+    assert my_prompt.omm.class_instance.total == 1
+    assert "RuntimeError: Broken." in capsys.readouterr().err
+
+
+def test_run_script_continue_on_error(capsys):
+    my_prompt = Inpromptu(TestClass())
+    summary = my_prompt.run_script(["add 1", "bogus", "add one", "add 2"],
+                                   stop_on_error=False)
+    assert not summary.stopped
+    assert (summary.executed, summary.succeeded, summary.failed) == (4, 2, 2)
+    assert my_prompt.omm.class_instance.total == 3
+
+
+def test_cmdloop_ends_on_exhausted_input(capsys):
+    my_prompt = Inpromptu(TestClass(), lines=["add 5"])
+    my_prompt.cmdloop()
+    assert capsys.readouterr().out.split() == ["5"]
+
+
+def test_main_entry_point(tmp_path, capsys):
+    script = tmp_path / "script.txt"
+    script.write_text("add 2\nadd 3\n")
+    assert main([f"{__name__}:TestClass", str(script)]) == 0
+    captured = capsys.readouterr()
+    assert captured.out.split() == ["2", "5"]
+    assert "2 commands executed" in captured.err
@@ -0,0 +1,134 @@
+#!/usr/bin/env/python3
+import asyncio
+import time
+import pytest
+from inpromptu import UserInputError
+from inpromptu.inpromptu_batch import Inpromptu
+from inpromptu.inpromptu_broadcast import BroadcastMixin, BroadcastResult
+
+
+class Filter:
+
+    def __init__(self):
+        self.cutoff = None
+
+    def set_cutoff(self, hertz: float):
+        self.cutoff = hertz
+
+
+class Channel:
+
+    def __init__(self, number):
+        self.number = number
+        self.gains = []
+        self.filter = Filter()
+
+    def set_gain(self, gain: float):
+        """Set the gain."""
+        self.gains.append(gain)
+        if self.number == 3:
+            raise RuntimeError("Channel 3 is broken.")
+        return self.number * gain
+
+    def set_gains(self, gains: list[float]):
+        gains.append(self.number)
+        self.gains = gains
+
+    def settle(self, seconds: float):
+        time.sleep(seconds)
+
+    async def measure(self, seconds: float = 0):
+        await asyncio.sleep(seconds)
+        return self.number
+
+
+class BroadcastInpromptu(BroadcastMixin, Inpromptu):
+    pass
+
+
+@pytest.fixture
+def channels():
+    return {f"ch{i}": Channel(i) for i in range(8)}
+
+
+def test_broadcast_to_all_instances(channels):
+    my_prompt = BroadcastInpromptu(channels)
+    result = my_prompt.onecmd("set_gain 2")
+    assert isinstance(result, BroadcastResult)
+    assert list(result.results) == list(channels)
+    assert result["ch2"] == 4
+    assert result.values == {f"ch{i}": i * 2.0 for i in range(8) if i != 3}
+    assert list(result.errors) == ["ch3"]
+    with pytest.raises(RuntimeError):
+        result["ch3"]
+    assert all(channel.gains == [2.0] for channel in channels.values())
+    table = str(result).splitlines()
+    assert table[0].split() == ["instance", "time", "result"]
+    assert table[4].startswith("ch3") and \
+        table[4].endswith("RuntimeError: Channel 3 is broken.")
+    assert table[-1] == "1 of 8 instances failed."
+
+
+def test_select_subsets(channels, capsys):
+    my_prompt = BroadcastInpromptu(channels)
+    assert my_prompt.select_instances("ch1-ch3,ch7") == ["ch1", "ch2", "ch3", "ch7"]
+    assert my_prompt.select_instances("ch[02]") == ["ch0", "ch2"]
+    assert my_prompt.select_instances("all") == list(channels)
+    with pytest.raises(UserInputError):
+        my_prompt.select_instances("ch9")
+    assert list(my_prompt.onecmd("@ch4-ch5 set_gain 1").results) == ["ch4", "ch5"]
+    my_prompt.onecmd("select ch6,ch7")
+    assert capsys.readouterr().out == "2 of 8 instances selected: ch6, ch7\n"
+    assert list(my_prompt.onecmd("set_gain 1").results) == ["ch6", "ch7"]
+    assert [len(channel.gains) for channel in channels.values()] == \
+        [0, 0, 0, 0, 1, 1, 1, 1]
+    assert my_prompt.stats.commands["set_gain"][0] == 2
+    with pytest.raises(UserInputError):
+        my_prompt.onecmd("@ch1")
+
+
+def test_instances_get_their_own_inputs(channels):
+    my_prompt = BroadcastInpromptu(channels)
+    my_prompt.onecmd("set_gains [1.0, 2.0]")
+    assert channels["ch0"].gains == [1.0, 2.0, 0]
+    assert channels["ch5"].gains == [1.0, 2.0, 5]
+
+
+def test_fan_out_runs_in_parallel(channels):
+    my_prompt = BroadcastInpromptu(channels)
+    my_prompt.onecmd("settle 0") # Start the worker threads.
+    start = time.perf_counter()
+    my_prompt.onecmd("settle 0.1")
+    assert time.perf_counter() - start < 0.4 # Not 8 * 0.1 seconds.
+    start = time.perf_counter()
+    result = my_prompt.onecmd("measure 0.1")
+    assert time.perf_counter() - start < 0.4
+    assert result.values == {f"ch{i}": i for i in range(8)}
+
+
+def test_broadcast_to_sub_objects(channels):
+    my_prompt = BroadcastInpromptu(channels)
+    result = my_prompt.onecmd("@ch1-ch2 filter.set_cutoff 50")
+    assert list(result.results) == ["ch1", "ch2"]
+    assert [channel.filter.cutoff for channel in channels.values()] == \
+        [None, 50.0, 50.0, None, None, None, None, None]
+
+
+def test_completion_after_selector(channels):
+    my_prompt = BroadcastInpromptu(channels)
+    assert my_prompt._get_completion_matches("@ch1 set_g", "set_g") == \
+        ["set_gain", "set_gains"]
+    assert my_prompt._get_completion_matches("@ch1 set_gain ", "") == ["gain="]
+
+
+def test_instances_must_share_a_class():
+    with pytest.raises(TypeError):
+        BroadcastInpromptu([Channel(0), object()])
+    names = BroadcastInpromptu([Channel(0), Channel(1)]).instances
+    assert list(names) == ["0", "1"]
+
+
+def test_unbound_callables_run_once(channels, capsys):
+    my_prompt = BroadcastInpromptu(channels)
+    assert my_prompt.onecmd("help set_gain") is None
+    assert capsys.readouterr().out.count("Set the gain.") == 1
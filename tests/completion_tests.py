@@ -0,0 +1,161 @@
+#!/usr/bin/env/python3
+import pytest
+from enum import Enum, auto
+from inpromptu import Inpromptu
+from inpromptu.completions import PrefixIndex
+
+
+class Gear(Enum):
+    crash_pads = auto()
+    dance_shoes = auto()
+    mysterious_fossil = auto()
+
+
+class TestClass:
+    __test__ = False
+
+    def add_gear(self, gear: Gear):
+        return gear
+
+    def add_item(self, item: str):
+        return item
+
+    def add_fuel(self, gallons: float, top_off: bool = False):
+        return gallons
+
+
+def test_prefix_index_match():
+    index = PrefixIndex(['kelp', 'biscuits', 'fridge', 'flux', 'kelp'])
+    assert index.match('f') == ['flux', 'fridge']
+    assert index.match('') == ['biscuits', 'flux', 'fridge', 'kelp']
+    assert index.match('z') == []
+    assert 'kelp' in index and 'kel' not in index
+
+
+def test_match_callables():
+    my_prompt = Inpromptu(TestClass())
+    assert my_prompt.omm.match_callables('add_') == \
+        ['add_fuel', 'add_gear', 'add_item']
+    assert my_prompt.omm.match_callables('h') == ['help']
+
+
+def test_param_options_follow_set_completion_options():
+    my_prompt = Inpromptu(TestClass())
+    assert my_prompt._get_param_options('add_gear', 'gear', 'Gear.d') == \
+        ['Gear.dance_shoes']
+    assert my_prompt._get_param_options('add_fuel', 'top_off', 'T') == ['True']
+    my_prompt.set_completion_options('add_item', 'item', ['kelp', 'fridge', 'flux'])
+    assert my_prompt._get_param_options('add_item', 'item', 'f') == ['flux', 'fridge']
+    my_prompt.set_completion_options('add_item', 'item', ['fossil'])
+    assert my_prompt._get_param_options('add_item', 'item', 'f') == ['fossil']
+
+
+def test_readline_completions_computed_once_per_buffer(monkeypatch):
+    """Ensure readline's repeated state queries are served from a cache."""
+    import readline
+    my_prompt = Inpromptu(TestClass())
+    calls = []
+    get_matches = my_prompt._get_completion_matches
+    def counting_get_matches(line, text):
+        calls.append((line, text))
+        return get_matches(line, text)
+    monkeypatch.setattr(my_prompt, '_get_completion_matches', counting_get_matches)
+    monkeypatch.setattr(readline, 'get_line_buffer', lambda: "add_")
+
+    results = []
+    state = 0
+    while (match := my_prompt._complete("add_", state)) is not None:
+        results.append(match)
+        state += 1
+    assert results == ['add_fuel', 'add_gear', 'add_item']
+    assert len(calls) == 1
+
+    # A changed buffer invalidates the cache.
+    monkeypatch.setattr(readline, 'get_line_buffer', lambda: "add_fuel ")
+    assert my_prompt._complete("", 0) == "gallons="
+    assert len(calls) == 2
+
+
+def test_prompt_toolkit_completions_are_async_and_drop_stale_requests():
+    """Ensure slow completions run off the event loop and stale ones vanish."""
+    import asyncio
+    import threading
+    from prompt_toolkit.completion import CompleteEvent
+    from prompt_toolkit.document import Document
+    from inpromptu.inpromptu_prompt_toolkit import Inpromptu as PTInpromptu
+    my_prompt = PTInpromptu(TestClass())
+    release = threading.Event()
+    get_options = my_prompt._get_param_options
+    def slow_get_options(func_name, param_name, text):
+        release.wait(timeout=5)
+        return get_options(func_name, param_name, text)
+    my_prompt._get_param_options = slow_get_options
+
+    async def collect(text):
+        return [c.text async for c in my_prompt.get_completions_async(
+                    Document(text), CompleteEvent())]
+
+    async def main():
+        stale = asyncio.ensure_future(collect("add_gear gear=Gear.c"))
+        await asyncio.sleep(0.05)
+        # The event loop is still free while the worker is blocked.
+        assert not stale.done()
+        fresh = asyncio.ensure_future(collect("add_gear gear=Gear.d"))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await stale, await fresh
+
+    stale, fresh = asyncio.run(main())
+    assert stale == []
+    assert fresh == ['gear=Gear.dance_shoes']
+
+
+def test_completion_option_providers_are_cached():
+    my_prompt = Inpromptu(TestClass())
+    queries = []
+    def recipes(prefix):
+        queries.append(prefix)
+        return ['kelp', 'fridge', 'flux']
+    my_prompt.set_completion_options('add_item', 'item', recipes)
+    assert my_prompt._get_param_options('add_item', 'item', 'f') == ['flux', 'fridge']
+    assert my_prompt._get_param_options('add_item', 'item', 'f') == ['flux', 'fridge']
+    assert queries == ['f']
+    assert my_prompt._get_param_options('add_item', 'item', 'k') == ['kelp']
+    assert queries == ['f', 'k']
+    # Invalidation requeries the provider.
+    my_prompt.invalidate_completion_options('add_item')
+    assert my_prompt._get_param_options('add_item', 'item', 'f') == ['flux', 'fridge']
+    assert queries == ['f', 'k', 'f']
+    # Static options replace the provider.
+    my_prompt.set_completion_options('add_item', 'item', ['fossil'])
+    assert my_prompt._get_param_options('add_item', 'item', 'f') == ['fossil']
+    assert queries == ['f', 'k', 'f']
+
+
+def test_completion_option_provider_ttl_and_lru(monkeypatch):
+    from inpromptu import completions
+    now = [100.0]
+    monkeypatch.setattr(completions.time, 'monotonic', lambda: now[0])
+    my_prompt = Inpromptu(TestClass())
+    ports = ['/dev/ttyUSB0']
+    calls = []
+    def list_ports():
+        calls.append(1)
+        return list(ports)
+    my_prompt.set_completion_options('add_item', 'item', list_ports, ttl=2)
+    assert my_prompt._get_param_options('add_item', 'item', '/dev') == ['/dev/ttyUSB0']
+    ports.append('/dev/ttyUSB1')
+    now[0] += 1
+    assert my_prompt._get_param_options('add_item', 'item', '/dev') == ['/dev/ttyUSB0']
+    now[0] += 2
+    assert my_prompt._get_param_options('add_item', 'item', '/dev') == \
+        ['/dev/ttyUSB0', '/dev/ttyUSB1']
+    assert len(calls) == 2
+
+    cache = my_prompt.omm.option_cache
+    cache.maxsize = 2
+    for prefix in ['/', '/d', '/de']:
+        my_prompt._get_param_options('add_item', 'item', prefix)
+    assert len(cache) == 2
+    assert cache.get(('add_item', 'item', '/')) is None
+    assert cache.get(('add_item', 'item', '/de')) == ['/dev/ttyUSB0', '/dev/ttyUSB1']
@@ -1,6 +1,7 @@
 #!/usr/bin/env/python3
 import pytest
 from inpromptu.inpromptu_base import container_split
+from inpromptu.tokenizer import Tokenizer
 
 
 def test_basic_split():
@@ -44,3 +45,33 @@ def test_open_container2():
     result = container_split(basic_input, '=')
     assert result[1] == True # Technically, this behavior is equivalent to split
     assert result[0] == ["arg0", ""]
+
+def test_incremental_tokenizer_matches_fresh_split_while_typing():
+    line = "fn arg0 arg1=[1, (2, 3), {'a': \"b c\"}] arg2='x y'"
+    container = "arg1=[1, (2, 3), {'a': \"b c\"}]"
+    expected = {
+        3: (["fn"], True),
+        16: (["fn", "arg0", "arg1=[1,"], False),
+        33: (["fn", "arg0", "arg1=[1, (2, 3), {'a': \"b"], False),
+        41: (["fn", "arg0", container, "ar"], True),
+        len(line): (["fn", "arg0", container, "arg2='x y'"], True),
+    }
+    tokenizer = Tokenizer()
+    for end in range(len(line) + 1):
+        tokenizer.advance(line[:end])
+        fresh = Tokenizer()
+        fresh.advance(line[:end])
+        assert tokenizer.split() == fresh.split()
+        if end in expected:
+            assert tokenizer.split() == expected[end]
+
+def test_tokenizer_only_scans_appended_text():
+    tokenizer = Tokenizer()
+    tokenizer.advance("fn [1, 2")
+    split_indices = list(tokenizer.split_indices)
+    tokenizer.advance("fn [1, 2, 3] ")
+    assert tokenizer.split_indices[:len(split_indices)] == split_indices
+    assert tokenizer.split() == (["fn", "[1, 2, 3]"], True)
+    # Edits other than appending start over.
+    tokenizer.advance("fn 'a")
+    assert tokenizer.split() == (["fn", "'a"], False)
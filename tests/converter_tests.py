@@ -0,0 +1,173 @@
+#!/usr/bin/env/python3
+import math
+import pytest
+from enum import Enum, auto
+from typing import Any, Literal, Optional, Union
+from inpromptu import Inpromptu
+from inpromptu.converters import NO_MATCH, evaluate_container, get_converter
+
+
+class Gear(Enum):
+    crash_pads = auto()
+    dance_shoes = auto()
+
+
+class Color(Enum):
+    red = "red"
+    blue = "blue"
+
+
+class Shade(Enum):
+    light = "light"
+    dark = "dark"
+
+    @classmethod
+    def _missing_(cls, value):
+        if isinstance(value, str):
+            return cls.__members__.get(value.lower())
+        return None
+
+
+class Corner(Enum):
+    origin = (0, 0)
+    far = (1, 1)
+
+
+class TestClass:
+    __test__ = False
+
+    def add_gear(self, gear: Gear, count: Optional[int] = None):
+        return gear, count
+
+
+def test_fast_paths():
+    assert get_converter([int])("-42") == -42
+    assert get_converter([float])("1.5e3") == 1500.0
+    assert get_converter([bool])("False") is False
+    assert get_converter([str])("/dev/ttyUSB0") == "/dev/ttyUSB0"
+    assert get_converter([str])("'two words'") == "two words"
+
+
+def test_literal_fallbacks_match_constructors():
+    assert get_converter([int])("0x10") == 16
+    assert get_converter([float])("3") == 3.0
+    assert get_converter([float])("inf") == math.inf
+    assert get_converter([float])("-inf") == -math.inf
+    assert math.isnan(get_converter([float])("nan"))
+    assert get_converter([float, str])("infinity") == math.inf
+    with pytest.raises(ValueError):
+        get_converter([float])("kelp")
+    assert get_converter([list])("[1, 2]") == [1, 2]
+    assert get_converter([Any])("{'a': 1}") == {'a': 1}
+    assert get_converter([Any])("kelp") == "kelp"
+
+
+def test_enum_lookup_by_name_and_value():
+    assert get_converter([Gear])("Gear.dance_shoes") is Gear.dance_shoes
+    assert get_converter([Gear])("1") is Gear.crash_pads
+    assert get_converter([Color])("red") is Color.red
+    with pytest.raises(ValueError):
+        get_converter([Gear])("Gear.fossil")
+
+
+def test_enum_text_fast_path():
+    assert get_converter([Color])("Color.blue") is Color.blue
+    assert get_converter([Color])("'blue'") is Color.blue
+    assert get_converter([Gear])("2") is Gear.dance_shoes
+    # Text that can't be a member isn't evaluated, so the next type gets it.
+    assert get_converter([Color, str])("green") == "green"
+    assert get_converter([Gear, str])("dance_shoes") == "dance_shoes"
+    with pytest.raises(ValueError):
+        get_converter([Color])("green")
+    # A _missing_ override, or values that aren't str or numbers, always
+    # need the text evaluated.
+    assert get_converter([Shade])("DARK") is Shade.dark
+    assert get_converter([Shade])("Shade.light") is Shade.light
+    assert get_converter([Corner])("(1, 1)") is Corner.far
+    assert get_converter([Corner])("Corner.origin") is Corner.origin
+    with pytest.raises(ValueError):
+        get_converter([Corner])("(2, 2)")
+
+
+def test_union_types_are_tried_in_order():
+    assert get_converter([int, str])("3") == 3
+    assert get_converter([int, str])("kelp") == "kelp"
+    assert get_converter([int, str])("[1, 2]") == "[1, 2]"
+    assert get_converter([str, int])("3") == "3"
+    assert get_converter([int, type(None)])("None") is None
+    with pytest.raises(ValueError):
+        get_converter([int, float])("kelp")
+
+
+def test_converters_are_shared_and_stored_in_method_defs():
+    assert get_converter([int, str]) is get_converter((int, str))
+    my_prompt = Inpromptu(TestClass())
+    params = my_prompt.omm.method_defs['add_gear']['parameters']
+    assert params['count']['converter'] is get_converter(Optional[int].__args__)
+    assert my_prompt.parse_line("add_gear Gear.crash_pads count=None")[2:] == \
+        ([my_prompt.omm.class_instance, Gear.crash_pads], {'count': None})
+
+
+class Waypoints:
+    __test__ = False
+
+    def follow(self, path: list[tuple[float, float]],
+               speeds: Optional[dict[str, float]] = None,
+               gear: Literal['low', 'high'] = 'low'):
+        return path, speeds, gear
+
+
+def test_nested_generics_convert_items():
+    assert get_converter([list[int]])("[1, 2, 3]") == [1, 2, 3]
+    assert get_converter([dict[str, float]])("{'x': 1}") == {'x': 1.0}
+    assert get_converter([tuple[int, str]])("(1, kelp)") == (1, 'kelp')
+    assert get_converter([set[int]])("[1, 1, 2]") == {1, 2}
+    assert get_converter([list[Gear]])("[Gear.crash_pads, dance_shoes]") == \
+        [Gear.crash_pads, Gear.dance_shoes]
+    assert get_converter([list[Union[int, str]]])("[1, 'x']") == [1, 'x']
+    for bad in ["[1, 'x']", "[1.5]", "kelp", "(1, 2"]:
+        with pytest.raises(ValueError):
+            get_converter([list[int]])(bad)
+    assert get_converter([list[int], str])("[1.5]") == "[1.5]"
+
+
+def test_containers_read_bare_names_as_strings():
+    assert evaluate_container("[Color.red, blue, 1]") == ['Color.red', 'blue', 1]
+    assert evaluate_container("{'a': (1, 2)}") == {'a': (1, 2)}
+    for bad in ["(1, 2", "[len(x)]", "[a + b]"]:
+        assert evaluate_container(bad) is NO_MATCH
+    assert get_converter([list[Color]])("[Color.red, blue]") == \
+        [Color.red, Color.blue]
+    assert get_converter([list[str]])("[kelp, 'two words']") == \
+        ['kelp', 'two words']
+    # Unbracketed tuples are containers too.
+    assert get_converter([tuple[int, int]])("1,2") == (1, 2)
+    assert get_converter([list[Color]])("red,Color.blue") == \
+        [Color.red, Color.blue]
+    # Text that can't be a container isn't evaluated.
+    assert get_converter([list[int], str])("kelp") == "kelp"
+    # The text is evaluated once for all the types tried.
+    assert get_converter([list[int], list[str]])("[a, b]") == ['a', 'b']
+
+
+def test_literal_hints():
+    assert get_converter([Literal['low', 'high']])("high") == 'high'
+    assert get_converter([Literal['low', 'high']])("'low'") == 'low'
+    assert get_converter([Literal[1, 2]])("2") == 2
+    # Literal values are matched by type too.
+    assert get_converter([Literal[1, 2], str])("True") == "True"
+    for bad in ["medium", "3", "(1, 2"]:
+        with pytest.raises(ValueError):
+            get_converter([Literal['low', 'high', 1, 2]])(bad)
+
+
+def test_generic_hints_in_method_defs():
+    my_prompt = Inpromptu(Waypoints())
+    params = my_prompt.omm.method_defs['follow']['parameters']
+    assert params['path']['hint'] == "list[tuple[float, float]]"
+    assert params['speeds']['hint'] == "dict[str, float]|None"
+    assert params['speeds']['options'] == ['None']
+    assert params['gear']['options'] == ['low', 'high']
+    assert my_prompt.parse_line("follow [(0, 1), (2.5, 3)] gear=high")[2:] == \
+        ([my_prompt.omm.class_instance, [(0.0, 1.0), (2.5, 3.0)]],
+         {'gear': 'high'})
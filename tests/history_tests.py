@@ -0,0 +1,90 @@
+#!/usr/bin/env/python3
+import pytest
+from inpromptu import UserInputError
+from inpromptu.inpromptu_batch import Inpromptu
+from inpromptu.history import NOT_A_REFERENCE, ResultHistory, approximate_size
+
+
+class TestClass:
+    __test__ = False
+
+    def make(self, size: int):
+        return list(range(size))
+
+    def length(self, items: list):
+        return len(items)
+
+    def same(self, first: list, second: list = None):
+        return first is second
+
+    def echo(self, text: str):
+        return text
+
+    def nothing(self):
+        return None
+
+
+def test_results_are_passed_by_reference(capsys):
+    my_prompt = Inpromptu(TestClass())
+    my_prompt.run_line("make 3")
+    my_prompt.run_line("make 5")
+    assert my_prompt.onecmd("length _") == 5
+    assert my_prompt.onecmd("length _1") == 3
+    assert my_prompt.onecmd("length items=_2") == 5
+    # The object itself, not a copy.
+    assert my_prompt.onecmd("same _1 _1") is True
+    assert my_prompt.results.get(1) is my_prompt.results.get(1)
+    # None isn't kept.
+    my_prompt.run_line("nothing")
+    assert my_prompt.results.last == 2
+    # Quoted or unknown references are just text.
+    assert my_prompt.onecmd("echo '_1'") == "_1"
+    assert my_prompt.onecmd("echo _9") == "_9"
+    assert my_prompt.onecmd("echo _x") == "_x"
+    capsys.readouterr()
+    my_prompt.run_line("history")
+    assert capsys.readouterr().out == "_1: [0, 1, 2]\n_2: [0, 1, 2, 3, 4]\n"
+
+
+def test_background_jobs_keep_their_value_not_the_job(capsys):
+    my_prompt = Inpromptu(TestClass())
+    summary = my_prompt.run_script(["make 3 &", "wait 1"])
+    assert summary.failed == 0
+    assert my_prompt.results.last == 1
+    assert my_prompt.results.get(1) == [0, 1, 2]
+    assert my_prompt.onecmd("length _") == 3
+
+
+def test_typed_eval_and_parse_args_resolve_references():
+    my_prompt = Inpromptu(TestClass())
+    my_prompt.results.add({"a": 1})
+    value = my_prompt.results.get(1)
+    assert Inpromptu.typed_eval("_", [dict], my_prompt.results) is value
+    assert Inpromptu.typed_eval("_1", [dict], my_prompt.results) is value
+    assert Inpromptu.typed_eval("_", [str]) == "_"
+    args, kwargs, _ = my_prompt.parse_args(TestClass.same, ["_", "second=_1"])
+    assert args[0] is value and kwargs["second"] is value
+
+
+def test_eviction():
+    history = ResultHistory(max_results=2)
+    for value in ["a", "b", "c"]:
+        history.add(value)
+    assert history.items() == [(2, "b"), (3, "c")]
+    # Referencing a result makes it the most recently used.
+    assert history.resolve("_2") == "b"
+    history.add("d")
+    assert history.items() == [(2, "b"), (4, "d")]
+    with pytest.raises(UserInputError):
+        history.resolve("_3")
+    assert history.resolve("_5") is NOT_A_REFERENCE
+    # By size, but the latest result is always kept.
+    history = ResultHistory(max_bytes=approximate_size(list(range(100))) + 100)
+    history.add(list(range(100)))
+    history.add("x")
+    assert len(history) == 2
+    history.add(list(range(1000)))
+    assert [number for number, _ in history.items()] == [3]
+    history.clear()
+    assert history.resolve("_") is NOT_A_REFERENCE
+    assert ResultHistory(max_results=0).add("a") is None
@@ -0,0 +1,104 @@
+#!/usr/bin/env/python3
+import pytest
+from inpromptu.inpromptu_batch import Inpromptu
+from inpromptu.instrumentation import Instrumentation, PHASES
+from inpromptu.errors import UserInputError
+
+
+class TestClass:
+    __test__ = False
+
+    def add(self, a: int, b: int = 1):
+        return a + b
+
+    def fail(self):
+        raise RuntimeError("Broken.")
+
+
+class Recorder(Instrumentation):
+
+    def __init__(self):
+        self.events = []
+
+    def command_started(self, line):
+        self.events.append(("start", line))
+
+    def phase_finished(self, phase, seconds):
+        assert seconds >= 0
+        self.events.append(("phase", phase))
+
+    def command_finished(self, line, fn_name, seconds, error=None):
+        self.events.append(("finish", fn_name, type(error)))
+
+
+def test_hooks_see_each_phase():
+    my_prompt = Inpromptu(TestClass(), lines=["add 1 b=2", "fail", "nope"])
+    recorder = Recorder()
+    my_prompt.add_instrumentation(recorder)
+    my_prompt.cmdloop()
+    assert recorder.events == \
+        [("start", "add 1 b=2"), *[("phase", phase) for phase in PHASES],
+         ("finish", "add", type(None)),
+         ("start", "fail"), ("phase", "tokenize"), ("phase", "parse_args"),
+         ("phase", "typed_eval"), ("phase", "invocation"),
+         ("finish", "fail", RuntimeError),
+         ("start", "nope"), ("finish", "nope", UserInputError)]
+    my_prompt.remove_instrumentation(recorder)
+    my_prompt.onecmd("add 1")
+    assert len(recorder.events) == 15
+
+
+def test_time_and_profile_built_ins(capsys):
+    my_prompt = Inpromptu(TestClass())
+    my_prompt.onecmd("time add 1 b=2")
+    out = capsys.readouterr().out.splitlines()
+    assert out[0] == "3"
+    assert [line.split()[0] for line in out[1:]] == [*PHASES, "total"]
+    my_prompt.onecmd("profile add 2")
+    out = capsys.readouterr().out
+    assert out.startswith("3\n") and "function calls" in out
+    with pytest.raises(UserInputError):
+        my_prompt.onecmd("time")
+    assert my_prompt.instrumentation == [my_prompt.stats]
+
+
+def test_built_ins_complete_and_yield_to_methods():
+    my_prompt = Inpromptu(TestClass())
+    assert my_prompt.match_commands("") == ['add', 'cancel', 'fail', 'help',
+                                            'history', 'jobs', 'profile',
+                                            'result', 'stats', 'time', 'wait']
+    assert my_prompt.strip_line_commands("time profile add 1") == "add 1"
+    class Clock:
+        def time(self) -> float:
+            return 12.0
+    clock_prompt = Inpromptu(Clock())
+    assert 'time' not in clock_prompt.line_commands
+    assert clock_prompt.onecmd("time") == 12.0
+
+
+def test_failing_hooks_are_logged_not_raised(caplog):
+    class Broken(Instrumentation):
+        def command_finished(self, line, fn_name, seconds, error=None):
+            raise OSError("Disk full.")
+    my_prompt = Inpromptu(TestClass(), lines=["add 1", "add 2"])
+    recorder = Recorder()
+    my_prompt.add_instrumentation(Broken())
+    my_prompt.add_instrumentation(recorder)
+    my_prompt.cmdloop()
+    assert [event for event in recorder.events if event[0] == "finish"] == \
+        [("finish", "add", type(None))] * 2
+    assert len([r for r in caplog.records if r.exc_info]) == 2
+
+
+def test_unexpected_parse_errors_are_reported(monkeypatch, capsys):
+    my_prompt = Inpromptu(TestClass(), lines=["add 1", "add 2"])
+    parse_line = my_prompt.parse_line
+    def flaky_parse_line(line):
+        if line == "add 1":
+            raise RuntimeError("Parser bug.")
+        return parse_line(line)
+    monkeypatch.setattr(my_prompt, "parse_line", flaky_parse_line)
+    my_prompt.cmdloop()
+    out = capsys.readouterr().out
+    assert "RuntimeError: Parser bug." in out
+    assert out.rstrip().endswith("3")
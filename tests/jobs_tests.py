@@ -0,0 +1,155 @@
+#!/usr/bin/env/python3
+import sys
+import threading
+import time
+import pytest
+from inpromptu import UserInputError
+from inpromptu.inpromptu_batch import Inpromptu
+from inpromptu.jobs import JobManager
+
+
+class TestClass:
+    __test__ = False
+
+    def __init__(self):
+        self.total = 0
+        self.gate = threading.Event()
+
+    def add(self, amount: int):
+        self.total += amount
+        return self.total
+
+    def blocked_add(self, amount: int):
+        """Add once the gate opens."""
+        print(f"adding {amount}")
+        assert self.gate.wait(5)
+        return self.add(amount)
+
+    def fail(self):
+        raise RuntimeError("Broken.")
+
+
+class RecordingInpromptu(Inpromptu):
+    """Collects notifications instead of printing them."""
+
+    def __init__(self, *args, **kwargs):
+        self.notices = []
+        self.notified = threading.Condition()
+        super().__init__(*args, **kwargs)
+
+    def notify(self, message):
+        with self.notified:
+            self.notices.append(message)
+            self.notified.notify_all()
+
+    def wait_for_notices(self, count):
+        with self.notified:
+            assert self.notified.wait_for(lambda: len(self.notices) >= count, 5)
+        return self.notices
+
+
+def test_background_job_result(capsys):
+    my_prompt = RecordingInpromptu(TestClass())
+    job = my_prompt.onecmd("blocked_add 2 &")
+    assert job.id == 1 and job.line == "blocked_add 2"
+    assert job.status in ("pending", "running")
+    with pytest.raises(UserInputError):
+        my_prompt.onecmd("result 1")
+    my_prompt.omm.class_instance.gate.set()
+    assert my_prompt.onecmd("wait 1") == 2
+    # The job's output is captured rather than printed while it runs.
+    assert capsys.readouterr().out == "adding 2\n"
+    assert job.output == "adding 2\n"
+    assert my_prompt.onecmd("result 1") == 2
+    assert my_prompt.wait_for_notices(1) == ["[1] done      blocked_add 2"]
+
+
+def test_background_job_failure():
+    my_prompt = RecordingInpromptu(TestClass())
+    my_prompt.onecmd("fail&")
+    my_prompt.onecmd("wait")
+    assert my_prompt.wait_for_notices(1) == \
+        ["[1] failed    fail: RuntimeError: Broken."]
+    with pytest.raises(RuntimeError):
+        my_prompt.onecmd("result 1")
+    assert my_prompt.stats.commands["fail"][1] == 1
+
+
+def test_invalid_background_job_fails_immediately():
+    my_prompt = RecordingInpromptu(TestClass())
+    with pytest.raises(ValueError):
+        my_prompt.onecmd("add one &")
+    with pytest.raises(UserInputError):
+        my_prompt.onecmd("bogus &")
+    with pytest.raises(UserInputError):
+        my_prompt.onecmd("&")
+    assert not my_prompt.jobs.jobs
+
+
+def test_cancel_pending_job(capsys):
+    my_prompt = RecordingInpromptu(TestClass())
+    my_prompt.jobs.max_workers = 1
+    my_prompt.onecmd("blocked_add 1 &")
+    my_prompt.onecmd("add 10 &")
+    my_prompt.onecmd("cancel 2")
+    with pytest.raises(UserInputError):
+        my_prompt.onecmd("cancel 1") # Already running.
+    with pytest.raises(UserInputError):
+        my_prompt.onecmd("cancel 3")
+    my_prompt.omm.class_instance.gate.set()
+    my_prompt.onecmd("wait")
+    assert my_prompt.omm.class_instance.total == 1
+    with pytest.raises(UserInputError):
+        my_prompt.onecmd("result 2")
+    capsys.readouterr()
+    my_prompt.onecmd("jobs")
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("[1] done") and lines[0].endswith("blocked_add 1")
+    assert lines[1].startswith("[2] cancelled") and lines[1].endswith("add 10")
+
+
+def test_run_line_prints_job(capsys):
+    my_prompt = RecordingInpromptu(TestClass())
+    assert my_prompt.run_line("add 3 &") is None
+    assert capsys.readouterr().out.startswith("[1] ")
+    assert isinstance(my_prompt.run_line("add x &"), ValueError)
+    my_prompt.jobs.wait()
+    assert my_prompt.omm.class_instance.total == 3
+
+
+def test_job_limits():
+    gate = threading.Event()
+    jobs = JobManager(max_workers=1, max_queued=1, max_finished=2, notify=None)
+    jobs.submit("wait", gate.wait, 5)
+    jobs.submit("wait", gate.wait, 5)
+    with pytest.raises(UserInputError):
+        jobs.submit("wait", gate.wait, 5)
+    assert hasattr(sys.stdout, "capture")
+    gate.set()
+    jobs.wait()
+    # Output stops being captured once the last job finishes.
+    deadline = time.monotonic() + 5
+    while hasattr(sys.stdout, "capture") and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert not hasattr(sys.stdout, "capture")
+    for _ in range(3):
+        jobs.submit("noop", lambda: None)
+        jobs.wait()
+    jobs.submit("noop", lambda: None)
+    # Only the newest finished jobs are kept.
+    assert list(jobs.jobs) == [4, 5, 6]
+    jobs.shutdown()
+    assert not hasattr(sys.stdout, "capture")
+
+
+def test_readline_notify_redraws_prompt(capsys, monkeypatch):
+    from inpromptu import inpromptu_readline
+    my_prompt = inpromptu_readline.Inpromptu(TestClass())
+    my_prompt.notify("[1] done      add 1")
+    assert capsys.readouterr().out == "[1] done      add 1\n"
+    monkeypatch.setattr(inpromptu_readline.readline, "get_line_buffer",
+                        lambda: "add 2")
+    my_prompt.prompt = ">>> "
+    my_prompt._reading_input = True
+    my_prompt.notify("[1] done      add 1")
+    assert capsys.readouterr().out == "\r\x1b[K[1] done      add 1\n>>> add 2"
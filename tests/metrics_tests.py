@@ -0,0 +1,100 @@
+#!/usr/bin/env/python3
+import json
+import threading
+import time
+import pytest
+from inpromptu import metrics
+from inpromptu.inpromptu_batch import Inpromptu
+from inpromptu.metrics import CommandStats, LatencyHistogram
+
+
+class TestClass:
+    __test__ = False
+
+    def add(self, a: int, b: int = 1):
+        return a + b
+
+    def fail(self):
+        raise RuntimeError("Broken.")
+
+
+def test_histogram_quantiles_have_bounded_error():
+    histogram = LatencyHistogram()
+    size = len(histogram.counts)
+    for micros in range(1, 100001):
+        histogram.record(micros / 1e6)
+    assert len(histogram.counts) == size
+    for q in [0.5, 0.9, 0.99]:
+        assert histogram.quantile(q) == pytest.approx(q * 0.1, rel=1/16)
+    assert histogram.quantile(1) == pytest.approx(0.1, rel=1/16)
+    assert histogram.count == 100000 and histogram.max == 0.1
+    histogram.record(1e9) # Clamped rather than growing.
+    assert len(histogram.counts) == size
+
+
+def test_command_stats_are_bounded():
+    stats = CommandStats(max_commands=2)
+    for name in ["a", "b", "c", "d"]:
+        stats.command_finished(name, name, 0.001)
+    stats.command_finished("a", "a", 0.003, RuntimeError())
+    assert set(stats.commands) == {"a", "b", CommandStats.OTHER}
+    assert stats.commands["a"][:2] == [2, 1]
+    assert stats.commands[CommandStats.OTHER][0] == 2
+
+
+def test_command_stats_are_thread_safe(tmp_path, monkeypatch):
+    class SlowHistogram(LatencyHistogram):
+        def __init__(self):
+            time.sleep(0.01) # Let other threads add commands meanwhile.
+            super().__init__()
+    monkeypatch.setattr(metrics, 'LatencyHistogram', SlowHistogram)
+    stats = CommandStats(max_commands=4, export_path=str(tmp_path / "stats.jsonl"),
+                         export_interval=0)
+    def finish_commands(thread):
+        for index in range(25):
+            stats.command_finished("", f"{thread}-{index % 8}", 0.001)
+    threads = [threading.Thread(target=finish_commands, args=(thread,))
+               for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(stats.commands) == 5 # max_commands and OTHER.
+    assert sum(calls for calls, _, _ in stats.commands.values()) == 8 * 25
+    assert sum(histogram.count for _, _, histogram in stats.commands.values()) \
+        == 8 * 25
+
+
+def test_failed_periodic_exports_are_logged(tmp_path, caplog):
+    stats = CommandStats(export_path=str(tmp_path / "missing" / "stats.prom"),
+                         export_interval=0)
+    stats.command_finished("add 1", "add", 0.001)
+    stats.command_finished("add 2", "add", 0.001)
+    assert stats.commands["add"][0] == 2
+    assert len([r for r in caplog.records if r.exc_info]) == 2
+
+
+def test_cmdloop_collects_stats_and_exports(tmp_path, capsys):
+    my_prompt = Inpromptu(TestClass(), lines=["add 1", "add 2", "fail", "stats"])
+    my_prompt.cmdloop()
+    out = capsys.readouterr().out
+    table = out[out.index("command"):].splitlines()
+    assert table[1].split()[:3] == ["add", "2", "0"]
+    assert table[2].split()[:3] == ["fail", "1", "1"]
+
+    prometheus_path = tmp_path / "inpromptu.prom"
+    my_prompt.onecmd(f"stats export {prometheus_path}")
+    prometheus = prometheus_path.read_text()
+    assert 'inpromptu_commands_total{command="add"} 2' in prometheus
+    assert 'inpromptu_command_errors_total{command="fail"} 1' in prometheus
+    assert 'inpromptu_command_latency_seconds_count{command="add"} 2' in prometheus
+
+    jsonl_path = tmp_path / "stats.jsonl"
+    my_prompt.onecmd(f"stats export {jsonl_path}")
+    my_prompt.onecmd(f"stats export {jsonl_path}")
+    records = [json.loads(line) for line in jsonl_path.read_text().splitlines()]
+    assert [r["command"] for r in records[:4]] == ["add", "fail", "stats", "add"]
+    assert records[0]["calls"] == 2 and records[1]["errors"] == 1
+
+    my_prompt.onecmd("stats reset")
+    assert list(my_prompt.stats.commands) == ["stats"] # The reset itself.
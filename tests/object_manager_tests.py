@@ -0,0 +1,121 @@
+#!/usr/bin/env/python3
+import pytest
+from prompt_toolkit.completion import CompleteEvent
+from prompt_toolkit.document import Document
+from inpromptu import UserInputError
+from inpromptu.inpromptu_batch import Inpromptu
+
+
+class Axis:
+    def __init__(self, stage):
+        self.stage = stage # Back-reference to the parent.
+        self.position = 0.0
+
+    def move(self, distance: float, speed: float = 1.0):
+        """Move the axis."""
+        self.position += distance
+        return self.position
+
+
+class Stage:
+    def __init__(self, controller):
+        self.controller = controller
+        self.x_axis = Axis(self)
+        self.y_axis = Axis(self)
+
+    def home(self):
+        self.x_axis.position = self.y_axis.position = 0.0
+
+
+class Controller:
+    def __init__(self, device_count=0):
+        self.name = "controller"
+        self.stage = Stage(self)
+        self.devices = [] # Containers aren't navigated into.
+        for index in range(device_count):
+            setattr(self, f"device_{index}", Stage(self))
+
+    def status(self):
+        return "ok"
+
+
+def test_dotted_commands():
+    controller = Controller()
+    my_prompt = Inpromptu(controller)
+    assert my_prompt.onecmd("stage.x_axis.move 2") == 2.0
+    assert my_prompt.onecmd("stage.x_axis.move distance=3") == 5.0
+    my_prompt.onecmd("stage.home")
+    assert controller.stage.x_axis.position == 0.0
+    # The same objects, through back-references.
+    assert my_prompt.onecmd("stage.y_axis.stage.controller.stage.y_axis.move 1") == 1.0
+    assert my_prompt.stats.commands["stage.x_axis.move"][0] == 2
+    with pytest.raises(UserInputError):
+        my_prompt.onecmd("stage.z_axis.move 1")
+    with pytest.raises(UserInputError):
+        my_prompt.onecmd("stage.x_axis.jump 1")
+    with pytest.raises(UserInputError):
+        my_prompt.onecmd("name.upper")
+
+
+def test_sub_objects_are_introspected_on_demand():
+    my_prompt = Inpromptu(Controller(device_count=200))
+    assert len(my_prompt.objects._managers) == 1 # Just the controller.
+    my_prompt._get_completion_matches("device_1", "device_1")
+    assert len(my_prompt.objects._managers) == 1
+    my_prompt._get_completion_matches("device_150.x", "device_150.x")
+    assert len(my_prompt.objects._managers) == 2
+    my_prompt.onecmd("device_150.x_axis.move 1")
+    assert len(my_prompt.objects._managers) == 3
+    # Objects reached by another path are introspected only once.
+    my_prompt.onecmd("device_150.x_axis.stage.x_axis.move 1")
+    assert len(my_prompt.objects._managers) == 3
+
+
+def test_walk_visits_each_object_once():
+    controller = Controller(device_count=2)
+    my_prompt = Inpromptu(controller)
+    paths = [path for path, _ in my_prompt.objects.walk()]
+    assert paths == ["", "device_0", "device_1", "stage", "device_0.x_axis",
+                     "device_0.y_axis", "device_1.x_axis", "device_1.y_axis",
+                     "stage.x_axis", "stage.y_axis"]
+    assert my_prompt.objects.validate() == {}
+
+
+def test_dotted_completion():
+    my_prompt = Inpromptu(Controller())
+    assert my_prompt._get_completion_matches("st", "st") == \
+        ["stage.", "stats", "status"]
+    assert my_prompt._get_completion_matches("stage.", "stage.") == \
+        ["stage.controller.", "stage.help", "stage.home", "stage.x_axis.",
+         "stage.y_axis."]
+    assert my_prompt._get_completion_matches("stage.x_axis.m", "stage.x_axis.m") \
+        == ["stage.x_axis.move"]
+    assert my_prompt._get_completion_matches("stage.x_axis.move ", "") == \
+        ["distance="]
+    assert my_prompt._get_completion_matches("stage.x_axis.move 1 ", "") == \
+        ["speed="]
+    assert my_prompt._get_completion_matches("stage.bogus.", "stage.bogus.") == []
+    assert my_prompt._get_completion_matches("stage.bogus.move ", "") == []
+
+
+def test_prompt_toolkit_dotted_completion():
+    from inpromptu.inpromptu_prompt_toolkit import Inpromptu as PTInpromptu
+    my_prompt = PTInpromptu(Controller())
+    event = CompleteEvent(completion_requested=True)
+    completions = list(my_prompt.get_completions(Document("stage.x_axis."), event))
+    assert [c.text for c in completions] == \
+        ["stage.x_axis.help", "stage.x_axis.move", "stage.x_axis.stage."]
+    assert [c.display_text for c in completions] == ["help", "move", "stage."]
+    completions = list(my_prompt.get_completions(Document("stage.x_axis.move "),
+                                                 event))
+    assert [c.display_text for c in completions] == ["distance=<float>"]
+
+
+def test_replaced_sub_objects_are_found():
+    controller = Controller()
+    my_prompt = Inpromptu(controller)
+    my_prompt.onecmd("stage.x_axis.move 1")
+    controller.stage = Stage(controller)
+    controller.gantry = Stage(controller)
+    assert my_prompt.onecmd("stage.x_axis.move 1") == 1.0
+    assert my_prompt.onecmd("gantry.x_axis.move 2") == 2.0
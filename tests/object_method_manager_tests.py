@@ -0,0 +1,131 @@
+#!/usr/bin/env/python3
+import gc
+import weakref
+import pytest
+from inpromptu import object_method_manager
+from inpromptu.object_method_manager import ObjectMethodManager
+from inpromptu.object_method_manager import get_class_structure
+
+
+class MyCallable:
+    def __call__(self, count: int):
+        return count
+
+
+class Axis:
+    def __init__(self, name):
+        self.name = name
+
+    def move(self, distance: float, speed: float = 1.0):
+        """Move the axis."""
+        return distance
+
+    def home(self):
+        return self.name
+
+    def untyped(self, value):
+        return value
+
+    @property
+    def position(self):
+        return 0
+
+    @position.setter
+    def position(self, value: float):
+        pass
+
+
+def test_class_structure_is_shared():
+    x_axis = ObjectMethodManager(Axis('x'))
+    y_axis = ObjectMethodManager(Axis('y'))
+    assert x_axis.structure is y_axis.structure
+    assert x_axis.call_plans['move'] is y_axis.call_plans['move']
+    # Instance-bound pieces are still per instance.
+    assert x_axis.method_defs['move']['parameters']['self']['default'] is \
+        x_axis.class_instance
+    assert y_axis.method_defs['move']['parameters']['self']['default'] is \
+        y_axis.class_instance
+    assert 'untyped' in x_axis.callables and 'untyped' not in x_axis.method_defs
+    assert x_axis.callables == \
+        {'move', 'home', 'untyped', 'position', 'help'}
+
+
+def test_completion_options_are_per_instance():
+    x_axis = ObjectMethodManager(Axis('x'))
+    y_axis = ObjectMethodManager(Axis('y'))
+    x_axis.set_completion_options('move', 'distance', ['1', '2'])
+    assert 'options' not in y_axis.method_defs['move']['parameters']['distance']
+
+
+def test_instance_members_shadow_class_members():
+    axis = Axis('x')
+    axis.home = MyCallable()
+    axis.extra = MyCallable()
+    omm = ObjectMethodManager(axis, methods_to_skip=['move'])
+    assert omm.methods['home'] is axis.home
+    assert [slot.name for slot in omm.call_plans['home'].slots] == ['count']
+    assert 'extra' in omm.method_defs
+    assert 'move' not in omm.callables
+    # Other instances are unaffected.
+    assert 'extra' not in ObjectMethodManager(Axis('y')).callables
+
+
+def test_classes_can_be_collected():
+    class Temporary:
+        def ping(self):
+            return super().__init__
+    ObjectMethodManager(Temporary())
+    class_ref = weakref.ref(Temporary)
+    del Temporary
+    gc.collect()
+    assert class_ref() is None
+
+
+def test_slotted_instances():
+    class Slotted:
+        __slots__ = ['value']
+        def read(self):
+            return self.value
+    assert 'read' in ObjectMethodManager(Slotted()).callables
+
+
+def test_classmethods_are_not_exposed():
+    class WithClassmethod:
+        @classmethod
+        def create(cls):
+            return cls()
+        @staticmethod
+        def helper(x: int):
+            return x
+    callables = ObjectMethodManager(WithClassmethod()).callables
+    assert 'create' not in callables
+    assert 'helper' in callables
+
+
+def test_method_defs_are_built_lazily(monkeypatch):
+    class Lazy:
+        def first(self, a: int):
+            pass
+        def second(self, b: int):
+            pass
+    built = []
+    from_callable = object_method_manager.CallPlan.from_callable.__func__
+    def counting_from_callable(cls, func):
+        built.append(func.__name__)
+        return from_callable(cls, func)
+    monkeypatch.setattr(object_method_manager.CallPlan, 'from_callable',
+                        classmethod(counting_from_callable))
+    omm = ObjectMethodManager(Lazy())
+    assert omm.callables == {'first', 'second', 'help'}
+    assert 'first' not in built and 'second' not in built
+    assert 'first' in omm.method_defs
+    assert built.count('first') == 1 and 'second' not in built
+    omm.method_defs['first']
+    assert built.count('first') == 1
+
+
+def test_validate_reports_missing_hints(caplog):
+    omm = ObjectMethodManager(Axis('x'))
+    assert omm.validate() == {'untyped': ['value']}
+    assert "untyped" in caplog.text
+    assert set(omm.method_defs) == {'move', 'home', 'position', 'help'}
@@ -0,0 +1,92 @@
+#!/usr/bin/env/python3
+import pytest
+from enum import Enum, auto
+from typing import Union
+from inpromptu import Inpromptu
+from inpromptu.object_method_manager import CallPlan
+
+
+class Color(Enum):
+    red = auto()
+    blue = auto()
+
+
+class TestClass:
+    __test__ = False
+
+    def move(self, x: float, y: float = 0, *, relative: bool = False):
+        return x, y, relative
+
+    def paint(self, color: Color, *coats: int, **options: str):
+        return color, coats, options
+
+    def split(self, a: int, /, b: int):
+        return a, b
+
+
+def test_call_plan_layout():
+    """Ensure call plans capture parameter kinds and slots."""
+    plan = CallPlan.from_callable(TestClass.paint)
+    assert plan.bound_param == 'self'
+    assert [slot.name for slot in plan.slots] == \
+        ['self', 'color', 'coats', 'options']
+    assert plan.var_positional == 2 and plan.var_keyword == 3
+    assert plan.slots[1].types == (Color,)
+    assert 'coats' not in plan.keywords
+
+
+def test_parse_positional_and_keyword_args():
+    my_prompt = Inpromptu(TestClass())
+    plan = my_prompt.omm.call_plans['move']
+    args, kwargs, remaining = my_prompt.parse_args(plan, ['1', 'relative=True'])
+    assert args == [1.0]
+    assert kwargs == {'relative': True}
+    assert [p.name for p in remaining] == ['y']
+
+
+def test_parse_keywords_use_their_own_types():
+    my_prompt = Inpromptu(TestClass())
+    plan = my_prompt.omm.call_plans['paint']
+    args, kwargs, _ = my_prompt.parse_args(plan, ['Color.red', '2', '3',
+                                                  "finish='matte'"])
+    assert args == [Color.red, 2, 3]
+    assert kwargs == {'finish': 'matte'}
+
+
+def test_parse_accepts_callables():
+    my_prompt = Inpromptu(TestClass())
+    args, kwargs, _ = my_prompt.parse_args(TestClass.move, ['y=2', 'x=1'])
+    assert args == [] and kwargs == {'y': 2.0, 'x': 1.0}
+
+
+def test_remaining_params_drop_var_positional_after_kwargs():
+    my_prompt = Inpromptu(TestClass())
+    plan = my_prompt.omm.call_plans['paint']
+    remaining = my_prompt.get_remaining_params(plan, ['color=Color.red'])
+    assert [p.name for p in remaining] == ['options']
+
+
+def test_parse_errors():
+    my_prompt = Inpromptu(TestClass())
+    with pytest.raises(SyntaxError):
+        my_prompt.parse_args(my_prompt.omm.call_plans['move'], ['1', '2', '3'])
+    with pytest.raises(SyntaxError):
+        my_prompt.parse_args(my_prompt.omm.call_plans['move'], ['1', 'x=2'])
+    with pytest.raises(SyntaxError):
+        my_prompt.parse_args(my_prompt.omm.call_plans['split'], ['a=1'])
+    # Positional input after keywords, whether or not it's the last.
+    for arg_blocks in (['1', 'relative=True', '7'],
+                       ['1', 'relative=True', '7', '8']):
+        with pytest.raises(SyntaxError):
+            my_prompt.parse_args(my_prompt.omm.call_plans['move'], arg_blocks)
+    # While completing, a trailing partial input is ignored.
+    remaining = my_prompt.get_remaining_params(my_prompt.omm.call_plans['move'],
+                                               ['1', 'relative=True', '7'])
+    assert [p.name for p in remaining] == ['y']
+
+
+def test_cmdloop_dispatch(monkeypatch, capsys):
+    monkeypatch.setattr('builtins.input', lambda prompt: "move 1 2 relative=True")
+    my_prompt = Inpromptu(TestClass())
+    my_prompt.cmdloop(loop=False)
+    assert capsys.readouterr().out.rstrip() == "(1.0, 2.0, True)"
@@ -0,0 +1,149 @@
+#!/usr/bin/env/python3
+import os
+import signal
+import threading
+import time
+from multiprocessing.shared_memory import SharedMemory
+import pytest
+from inpromptu import UserInputError
+from inpromptu.inpromptu_batch import Inpromptu
+from inpromptu.inpromptu_process import ProcessMixin, WorkerError
+from inpromptu.inpromptu_process import RemoteTraceback, SharedResult
+from inpromptu.inpromptu_process import share_result, unshare_result
+
+
+class Axis:
+
+    def move(self, distance: float):
+        print(f"moving {distance}")
+        return distance
+
+
+class Device:
+
+    def __init__(self):
+        self.total = 0
+        self.x_axis = Axis()
+
+    def add(self, amount: int):
+        """Add an amount."""
+        self.total += amount
+        return self.total
+
+    @property
+    def pid(self):
+        """The worker's process id."""
+        return os.getpid()
+
+    def read(self, size: int):
+        return b"x" * size
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def wedge(self):
+        """Hang, ignoring Ctrl-C."""
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        time.sleep(60)
+
+    def fail(self):
+        raise RuntimeError("Broken.")
+
+    def generate(self):
+        yield 1
+
+
+class ProcessInpromptu(ProcessMixin, Inpromptu):
+    pass
+
+
+@pytest.fixture
+def my_prompt():
+    my_prompt = ProcessInpromptu(Device)
+    yield my_prompt
+    my_prompt.close()
+
+
+def test_commands_run_in_the_worker(my_prompt, capsys):
+    assert my_prompt.onecmd("pid") != os.getpid()
+    assert my_prompt.onecmd("add 2") == 2
+    assert my_prompt.onecmd("add amount=3") == 5
+    assert my_prompt.onecmd("x_axis.move 1.5") == 1.5
+    assert capsys.readouterr().out == "moving 1.5\n"
+    with pytest.raises(RuntimeError) as error:
+        my_prompt.onecmd("fail")
+    assert isinstance(error.value.__cause__, RemoteTraceback)
+    assert "Broken." in error.value.__cause__.text
+    with pytest.raises(TypeError):
+        my_prompt.onecmd("generate")
+    with pytest.raises(ValueError):
+        my_prompt.onecmd("add two") # Converted before being sent.
+    with pytest.raises(UserInputError):
+        my_prompt.onecmd("y_axis.move 1")
+
+
+def test_completion_uses_definitions_only(my_prompt):
+    job = my_prompt.onecmd("sleep 2 &")
+    while job.status != "running":
+        time.sleep(0.001)
+    # Completion doesn't wait for the worker to finish the call.
+    start = time.perf_counter()
+    assert my_prompt._get_completion_matches("ad", "ad") == ["add"]
+    assert my_prompt._get_completion_matches("add ", "") == ["amount="]
+    assert my_prompt.omm.method_defs['add']['doc'] == "Add an amount."
+    # Sub-objects are described while the call runs.
+    assert my_prompt._get_completion_matches("x_axis.m", "x_axis.m") == \
+        ["x_axis.move"]
+    assert time.perf_counter() - start < 1
+    my_prompt.jobs.wait()
+
+
+def mapped(name):
+    """Return whether a shared memory block is mapped into this process."""
+    with open("/proc/self/maps") as maps:
+        return name in maps.read()
+
+
+def test_large_results_use_shared_memory(my_prompt):
+    assert my_prompt.onecmd("read 10") == b"x" * 10
+    size = my_prompt.worker.min_shared_bytes * 2
+    result = my_prompt.onecmd(f"read {size}")
+    assert isinstance(result, memoryview) and result.readonly
+    assert result == b"x" * size
+    shared = share_result(bytearray(b"y" * 100), min_bytes=10)
+    assert isinstance(shared, SharedResult)
+    view = unshare_result(shared)
+    assert view == bytearray(b"y" * 100) and not view.readonly
+    # Unlinked right away, but mapped until the last view is released.
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(shared.name)
+    if os.path.exists("/proc/self/maps"):
+        part = view[10:20]
+        del view
+        assert mapped(shared.name)
+        del part
+        assert not mapped(shared.name)
+    assert share_result(b"y", min_bytes=10) == b"y"
+
+
+def test_ctrl_c_interrupts_the_worker(my_prompt):
+    threading.Timer(0.2, os.kill, [os.getpid(), signal.SIGINT]).start()
+    with pytest.raises(WorkerError):
+        my_prompt.onecmd("sleep 10")
+    assert my_prompt.onecmd("add 1") == 1
+
+
+def test_restart_a_wedged_worker(my_prompt, capsys):
+    my_prompt.onecmd("add 1")
+    pid = my_prompt.onecmd("pid")
+    job = my_prompt.onecmd("wedge &")
+    while job.status != "running":
+        time.sleep(0.001)
+    my_prompt.worker.interrupt() # Ignored.
+    my_prompt.onecmd("restart")
+    my_prompt.jobs.wait()
+    assert capsys.readouterr().out.endswith("Worker process restarted.\n")
+    assert isinstance(job.error, WorkerError)
+    assert my_prompt.onecmd("pid") != pid
+    assert my_prompt.onecmd("add 1") == 1 # A new object.
+    assert my_prompt.onecmd("x_axis.move 2") == 2.0
@@ -0,0 +1,185 @@
+#!/usr/bin/env/python3
+import json
+from collections import namedtuple
+import pytest
+from inpromptu.inpromptu_batch import Inpromptu
+from inpromptu.renderers import Renderer, ResultFormatter
+
+
+class TestClass:
+    __test__ = False
+
+    def __init__(self):
+        self.events = []
+
+    def count(self, stop: int):
+        try:
+            for i in range(stop):
+                self.events.append(f"produce {i}")
+                yield i
+        finally:
+            self.events.append("closed")
+
+    def words(self):
+        try:
+            yield from ["a", "interrupt", "b"]
+        finally:
+            self.events.append("closed")
+
+    def interrupted(self):
+        yield 0
+        yield 1
+        raise KeyboardInterrupt
+
+    def broken(self):
+        yield 0
+        yield 1
+        raise RuntimeError("Sensor unplugged.")
+
+    def numbers(self, stop: int):
+        return list(range(stop))
+
+    def squares(self, stop: int):
+        return {i: i * i for i in range(stop)}
+
+    def point(self):
+        return Point(1, 2)
+
+
+class Point:
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+
+class PointRenderer(Renderer):
+
+    def format(self, value, formatter, depth):
+        return f"<{value.x}, {value.y}>"
+
+    def to_json(self, value, formatter):
+        return {"x": value.x, "y": value.y}
+
+
+class Unformattable:
+    def __repr__(self):
+        raise AssertionError("Elided items aren't formatted.")
+
+
+class RecordingInpromptu(Inpromptu):
+
+    def print_result(self, return_val):
+        self.omm.class_instance.events.append(f"print {return_val}")
+        if return_val == "interrupt":
+            raise KeyboardInterrupt
+        super().print_result(return_val)
+
+
+def test_generators_are_streamed(capsys):
+    my_prompt = RecordingInpromptu(TestClass())
+    my_prompt.run_line("count 2")
+    assert my_prompt.omm.class_instance.events == \
+        ["produce 0", "print 0", "produce 1", "print 1", "closed"]
+    assert capsys.readouterr().out == "0\n1\n"
+    my_prompt.render(iter(["a", "b"]))
+    assert capsys.readouterr().out == "a\nb\n"
+
+
+def test_ctrl_c_stops_the_stream(capsys):
+    my_prompt = RecordingInpromptu(TestClass())
+    assert my_prompt.run_line("interrupted") is None
+    assert capsys.readouterr().out == "0\n1\n\nStopped after 2 items.\n"
+    # Interrupting the display closes the generator.
+    my_prompt.run_line("words")
+    assert capsys.readouterr().out == "a\n\nStopped after 1 items.\n"
+    assert my_prompt.omm.class_instance.events[-1] == "closed"
+
+
+def test_errors_while_streaming_fail_the_command(capsys):
+    my_prompt = Inpromptu(TestClass())
+    error = my_prompt.run_line("broken")
+    assert isinstance(error, RuntimeError)
+    out = capsys.readouterr().out
+    assert out.startswith("0\n1\nTraceback") and "Sensor unplugged." in out
+    assert my_prompt.stats.commands["broken"][1] == 1 # Counted as an error.
+    summary = my_prompt.run_script(["broken", "numbers 2"], stop_on_error=False)
+    assert (summary.executed, summary.failed) == (2, 1)
+    assert capsys.readouterr().out == "0\n1\n[0, 1]\n"
+    summary = my_prompt.run_script(["broken", "numbers 2"])
+    assert summary.stopped and summary.executed == 1
+
+
+def test_long_sequences_are_streamed_and_truncated(capsys):
+    my_prompt = Inpromptu(TestClass())
+    my_prompt.run_line("numbers 3")
+    assert capsys.readouterr().out == "[0, 1, 2]\n"
+    my_prompt.stream_threshold = 2
+    my_prompt.max_items = 4
+    my_prompt.run_line("numbers 3")
+    assert capsys.readouterr().out == "0\n1\n2\n"
+    my_prompt.run_line("numbers 10")
+    assert capsys.readouterr().out == "0\n1\n2\n3\n... 6 more items\n"
+    my_prompt.run_line("squares 3")
+    assert capsys.readouterr().out == "0: 0\n1: 1\n2: 4\n"
+    my_prompt.render("long string")
+    assert capsys.readouterr().out == "long string\n"
+
+
+def test_paging(capsys, monkeypatch):
+    my_prompt = RecordingInpromptu(TestClass())
+    my_prompt.page_size = 2
+    answers = iter(["", "q"])
+    monkeypatch.setattr("builtins.input", lambda prompt: next(answers))
+    my_prompt.run_line("count 10")
+    assert capsys.readouterr().out == "0\n1\n2\n3\n"
+    assert my_prompt.omm.class_instance.events[-1] == "closed"
+    monkeypatch.setattr("builtins.input", lambda prompt: "")
+    my_prompt.run_line("count 3")
+    assert capsys.readouterr().out == "0\n1\n2\n"
+
+
+def test_long_middles_are_elided():
+    formatter = ResultFormatter(max_items=4, max_chars=60, max_string=6)
+    assert formatter.format(list(range(10))) == "[0, 1, ...6 more..., 8, 9]"
+    assert formatter.format((1,)) == "(1,)"
+    # Subclasses with their own repr keep it.
+    Pair = namedtuple("Pair", "x y")
+    assert formatter.format(Pair(1, 2)) == "Pair(x=1, y=2)"
+    assert formatter.format([Pair(1, 2)]) == "[Pair(x=1, y=2)]"
+    assert ResultFormatter(max_string=6).format({1: "abcdefgh"}) == \
+        "{1: 'abc ... fgh'}"
+    assert formatter.format(set(range(10))).endswith(", ...8 more...}")
+    assert formatter.format("x" * 100) == "x" * 27 + " ... " + "x" * 27
+    assert formatter.format(memoryview(b"abcdefgh")) == \
+        "b'abc' ... b'fgh' (8 bytes)"
+    nested = []
+    nested.append(nested)
+    assert formatter.format(nested) == "[[[[[[[...]]]]]]]"
+    # Only the items shown are formatted.
+    formatter.format([0, 1] + [Unformattable()] * 10**6 + [2, 3])
+    # Items are dropped to keep within max_chars.
+    assert formatter.format(["x" * 50] * 3) == \
+        "['xxx ... xxx', ...1 more..., 'xxx ... xxx']"
+
+
+def test_renderers_by_type(capsys):
+    my_prompt = Inpromptu(TestClass())
+    my_prompt.formatter.register(Point, PointRenderer())
+    my_prompt.run_line("point")
+    assert capsys.readouterr().out == "<1, 2>\n"
+    assert my_prompt.formatter.format([Point(3, 4)]) == "[<3, 4>]"
+    # Types can be named, without importing their module.
+    formatter = ResultFormatter()
+    formatter.register(f"{__name__}.Point", PointRenderer())
+    assert formatter.format(Point(5, 6)) == "<5, 6>"
+
+
+def test_json_lines(capsys):
+    my_prompt = Inpromptu(TestClass())
+    my_prompt.formatter.register(Point, PointRenderer())
+    my_prompt.output_format = 'jsonl'
+    my_prompt.stream_threshold = 2
+    for line in ["squares 3", "point", "count 2", "numbers 3"]:
+        my_prompt.run_line(line)
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line) for line in lines] == \
+        [{"0": 0, "1": 1, "2": 4}, {"x": 1, "y": 2}, 0, 1, [0, 1, 2]]
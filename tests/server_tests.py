@@ -0,0 +1,222 @@
+#!/usr/bin/env/python3
+import asyncio
+import contextlib
+import json
+import sys
+import threading
+import time
+import pytest
+from inpromptu.inpromptu_server import Inpromptu, parse_address
+from inpromptu.inpromptu_client import InpromptuClient
+
+
+class Part:
+    def __init__(self, text):
+        raise KeyError(text) # Escapes conversion.
+
+
+class TestClass:
+    __test__ = False
+
+    def __init__(self):
+        self.total = 0
+        self.active = 0
+        self.max_active = 0
+
+    def add(self, amount: int):
+        self.total += amount
+        return self.total
+
+    def slow_add(self, amount: int, seconds: float = 0.05):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        time.sleep(seconds)
+        self.active -= 1
+        self.total += amount
+
+    def shout(self, message: str):
+        print(message.upper())
+
+    def fail(self):
+        raise RuntimeError("Broken.")
+
+    def lookup(self, key: str):
+        return {}[key]
+
+    def find(self, part: Part):
+        return part
+
+    def stream(self):
+        yield 1
+        raise RuntimeError("Unplugged.")
+
+
+@pytest.fixture
+def serve(tmp_path):
+    """Start a server on a Unix socket in a background thread. Yield a
+    function returning it, given a target and the constructor's keyword
+    arguments."""
+    servers = []
+
+    def start(target=None, **kwargs):
+        address = f"unix:{tmp_path / 'inpromptu.sock'}"
+        server = Inpromptu(target or TestClass(), address=address, **kwargs)
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        async def run():
+            await server.start()
+            started.set()
+            with contextlib.suppress(asyncio.CancelledError):
+                await server.server.serve_forever()
+
+        thread = threading.Thread(target=loop.run_until_complete, args=(run(),),
+                                  daemon=True)
+        thread.start()
+        assert started.wait(5)
+        servers.append((server, loop, thread))
+        return server
+
+    yield start
+    for server, loop, thread in servers:
+        loop.call_soon_threadsafe(server.close)
+        thread.join(5)
+        server.close()
+
+
+def test_parse_address():
+    assert parse_address("unix:/tmp/a.sock") == ('unix', "/tmp/a.sock")
+    assert parse_address("localhost:7777") == ('tcp', ("localhost", 7777))
+    assert parse_address(":7777") == ('tcp', ("127.0.0.1", 7777))
+    assert parse_address("/tmp/a.sock") == ('unix', "/tmp/a.sock")
+
+
+def test_run_captures_output(serve):
+    server = serve()
+    with InpromptuClient(server.address, timeout=5) as client:
+        assert client.prompt == server.prompt
+        assert client.run("add 2") == ("2\n", None)
+        assert client.run("shout hi") == ("HI\n", None)
+        assert client.run("") == ("", None)
+        output, error = client.run("fail")
+        assert "RuntimeError: Broken." in output
+        assert error == "RuntimeError: Broken."
+        output, error = client.run("add two")
+        assert error.startswith("ValueError: Cannot convert two")
+    assert server.omm.class_instance.total == 2
+
+
+def test_remote_completion(serve):
+    server = serve()
+    with InpromptuClient(server.address, timeout=5) as client:
+        assert client.complete("ad", "ad")[0] == ["add"]
+        assert client.complete("time sl", "sl")[0] == ["slow_add"]
+        matches, hints = client.complete("slow_add ", "")
+        assert matches == ["amount="]
+        assert hints == {"amount=": "amount=<int>"}
+        matches, _ = client.complete("slow_add 1 ", "")
+        assert matches == ["seconds="]
+
+
+def test_exclusive_lock_serializes_clients(serve):
+    server = serve()
+    clients = [InpromptuClient(server.address, timeout=5) for _ in range(4)]
+    threads = [threading.Thread(target=client.run, args=("slow_add 1",))
+               for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    for client in clients:
+        client.close()
+    assert server.omm.class_instance.total == 4
+    assert server.omm.class_instance.max_active == 1
+
+
+def test_no_lock_runs_clients_concurrently(serve):
+    server = serve(lock=None)
+    clients = [InpromptuClient(server.address, timeout=5) for _ in range(4)]
+    threads = [threading.Thread(target=client.run, args=("slow_add 1 0.2",))
+               for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    for client in clients:
+        client.close()
+    assert server.omm.class_instance.max_active > 1
+
+
+def test_bad_requests(serve):
+    server = serve()
+    with InpromptuClient(server.address, timeout=5) as client:
+        assert "Unknown op" in client.request("bogus")["error"]
+        assert "Bad request" in client.request("run")["error"]
+        # Malformed JSON gets an error without an id; the connection survives.
+        client.stream.write(b"{not json\n")
+        client.stream.flush()
+        response = json.loads(client.stream.readline())
+        assert response["id"] is None and "Bad request" in response["error"]
+        assert client.run("add 1") == ("1\n", None)
+
+
+def test_command_errors_are_not_bad_requests(serve):
+    server = serve()
+    with InpromptuClient(server.address, timeout=5) as client:
+        assert client.run("lookup x")[1] == "KeyError: 'x'"
+        output, error = client.run("find p1")
+        assert error == "KeyError: 'p1'" and "Traceback" in output
+        output, error = client.run("stream")
+        assert output.startswith("1\n") and error == "RuntimeError: Unplugged."
+        assert "Bad request" in client.request("run", line=5)["error"]
+        assert client.run("add 1") == ("1\n", None)
+
+
+def test_each_client_has_its_own_results(serve):
+    server = serve()
+    with InpromptuClient(server.address, timeout=5) as first, \
+            InpromptuClient(server.address, timeout=5) as second:
+        first.run("add 1")
+        second.run("add 10")
+        assert first.run("add _") == ("12\n", None) # 1, not 11.
+        assert first.run("history") == ("_1: 1\n_2: 12\n", None)
+        assert second.run("history") == ("_1: 11\n", None)
+    assert len(server.results) == 0
+
+
+def test_jobs_take_the_lock_and_belong_to_their_client(serve):
+    server = serve()
+    with InpromptuClient(server.address, timeout=5) as first, \
+            InpromptuClient(server.address, timeout=5) as second:
+        output, error = first.run("slow_add 1 0.2 &")
+        assert error is None and output.startswith("[1]")
+        assert second.run("slow_add 1 0.2") == ("", None)
+        assert second.run("jobs") == ("No jobs.\n", None)
+        assert second.run("result 1")[1] == "UserInputError: No such job: 1."
+        assert first.run("wait 1")[1] is None
+        assert first.run("jobs")[0].startswith("[1] done")
+        # The server still captures output once the client's jobs are done.
+        assert sys.stdout is server._stdout
+        assert second.run("shout hi") == ("HI\n", None)
+    assert server.omm.class_instance.total == 2
+    assert server.omm.class_instance.max_active == 1
+
+
+def test_oversized_request_drops_client(serve, monkeypatch):
+    monkeypatch.setattr(Inpromptu, "max_request_bytes", 1024)
+    server = serve()
+    with InpromptuClient(server.address, timeout=5) as client:
+        with pytest.raises(ConnectionError):
+            client.run("add " + "1" * 4096)
+    with InpromptuClient(server.address, timeout=5) as client:
+        assert client.run("add 1") == ("1\n", None)
+
+
+def test_coroutine_output_goes_to_its_client(serve):
+    class AsyncTarget:
+        async def shout(self, message: str):
+            await asyncio.sleep(0)
+            print(message.upper())
+    server = serve(AsyncTarget())
+    with InpromptuClient(server.address, timeout=5) as client:
+        assert client.run("shout hi") == ("HI\n", None)
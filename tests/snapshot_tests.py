@@ -0,0 +1,129 @@
+#!/usr/bin/env/python3
+import importlib
+import sys
+import pytest
+from inpromptu import object_method_manager
+from inpromptu.object_method_manager import ObjectMethodManager
+from inpromptu.snapshot import StructureSnapshot
+
+
+DRIVER_SOURCE = '''
+from enum import Enum
+
+class Mode(Enum):
+    fast = 1
+    slow = 2
+
+class Driver:
+    def move(self, distance: float, mode: Mode = Mode.fast):
+        """Move somewhere."""
+        return distance
+'''
+
+
+@pytest.fixture
+def driver_module(tmp_path, monkeypatch):
+    """Write an importable module and forget structures between runs."""
+    (tmp_path / "snapshot_driver.py").write_text(DRIVER_SOURCE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(StructureSnapshot, '_open_snapshots', {})
+    yield importlib.import_module("snapshot_driver")
+    sys.modules.pop("snapshot_driver", None)
+
+
+def new_process(module):
+    """Simulate a fresh launch: drop in-process caches and reimport."""
+    object_method_manager._class_structures.clear()
+    StructureSnapshot._open_snapshots.clear()
+    return importlib.reload(module)
+
+
+def test_snapshot_round_trip(driver_module, tmp_path, monkeypatch):
+    path = tmp_path / "structure.snapshot"
+    omm = ObjectMethodManager(driver_module.Driver(), snapshot=path)
+    StructureSnapshot.open(path).save()
+    assert path.exists()
+    expected_defs = omm.method_defs
+
+    driver_module = new_process(driver_module)
+    # Loading from the snapshot must not introspect the class again.
+    def fail(*args, **kwargs):
+        raise AssertionError("Class was re-introspected.")
+    monkeypatch.setattr(object_method_manager.ClassStructure, '__init__', fail)
+    instance = driver_module.Driver()
+    omm = ObjectMethodManager(instance, snapshot=path)
+    assert omm.method_defs['move']['doc'] == "Move somewhere."
+    assert omm.method_defs['move']['param_order'] == ['self', 'distance', 'mode']
+    assert omm.method_defs['move']['parameters']['mode']['options'] == \
+        expected_defs['move']['parameters']['mode']['options']
+    assert omm.method_defs['move']['parameters']['self']['default'] is instance
+    assert omm.call_plans['move'].keywords['mode'] == 2
+
+
+def test_stale_snapshot_is_rebuilt(driver_module, tmp_path):
+    path = tmp_path / "structure.snapshot"
+    ObjectMethodManager(driver_module.Driver(), snapshot=path)
+    StructureSnapshot.open(path).save()
+
+    (tmp_path / "snapshot_driver.py").write_text(DRIVER_SOURCE.replace(
+        "def move(self, distance: float,", "def move(self, distance: int,"))
+    driver_module = new_process(driver_module)
+    omm = ObjectMethodManager(driver_module.Driver(), snapshot=path)
+    assert omm.method_defs['move']['parameters']['distance']['types'] == [int]
+    StructureSnapshot.open(path).save()
+
+    # The rebuilt structure was written back.
+    driver_module = new_process(driver_module)
+    snapshot = StructureSnapshot.open(path)
+    assert snapshot.load(driver_module.Driver) is not None
+
+
+def test_snapshot_is_stale_when_annotation_types_change(driver_module, tmp_path):
+    modes = tmp_path / "snapshot_modes.py"
+    modes.write_text("from enum import Enum\n\n"
+                     "class Mode(Enum):\n    a = 1\n    b = 2\n")
+    (tmp_path / "snapshot_driver.py").write_text(
+        "from snapshot_modes import Mode\n\n"
+        "class Driver:\n"
+        "    def move(self, mode: Mode):\n"
+        "        return mode\n")
+    path = tmp_path / "structure.snapshot"
+    try:
+        driver_module = new_process(driver_module)
+        omm = ObjectMethodManager(driver_module.Driver(), snapshot=path)
+        assert omm.method_defs['move']['parameters']['mode']['options'] == \
+            ['Mode.a', 'Mode.b']
+        StructureSnapshot.open(path).save()
+
+        modes.write_text(modes.read_text() + "    c = 3\n")
+        sys.modules.pop("snapshot_modes")
+        driver_module = new_process(driver_module)
+        assert StructureSnapshot.open(path).load(driver_module.Driver) is None
+        omm = ObjectMethodManager(driver_module.Driver(), snapshot=path)
+        assert omm.method_defs['move']['parameters']['mode']['options'] == \
+            ['Mode.a', 'Mode.b', 'Mode.c']
+    finally:
+        sys.modules.pop("snapshot_modes", None)
+
+
+def test_corrupt_snapshot_is_ignored(driver_module, tmp_path):
+    path = tmp_path / "structure.snapshot"
+    path.write_bytes(b"not a snapshot")
+    omm = ObjectMethodManager(driver_module.Driver(), snapshot=path)
+    assert 'move' in omm.method_defs
+    StructureSnapshot.open(path).save()
+    assert StructureSnapshot(path).load(driver_module.Driver) is not None
+
+
+def test_unpicklable_entries_are_skipped(driver_module, tmp_path):
+    import threading
+    path = tmp_path / "structure.snapshot"
+    def wait(self, timeout: float, lock: object = threading.Lock()):
+        pass
+    driver_module.Driver.wait = wait
+    ObjectMethodManager(driver_module.Driver(), snapshot=path)
+    StructureSnapshot.open(path).save()
+    snapshot = StructureSnapshot(path)
+    structure = snapshot.load(driver_module.Driver)
+    assert 'move' in structure.stored_methods
+    assert 'wait' not in structure.stored_methods
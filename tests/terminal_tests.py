@@ -0,0 +1,40 @@
+#!/usr/bin/env/python3
+import os
+import signal
+import pytest
+from inpromptu.terminal import TerminalSize
+from inpromptu.inpromptu_readline import print_columnized_list
+
+
+def test_terminal_size_fallback_and_refresh(monkeypatch):
+    monkeypatch.setenv('COLUMNS', '42')
+    monkeypatch.setenv('LINES', '7')
+    terminal_size = TerminalSize()
+    assert (terminal_size.columns, terminal_size.lines) == (42, 7)
+    monkeypatch.setenv('COLUMNS', '100')
+    terminal_size.refresh()
+    assert terminal_size.columns == 100
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGWINCH'), reason="No SIGWINCH.")
+def test_terminal_size_tracks_sigwinch(monkeypatch):
+    monkeypatch.setenv('COLUMNS', '42')
+    previous_handler = signal.getsignal(signal.SIGWINCH)
+    try:
+        terminal_size = TerminalSize()
+        assert terminal_size.track_resizes()
+        monkeypatch.setenv('COLUMNS', '60')
+        os.kill(os.getpid(), signal.SIGWINCH)
+        assert terminal_size.columns == 60
+    finally:
+        signal.signal(signal.SIGWINCH, previous_handler)
+
+
+def test_print_columnized_list(capsys):
+    print_columnized_list(['aaaa', 'bbbb', 'cccc'], window_width=10)
+    assert capsys.readouterr().out.split() == ['aaaa', 'bbbb', 'cccc']
+    # Narrower than the longest item still prints one item per row.
+    print_columnized_list(['aaaa', 'bbbb'], window_width=2)
+    assert capsys.readouterr().out == "aaaa \nbbbb "
+    print_columnized_list([])
+    assert capsys.readouterr().out == ""